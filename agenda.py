@@ -0,0 +1,303 @@
+"""
+Agenda da lista: quando fica fechada, quando há conferência do embarque,
+quando o ciclo vira (arquiva e zera) e quais são os embarques.
+
+As regras ficam na Config (C2, ver armazenamento.CELULAS_REGRAS), uma por
+linha (ou separadas por ";"); célula vazia = REGRAS_PADRAO:
+
+    fechada: seg-sex 05:00-07:00
+    fechada: seg-qui 17:00-19:00
+    fechada: sex 17:00-dom 19:00
+    conferencia: todos 05:00-07:00, 17:00-19:00
+    virada: todos 06:50, 18:50
+    embarque: seg-sex 06:30, 18:30
+
+- `fechada` / `conferencia`: intervalos [início, fim) repetidos em cada dia
+  da faixa ("22:00-02:00" passa da meia-noite), ou um intervalo que
+  atravessa dias ("sex 17:00-dom 19:00").
+- `virada` / `embarque`: instantes, em cada dia da faixa.
+- dias: seg ter qua qui sex sab dom, faixas ("seg-sex", "sex-seg") e "todos".
+
+O ciclo atual é o 1º embarque depois da última virada: a lista que está
+aberta (ou em conferência) é a daquele embarque.
+
+`Agenda.estado(agora)` devolve a situação e o instante exato da próxima
+transição; o resultado fica guardado até lá, então os renders seguintes
+não recalculam nada. `transicoes` lista os próximos instantes em que algo
+muda, para quem precisa agir neles (a página que se recarrega quando a
+lista abre/fecha, o ReinicioCiclo dormindo até a virada).
+"""
+import re
+import threading
+from datetime import timedelta
+from functools import lru_cache
+
+
+REGRAS_PADRAO = """fechada: seg-sex 05:00-07:00
+fechada: seg-qui 17:00-19:00
+fechada: sex 17:00-dom 19:00
+conferencia: todos 05:00-07:00, 17:00-19:00
+virada: todos 06:50, 18:50
+embarque: seg-sex 06:30, 18:30"""
+
+DIAS = ("seg", "ter", "qua", "qui", "sex", "sab", "dom")
+NOMES_DIAS = ("Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom")
+TIPOS_INTERVALO = ("fechada", "conferencia")
+TIPOS_INSTANTE = ("virada", "embarque")
+DIA = 24 * 60
+SEMANA = 7 * DIA
+
+_HORA = r"(\d{1,2}):(\d{2})"
+_RE_ATRAVESSA = re.compile(rf"^([a-zá]+)\s+{_HORA}\s*-\s*([a-zá]+)\s+{_HORA}$")
+_RE_FAIXA = re.compile(rf"^{_HORA}\s*-\s*{_HORA}$")
+_RE_INSTANTES = re.compile(rf"^([a-zá\-]+)\s+(.+)$")
+
+
+def _dia(texto, linha):
+    texto = texto.replace("á", "a")
+    if texto not in DIAS:
+        raise ValueError(f"Dia inválido {texto!r} na regra {linha!r}")
+    return DIAS.index(texto)
+
+
+def _dias(texto, linha):
+    """"seg-sex" -> [0..4]; "sex-seg" -> [4, 5, 6, 0]; "todos" -> [0..6]."""
+    if texto == "todos":
+        return list(range(7))
+    if "-" not in texto:
+        return [_dia(texto, linha)]
+    ini, fim = (_dia(t, linha) for t in texto.split("-", 1))
+    return [(ini + i) % 7 for i in range((fim - ini) % 7 + 1)]
+
+
+def _minutos(h, m, linha):
+    h, m = int(h), int(m)
+    if h > 24 or m > 59 or (h == 24 and m):
+        raise ValueError(f"Horário inválido {h:02d}:{m:02d} na regra {linha!r}")
+    return h * 60 + m
+
+
+def _hora(minutos):
+    return f"{minutos // 60:02d}:{minutos % 60:02d}h"
+
+
+def _faixa_dias(dias):
+    if len(dias) == 7:
+        return "Todos os dias"
+    if len(dias) == 1:
+        return NOMES_DIAS[dias[0]]
+    return f"{NOMES_DIAS[dias[0]]} a {NOMES_DIAS[dias[-1]]}"
+
+
+class EstadoAgenda:
+    """
+    aberta: a lista aceita inscrições; conferencia: janela do checklist do embarque.
+    ciclo: datetime do embarque do ciclo atual (None se não há embarques).
+    proxima_transicao: próximo instante em que algo disso pode mudar (None = nunca).
+    """
+
+    def __init__(self, aberta, conferencia, ciclo, proxima_transicao, calculado_em):
+        self.aberta = aberta
+        self.conferencia = conferencia
+        self.ciclo = ciclo
+        self.proxima_transicao = proxima_transicao
+        self.calculado_em = calculado_em
+
+    def vale_em(self, agora):
+        return self.calculado_em <= agora and (self.proxima_transicao is None or agora < self.proxima_transicao)
+
+
+class Agenda:
+    def __init__(self, regras=REGRAS_PADRAO):
+        self.texto = regras
+        # intervalos: (inicio, fim) em minutos da semana, fim > inicio (pode passar de SEMANA)
+        self.intervalos = {t: [] for t in TIPOS_INTERVALO}
+        self.instantes = {t: [] for t in TIPOS_INSTANTE}
+        self._descricao = {t: [] for t in TIPOS_INTERVALO + TIPOS_INSTANTE}
+        for linha in re.split(r"[;\n]", regras or ""):
+            linha = linha.strip()
+            if linha and not linha.startswith("#"):
+                self._interpretar(linha)
+        self._marcos = sorted(
+            {i % SEMANA for t in TIPOS_INTERVALO for par in self.intervalos[t] for i in par}
+            | set(self.instantes["virada"])
+        )
+
+        self._lock = threading.Lock()
+        self._estado = None
+        self.calculos = 0
+        self.reaproveitados = 0
+
+    # ----- regras -----
+    def _interpretar(self, linha):
+        tipo, sep, resto = linha.partition(":")
+        tipo, resto = tipo.strip().lower().replace("ê", "e"), resto.strip().lower()
+        if not sep or tipo not in TIPOS_INTERVALO + TIPOS_INSTANTE:
+            raise ValueError(f"Regra inválida {linha!r} (use fechada/conferencia/virada/embarque: ...)")
+
+        if tipo in TIPOS_INSTANTE:
+            m = _RE_INSTANTES.match(resto)
+            if not m:
+                raise ValueError(f"Regra inválida {linha!r} (ex.: {tipo}: seg-sex 06:30, 18:30)")
+            dias = _dias(m.group(1), linha)
+            horas = []
+            for h in m.group(2).split(","):
+                mh = re.fullmatch(_HORA, h.strip())
+                if not mh:
+                    raise ValueError(f"Horário inválido {h.strip()!r} na regra {linha!r}")
+                horas.append(_minutos(*mh.groups(), linha) % DIA)
+            self.instantes[tipo] = sorted(set(self.instantes[tipo]) | {d * DIA + h for d in dias for h in horas})
+            self._descricao[tipo].append((dias, horas))
+            return
+
+        m = _RE_ATRAVESSA.match(resto)
+        if m:
+            ini = _dia(m.group(1), linha) * DIA + _minutos(m.group(2), m.group(3), linha)
+            fim = _dia(m.group(4), linha) * DIA + _minutos(m.group(5), m.group(6), linha)
+            self.intervalos[tipo].append((ini, ini + ((fim - ini) % SEMANA or SEMANA)))
+            self._descricao[tipo].append(((ini, fim), None))
+            return
+
+        dias, _, faixas = resto.partition(" ")
+        dias = _dias(dias, linha)
+        pares = []
+        for faixa in faixas.split(","):
+            mf = _RE_FAIXA.match(faixa.strip())
+            if not mf:
+                raise ValueError(f"Intervalo inválido {faixa.strip()!r} na regra {linha!r} (ex.: 05:00-07:00)")
+            ini, fim = _minutos(mf.group(1), mf.group(2), linha), _minutos(mf.group(3), mf.group(4), linha)
+            pares.append((ini, fim))
+            for d in dias:
+                self.intervalos[tipo].append((d * DIA + ini, d * DIA + ini + ((fim - ini) % DIA or DIA)))
+        self._descricao[tipo].append((dias, pares))
+
+    # ----- cálculo -----
+    @staticmethod
+    def _inicio_semana(agora):
+        return (agora - timedelta(days=agora.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def _dentro(self, tipo, minuto):
+        return any(ini <= minuto < fim or ini <= minuto + SEMANA < fim for ini, fim in self.intervalos[tipo])
+
+    def _depois(self, pontos, momento, inclusive=False):
+        """Primeiro instante da semana (repetida) depois de `momento`; None se não há pontos."""
+        if not pontos:
+            return None
+        base = self._inicio_semana(momento)
+        candidatos = []
+        for p in pontos:
+            t = base + timedelta(minutes=p)
+            if t < momento or (t == momento and not inclusive):
+                t += timedelta(days=7)
+            candidatos.append(t)
+        return min(candidatos)
+
+    def _antes(self, pontos, momento):
+        """Último instante <= `momento`; None se não há pontos."""
+        if not pontos:
+            return None
+        base = self._inicio_semana(momento)
+        candidatos = []
+        for p in pontos:
+            t = base + timedelta(minutes=p)
+            if t > momento:
+                t -= timedelta(days=7)
+            candidatos.append(t)
+        return max(candidatos)
+
+    def virada_vigente(self, agora):
+        """Última virada até `agora` (None se as regras não têm virada)."""
+        return self._antes(self.instantes["virada"], agora)
+
+    def proxima_virada(self, agora):
+        return self._depois(self.instantes["virada"], agora)
+
+    def _calcular(self, agora):
+        minuto = (agora - self._inicio_semana(agora)).total_seconds() / 60.0
+        virada = self.virada_vigente(agora)
+        ciclo = self._depois(self.instantes["embarque"], virada if virada is not None else agora, inclusive=virada is None)
+        return EstadoAgenda(
+            aberta=not self._dentro("fechada", minuto),
+            conferencia=self._dentro("conferencia", minuto),
+            ciclo=ciclo,
+            proxima_transicao=self._depois(self._marcos, agora),
+            calculado_em=agora,
+        )
+
+    def estado(self, agora):
+        """Situação em `agora` (datetime com fuso); recalcula só depois da próxima transição."""
+        with self._lock:
+            if self._estado is not None and self._estado.vale_em(agora):
+                self.reaproveitados += 1
+                return self._estado
+        estado = self._calcular(agora)
+        with self._lock:
+            self._estado = estado
+            self.calculos += 1
+        return estado
+
+    def transicoes(self, de, ate):
+        """[(instante, [o que muda])] entre `de` (exclusive) e `ate`, só onde algo muda de fato."""
+        out = []
+        t = self._depois(self._marcos, de)
+        while t is not None and t <= ate:
+            antes, depois = self._calcular(t - timedelta(microseconds=1)), self._calcular(t)
+            mudancas = []
+            if antes.aberta != depois.aberta:
+                mudancas.append("abre" if depois.aberta else "fecha")
+            if antes.conferencia != depois.conferencia:
+                mudancas.append("início da conferência" if depois.conferencia else "fim da conferência")
+            if antes.ciclo != depois.ciclo:
+                mudancas.append("virada do ciclo")
+            if mudancas:
+                out.append((t, mudancas))
+            t = self._depois(self._marcos, t)
+        return out
+
+    # ----- texto (aba Instruções) -----
+    def descricao_fechamentos(self):
+        """Linhas em markdown com os períodos em que a lista fica fechada."""
+        linhas = []
+        for dias, pares in self._descricao["fechada"]:
+            if pares is None:
+                ini, fim = dias
+                linhas.append(f"* **{NOMES_DIAS[ini // DIA]} {_hora(ini % DIA)} a {NOMES_DIAS[fim // DIA]} "
+                              f"{_hora(fim % DIA)}:** inscrições fechadas. Reabre {NOMES_DIAS[fim // DIA].lower()} "
+                              f"às {_hora(fim % DIA)}.")
+            else:
+                periodos = " e ".join(f"das {_hora(i)} às {_hora(f)}" for i, f in pares)
+                linhas.append(f"* **{_faixa_dias(dias)}:** inscrições fechadas {periodos}.")
+        return linhas or ["* Lista sempre aberta."]
+
+    def descricao_conferencia(self):
+        """Ex.: "05:00h às 07:00h / 17:00h às 19:00h"."""
+        pares = []
+        for dias, faixas in self._descricao["conferencia"]:
+            for i, f in (faixas or []):
+                if (i, f) not in pares:
+                    pares.append((i, f))
+        return " / ".join(f"{_hora(i)} às {_hora(f)}" for i, f in pares)
+
+    def descricao_viradas(self):
+        """Ex.: "06:50h e de 18:50h"."""
+        horas = sorted({h for _, hs in self._descricao["virada"] for h in hs})
+        return " e de ".join(_hora(h) for h in horas)
+
+
+def interpretar_regras(texto):
+    """Agenda das regras; ValueError (com a regra ruim) se alguma não for entendida."""
+    return Agenda(texto)
+
+
+@lru_cache(maxsize=8)
+def agenda_de(texto):
+    """
+    Agenda compartilhada pelo processo para o texto da Config (o estado fica
+    guardado nela). Vazio ou inválido = regras padrão.
+    """
+    if not str(texto or "").strip():
+        return Agenda(REGRAS_PADRAO)
+    try:
+        return Agenda(str(texto))
+    except ValueError:
+        return Agenda(REGRAS_PADRAO)
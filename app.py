@@ -1,19 +1,27 @@
+import partida  # 1º import: marca o início da partida do processo
+
 import streamlit as st
-import gspread
-from gspread.exceptions import APIError
-from google.oauth2.service_account import Credentials
-import pandas as pd
-from datetime import datetime, time, timedelta
+from datetime import datetime, timedelta
 import pytz
-from fpdf import FPDF
-import urllib.parse
-import time as time_module
-import random
 import re
 
-# ===== EMAIL =====
-import smtplib
-from email.message import EmailMessage
+from armazenamento import gs_call, criar_armazenamento, CABECALHO_ARQUIVO, LIMITE_PADRAO, LeituraPlanilha
+from fila_presenca import FilaPresenca
+from telefone import tel_format_br, tel_is_valid_11
+from diretorio import DiretorioUsuarios, calcular_alteracoes_usuarios, snapshot_confere
+from presenca import SincronizadorPresenca, acrescentar_linhas, remover_linha
+from relatorio import cache_pdf, lista_renderizada
+from atualizador import AtualizadorSnapshots
+from agenda import REGRAS_PADRAO, agenda_de, interpretar_regras
+from ciclo import ReinicioCiclo
+from embarque import ConferenciaEmbarque, aplicar_marcas, com_embarque, conferidos
+from concorrencia import LeiturasCompartilhadas
+from versao import VersaoDados
+import cota
+import metricas
+
+# pandas, fpdf, smtplib e gspread são importados só nos caminhos que os usam
+# (ranking, PDF, e-mail, conexão): a partida a frio não paga por eles.
 
 
 # ==========================================================
@@ -27,9 +35,15 @@ scope = [
 SPREADSHEET_NAME = "ListaPresenca"
 WS_USUARIOS = "Usuarios"
 WS_CONFIG = "Config"
+WS_ARQUIVO = "Arquivo"
 
 FUSO_BR = pytz.timezone("America/Sao_Paulo")
 
+# a célula de versão (Config!B2) é lida pelo processo a cada INTERVALO_VERSAO_S;
+# a lista na tela se redesenha sozinha a cada INTERVALO_LISTA_S, a partir do cache
+INTERVALO_VERSAO_S = 3
+INTERVALO_LISTA_S = 5
+
 # ==========================================================
 # GIF NO FINAL DA PÁGINA (alteração solicitada)
 # ==========================================================
@@ -48,6 +62,8 @@ def _get_email_cfg():
     from_addr = "..."
     app_password = "..."
     admin_to = "..." (opcional)
+    starttls = true (opcional)
+    outbox_path = "caixa_saida.db" (opcional)
     """
     if "email" not in st.secrets:
         return None
@@ -59,100 +75,69 @@ def _get_email_cfg():
     admin_to = cfg.get("admin_to", "")
     if not from_addr or not app_pass:
         return None
-    return {"host": host, "port": port, "from": from_addr, "pass": app_pass, "admin_to": admin_to}
+    return {
+        "host": host, "port": port, "from": from_addr, "pass": app_pass, "admin_to": admin_to,
+        "starttls": bool(cfg.get("starttls", True)),
+        "outbox_path": cfg.get("outbox_path", "caixa_saida.db"),
+    }
 
 
-def enviar_email(destinatario: str, assunto: str, corpo: str) -> (bool, str):
+@st.cache_resource
+def caixa_saida():
+    """Caixa de saída do processo: os e-mails são enviados por uma thread própria."""
     cfg = _get_email_cfg()
     if not cfg:
+        return None
+    from caixa_saida import CaixaSaida
+    return CaixaSaida(cfg, caminho=cfg["outbox_path"])
+
+
+def enviar_email(destinatario: str, assunto: str, corpo: str) -> (bool, object):
+    """
+    Coloca o e-mail na caixa de saída e volta na hora.
+    Retorna (True, id da mensagem) ou (False, motivo).
+    """
+    caixa = caixa_saida()
+    if caixa is None:
         return False, "Config de e-mail não encontrada no st.secrets['email']."
 
     to_addr = str(destinatario or "").strip()
     if not to_addr:
         return False, "Destinatário vazio."
 
-    msg = EmailMessage()
-    msg["Subject"] = assunto
-    msg["From"] = cfg["from"]
-    msg["To"] = to_addr
-    msg.set_content(corpo)
-
     try:
-        with smtplib.SMTP(cfg["host"], cfg["port"], timeout=20) as server:
-            server.ehlo()
-            server.starttls()
-            server.login(cfg["from"], cfg["pass"])
-            server.send_message(msg)
-        return True, "E-mail enviado."
+        return True, caixa.enfileirar(to_addr, assunto, corpo)
     except Exception as e:
-        return False, f"Falha ao enviar e-mail: {e}"
+        return False, f"Falha ao registrar e-mail: {e}"
 
 
 # ==========================================================
-# TELEFONE:
+# CONEXÕES (CACHE_RESOURCE)
 # ==========================================================
-def tel_only_digits(s: str) -> str:
-    return re.sub(r"\D+", "", str(s or ""))
-
-def tel_format_br(digits: str) -> str:
+@st.cache_resource
+def transporte_sheets():
     """
-    Formata 11 dígitos como: (xx) xxxxx.xxxx
-    Se tiver menos, retorna o que der sem quebrar.
+    Sessão HTTP do processo para o Sheets (transporte.py): pool keep-alive,
+    gzip, prazos por chamada e token renovado antes de vencer. Depois de falha
+    de autenticação/conexão, os handles abaixo são recriados no próximo uso.
     """
-    d = tel_only_digits(digits)
-    if len(d) >= 2:
-        ddd = d[:2]
-        rest = d[2:]
-    else:
-        return d
-
-    if len(rest) >= 9:
-        p1 = rest[:5]
-        p2 = rest[5:9]
-        return f"({ddd}) {p1}.{p2}"
-    elif len(rest) > 5:
-        p1 = rest[:5]
-        p2 = rest[5:]
-        return f"({ddd}) {p1}.{p2}"
-    else:
-        return f"({ddd}) {rest}"
-
-def tel_is_valid_11(s: str) -> bool:
-    return len(tel_only_digits(s)) == 11
-
-
-# ==========================================================
-# WRAPPER COM RETRY / BACKOFF PARA 429
-# ==========================================================
-def gs_call(func, *args, **kwargs):
-    max_tries = 6
-    base = 0.6
-    for attempt in range(max_tries):
-        try:
-            return func(*args, **kwargs)
-        except APIError as e:
-            msg = str(e)
-            is_429 = ("429" in msg) or ("Quota exceeded" in msg) or ("RESOURCE_EXHAUSTED" in msg)
-            is_5xx = any(code in msg for code in ["500", "502", "503", "504"])
-            if is_429 or is_5xx:
-                sleep_s = (base * (2 ** attempt)) + random.uniform(0.0, 0.35)
-                time_module.sleep(min(sleep_s, 6.0))
-                continue
-            raise
-    raise APIError("Google Sheets: muitas requisições (429). Tente novamente em instantes.")
-
+    import transporte
+    from google.oauth2.service_account import Credentials
 
-# ==========================================================
-# CONEXÕES (CACHE_RESOURCE)
-# ==========================================================
-@st.cache_resource
-def conectar_gsheets():
     info = dict(st.secrets["gcp_service_account"])
     # Correção para leitura de chaves privadas em sistemas cloud
     if "private_key" in info:
         info["private_key"] = info["private_key"].replace("\\n", "\n")
     creds = Credentials.from_service_account_info(info, scopes=scope)
-    return gspread.authorize(creds)
+    return transporte.configurar(creds, ao_recriar=recriar_handles_sheets)
+
+def recriar_handles_sheets():
+    for recurso in (conectar_gsheets, abrir_documento, ws_usuarios, ws_presenca, ws_config, ws_arquivo):
+        recurso.clear()
+
+@st.cache_resource
+def conectar_gsheets():
+    return transporte_sheets().cliente()
 
 @st.cache_resource
 def abrir_documento():
@@ -179,45 +164,190 @@ def ws_config():
         gs_call(sheet_c.update, "A1:A2", [["LIMITE"], ["100"]])
         return sheet_c
 
+@st.cache_resource
+def ws_arquivo():
+    doc = abrir_documento()
+    try:
+        return gs_call(doc.worksheet, WS_ARQUIVO)
+    except Exception:
+        sheet_a = gs_call(doc.add_worksheet, title=WS_ARQUIVO, rows="1", cols=str(len(CABECALHO_ARQUIVO)))
+        gs_call(sheet_a.update, "A1", [CABECALHO_ARQUIVO])
+        return sheet_a
+
+@st.cache_resource
+def preaquecimento():
+    """
+    Na subida do processo: importa pandas/numpy e abre cliente, documento e
+    worksheets em segundo plano (worksheets em paralelo), enquanto o 1º
+    visitante já vê a página. Desligável com preaquecer = false em st.secrets["inicio"].
+    """
+    cfg = st.secrets["inicio"] if "inicio" in st.secrets else {}
+    if not cfg.get("preaquecer", True):
+        return None
+    storage = st.secrets["storage"] if "storage" in st.secrets else {}
+    usa_sheets = (str(storage.get("backend", "sheets")).strip().lower() != "sqlite"
+                  or storage.get("espelhar_sheets", False))
+    if not usa_sheets:
+        return partida.preaquecer(lambda: None, lambda: None, {}, modulos=("numpy", "pandas"))
+    return partida.preaquecer(
+        conectar_gsheets, abrir_documento,
+        {"usuarios": ws_usuarios, "presenca": ws_presenca, "config": ws_config, "arquivo": ws_arquivo},
+        modulos=("numpy", "pandas"),
+    )
+
+@st.cache_resource
+def armazenamento():
+    """
+    Backend escolhido em st.secrets["storage"] (padrão: Google Sheets), com as
+    leituras concorrentes deduplicadas (single-flight) e a versão dos dados
+    marcada a cada escrita (versao.py).
+
+    Cota do Sheets opcional em st.secrets["cota"]:
+    leituras_por_min = 60 / escritas_por_min = 60 / rajada = 10
+    """
+    if "cota" in st.secrets:
+        cfg_cota = st.secrets["cota"]
+        cota.configurar(
+            leituras_por_min=int(cfg_cota.get("leituras_por_min", 60)),
+            escritas_por_min=int(cfg_cota.get("escritas_por_min", 60)),
+            rajada=int(cfg_cota.get("rajada", 10)),
+        )
+    cfg = st.secrets["storage"] if "storage" in st.secrets else {}
+    return LeiturasCompartilhadas(VersaoDados(criar_armazenamento(cfg, ws_usuarios, ws_presenca, ws_config, ws_arquivo)))
+
+@st.cache_resource
+def fila_presenca():
+    """
+    Fila única do processo: junta as confirmações de todas as sessões.
+    Cada lote gravado entra direto no cache da lista (sem reler a planilha).
+    """
+    at = atualizador()
+    sinc = sincronizador_presenca()
+
+    def ao_gravar(linhas):
+        if sinc is not None:
+            sinc.acrescentar_local(linhas)
+        at.aplicar_local("planilha", lambda atual: atual.com_presenca(acrescentar_linhas(atual.presenca, linhas)))
+
+    return FilaPresenca(armazenamento(), relogio=lambda: datetime.now(FUSO_BR), ao_gravar=ao_gravar)
+
+@st.cache_resource
+def conferencia_embarque():
+    """
+    Marcas da conferência do embarque, gravadas na coluna G da presença em
+    lote (no máximo um batch_update a cada 3 s, na linha de cada e-mail lida
+    na hora) e aplicadas no cache da lista assim que gravadas.
+    """
+    at = atualizador()
+
+    def ao_gravar(marcas):
+        at.aplicar_local("planilha", lambda atual: atual.com_presenca(aplicar_marcas(atual.presenca, marcas)))
+
+    return ConferenciaEmbarque(armazenamento(), ao_gravar=ao_gravar)
+
+@st.cache_resource
+def sincronizador_presenca():
+    """
+    Sincronização incremental da presença (lê só as linhas novas).
+    Desligável com sincronizacao_incremental = false em st.secrets["storage"].
+    """
+    cfg = st.secrets["storage"] if "storage" in st.secrets else {}
+    if not cfg.get("sincronizacao_incremental", True):
+        return None
+    return SincronizadorPresenca(armazenamento())
+
 
 # ==========================================================
-# LEITURAS (CACHE_DATA)
+# LEITURAS (SNAPSHOTS ATUALIZADOS EM SEGUNDO PLANO)
 # ==========================================================
-@st.cache_data(ttl=30)
-def buscar_usuarios_cadastrados():
-    """Uso geral (Login/Cadastro/Recuperar)."""
-    try:
-        sheet_u = ws_usuarios()
-        return gs_call(sheet_u.get_all_records)
-    except Exception:
-        return []
+@st.cache_resource
+def atualizador():
+    """
+    Snapshots do processo. As sessões leem o último valor na hora; a rede
+    fica por conta da thread do atualizador.
+
+    "planilha": usuários, limite e presença num único retrato
+    (LeituraPlanilha), lidos de uma vez (um values_batch_get no Sheets, já
+    com a faixa incremental da presença). É relida quando a célula de versão
+    muda ("versao", uma célula a cada INTERVALO_VERSAO_S); o intervalo
+    próprio fica só como rede de segurança (edição manual na planilha).
+    """
+    # resolvidos aqui: a thread do atualizador não roda dentro do script do Streamlit
+    banco = armazenamento()
+    sinc = sincronizador_presenca()
+
+    def carregar_planilha():
+        if sinc is None:
+            return banco.ler_tudo()
+        desde = sinc.linha_inicial()
+        leitura = banco.ler_tudo(desde)
+        linhas = sinc.sincronizar(leitura.presenca, desde).linhas
+        # a coluna de embarque vem inteira: marcas mudam linhas que a leitura incremental não relê
+        return leitura.com_presenca(com_embarque(linhas, leitura.embarque))
+
+    at = AtualizadorSnapshots()
+    at.registrar("planilha", carregar_planilha, intervalo=30,
+                 padrao=LeituraPlanilha(DiretorioUsuarios([]), LIMITE_PADRAO, "", None))
+
+    def versao_mudou(versao):
+        # a versão gravada por este processo já está no cache (aplicar_local)
+        if versao != banco.versao_propria:
+            at.atualizar("planilha")
+
+    at.registrar("versao", banco.ler_versao, intervalo=INTERVALO_VERSAO_S, padrao="", ao_mudar=versao_mudou)
+    return at
+
+@st.cache_resource
+def historico():
+    """Arquivo local dos ciclos encerrados (historico_dir em st.secrets["storage"])."""
+    from historico import ArquivoHistorico
+    cfg = st.secrets["storage"] if "storage" in st.secrets else {}
+    return ArquivoHistorico(cfg.get("historico_dir", "historico"))
+
+@st.cache_resource
+def reinicio_ciclo():
+    """
+    Virada de ciclo (horários de virada da agenda) feita por uma única thread
+    do processo: arquiva a lista que sai e zera a presença. As sessões não verificam mais.
+    """
+    at = atualizador()
+    # a thread só consulta as regras (at.ultimo): não mantém a planilha sendo relida sem visitantes
+    return ReinicioCiclo(armazenamento(), relogio=lambda: datetime.now(FUSO_BR),
+                         ao_limpar=lambda: at.atualizar("planilha"), historico=historico(),
+                         agenda=lambda: agenda_de(at.ultimo("planilha").valor.regras))
+
+def remover_presenca_local(linha_planilha, email):
+    """Aplica no cache a exclusão que esta sessão acabou de gravar; a reconciliação vem depois."""
+    sinc = sincronizador_presenca()
+    if sinc is not None:
+        sinc.remover_local(linha_planilha, email)
+    atualizador().aplicar_local(
+        "planilha", lambda atual: atual.com_presenca(remover_linha(atual.presenca, linha_planilha, email)))
+
+def recarregar(*nomes):
+    """Após uma escrita: antecipa a atualização dos snapshots e espera o resultado."""
+    at = atualizador()
+    for nome in nomes:
+        at.atualizar(nome, esperar=True)
+
+def conferir_versao():
+    """
+    Botão ATUALIZAR: confere só a célula de versão; a presença só é relida
+    (e a sessão espera por ela) se a versão mudou.
+    """
+    at = atualizador()
+    antes = at.ler("versao").valor
+    if at.atualizar("versao", esperar=True).valor != antes:
+        at.atualizar("planilha", esperar=True)
 
 @st.cache_data(ttl=3)
 def buscar_usuarios_admin():
     """Uso específico do ADM: Atualiza tudo."""
     try:
-        sheet_u = ws_usuarios()
-        return gs_call(sheet_u.get_all_records)
+        return armazenamento().listar_usuarios()
     except Exception:
         return []
 
-@st.cache_data(ttl=120)
-def buscar_limite_dinamico():
-    try:
-        sheet_c = ws_config()
-        val = gs_call(sheet_c.acell, "A2").value
-        return int(val)
-    except Exception:
-        return 100
-
-@st.cache_data(ttl=6)
-def buscar_presenca_atualizada():
-    try:
-        sheet_p = ws_presenca()
-        return gs_call(sheet_p.get_all_values)
-    except Exception:
-        return None
-
 
 # ==========================================================
 # FILTRO PARA NÃO EXIBIR LINHAS “LIXO” (evita final estranho)
@@ -252,219 +382,279 @@ def filtrar_linhas_presenca(dados_p):
     return [header] + body_ok
 
 
-def verificar_status_e_limpar(sheet_p, dados_p):
-    agora = datetime.now(FUSO_BR)
-    hora_atual, dia_semana = agora.time(), agora.weekday()
-
-    if hora_atual >= time(18, 50):
-        marco = agora.replace(hour=18, minute=50, second=0, microsecond=0)
-    elif hora_atual >= time(6, 50):
-        marco = agora.replace(hour=6, minute=50, second=0, microsecond=0)
-    else:
-        marco = (agora - timedelta(days=1)).replace(hour=18, minute=50, second=0, microsecond=0)
-
-    if dados_p and len(dados_p) > 1:
-        try:
-            ultima_str = dados_p[-1][0]
-            ultima_dt = FUSO_BR.localize(datetime.strptime(ultima_str, "%d/%m/%Y %H:%M:%S"))
-            if ultima_dt < marco:
-                gs_call(sheet_p.resize, rows=1)
-                gs_call(sheet_p.resize, rows=100)
-                st.session_state["_force_refresh_presenca"] = True
-                st.rerun()
-        except Exception:
-            pass
-
-    is_aberto = False
-
-    # Regras de abertura/fechamento
-    if dia_semana == 5:  # Sábado
-        is_aberto = False
-    elif dia_semana == 6:  # Domingo
-        is_aberto = (hora_atual >= time(19, 0))
-    elif dia_semana == 4:  # Sexta
-        if hora_atual >= time(17, 0):
-            is_aberto = False
-        elif time(5, 0) <= hora_atual < time(7, 0):
-            is_aberto = False
-        else:
-            is_aberto = True
-    else:  # Segunda a Quinta
-        if (time(5, 0) <= hora_atual < time(7, 0)) or (time(17, 0) <= hora_atual < time(19, 0)):
-            is_aberto = False
-        else:
-            is_aberto = True
-
-    janela_conferencia = (time(5, 0) < hora_atual < time(7, 0)) or (time(17, 0) < hora_atual < time(19, 0))
-    return is_aberto, janela_conferencia
-
-
 # ==========================================================
-# CICLO (exibição abaixo do título)
+# AGENDA (ABERTURA, CONFERÊNCIA E CICLO)
 # ==========================================================
-def obter_ciclo_atual():
-    agora = datetime.now(FUSO_BR)
-    t = agora.time()
-    wd = agora.weekday()
-
-    em_fechamento_fds = (wd == 4 and t >= time(17, 0)) or (wd == 5) or (wd == 6 and t < time(19, 0))
-    if em_fechamento_fds:
-        dias_para_seg = (7 - wd) % 7
-        alvo_dt = (agora + timedelta(days=dias_para_seg)).date()
-        alvo_h = "06:30"
-    else:
-        if t >= time(19, 0):
-            alvo_dt = (agora + timedelta(days=1)).date()
-            alvo_h = "06:30"
-        elif t < time(7, 0):
-            alvo_dt = agora.date()
-            alvo_h = "06:30"
-        else:
-            alvo_dt = agora.date()
-            alvo_h = "18:30"
+def agenda_atual():
+    """
+    Agenda das regras de horário da Config (vazia ou inválida = regras padrão,
+    ver agenda.py), do último snapshot: não espera a 1ª carga (até lá, as
+    regras padrão).
+    """
+    return agenda_de(atualizador().ultimo("planilha").valor.regras)
 
-    alvo_dt_str = alvo_dt.strftime("%d/%m/%Y")
-    return alvo_h, alvo_dt_str
+def estado_agenda():
+    """Aberta / conferência / ciclo agora; calculado só uma vez entre duas transições."""
+    return agenda_atual().estado(datetime.now(FUSO_BR))
 
+def vigiar_agenda():
+    """
+    Fragmento sem conteúdo, agendado (run_every) para a próxima transição da
+    agenda: na hora em que a lista abre/fecha, a conferência começa/termina ou
+    o ciclo vira, a página é refeita e agenda o disparo seguinte. Entre uma
+    transição e outra a página não é refeita por causa do horário.
+
+    O Streamlit também roda o fragmento junto com cada execução da página:
+    só o disparo do timer (horário em `_agenda_disparo` já alcançado) refaz
+    a página; a execução junto com ela não faz nada.
+    """
+    disparo = st.session_state.get("_agenda_disparo")
+    if disparo is not None and datetime.now(FUSO_BR) >= disparo:
+        st.rerun()
 
-def aplicar_ordenacao(df):
-    if "EMAIL" not in df.columns:
-        df["EMAIL"] = "N/A"
 
-    if "QG_RMCF_OUTROS" not in df.columns and "ORIGEM" in df.columns:
-        df["QG_RMCF_OUTROS"] = df["ORIGEM"]
-    if "QG_RMCF_OUTROS" not in df.columns:
-        df["QG_RMCF_OUTROS"] = ""
+# ==========================================================
+# PAINEL ADM (FRAGMENTOS)
+# ==========================================================
+@st.fragment
+def painel_usuarios_admin():
+    """
+    Gestão de usuários. Pesquisa, "Atualizar Usuários" e salvar o editor
+    reexecutam só este bloco (não relê snapshots nem refaz métricas).
+    """
+    import pandas as pd
 
-    p_orig = {"QG": 1, "RMCF": 2, "OUTROS": 3}
+    banco = armazenamento()
+    records_u = buscar_usuarios_admin()
 
-    p_grad_normal = {
-        "TCEL": 1, "MAJ": 2, "CAP": 3, "1º TEN": 4, "2º TEN": 5, "SUBTEN": 6,
-        "1º SGT": 7, "2º SGT": 8, "3º SGT": 9, "CB": 10, "SD": 11
-    }
+    st.divider()
+    st.subheader("👥 Gestão de Usuários")
+    cA, cB = st.columns([1, 1])
+    with cA:
+        att_btn = st.button("🔄 Atualizar Usuários", use_container_width=True)
+        if att_btn:
+            buscar_usuarios_admin.clear()
+            st.rerun(scope="fragment")
+    with cB:
+        st.caption("Atualiza tudo (3s).")
 
-    def grupo_fc(grad):
-        g = str(grad or "").strip().upper()
-        if g == "FC COM":
-            return 1
-        if g == "FC TER":
-            return 2
-        return 0
+    busca = st.text_input("🔍 Pesquisar por Nome ou E-mail:").strip().lower()
 
-    df["grupo_fc"] = df["GRADUAÇÃO"].apply(grupo_fc)
-    df["p_o"] = df["QG_RMCF_OUTROS"].map(p_orig).fillna(99)
+    ativar_all = st.button("✅ ATIVAR TODOS E DESLOGAR", use_container_width=True)
+    if ativar_all:
+        if records_u:
+            banco.definir_status_todos("ATIVO", len(records_u))
+            buscar_usuarios_admin.clear()
+            recarregar("planilha")
+            st.session_state.clear()
+            st.rerun()
 
-    def p_grad(row):
-        if int(row.get("grupo_fc", 0)) == 0:
-            return p_grad_normal.get(str(row.get("GRADUAÇÃO", "")).strip().upper(), 999)
-        return 0
+    # Editor em tabela: as marcações ficam só no formulário até salvar;
+    # ao salvar, o diff contra o snapshot vira 1 batch_update + 1 exclusão em lote.
+    linhas_editor = [
+        {
+            "Linha": DiretorioUsuarios.linha_planilha(i),
+            "Graduação": user.get("Graduação"),
+            "Nome": user.get("Nome"),
+            "Email": user.get("Email"),
+            "TELEFONE": user.get("TELEFONE"),
+            "Liberar": str(user.get("STATUS", "")).strip().upper() == "ATIVO",
+            "Excluir": False,
+        }
+        for i, user in enumerate(records_u)
+        if busca == "" or busca in str(user.get("Nome", "")).lower() or busca in str(user.get("Email", "")).lower()
+    ]
+
+    with st.form("form_editor_usuarios"):
+        editado = st.data_editor(
+            pd.DataFrame(linhas_editor, columns=["Linha", "Graduação", "Nome", "Email", "TELEFONE", "Liberar", "Excluir"]),
+            hide_index=True,
+            use_container_width=True,
+            disabled=["Linha", "Graduação", "Nome", "Email", "TELEFONE"],
+            column_config={"Linha": None},
+            key="editor_usuarios",
+        )
+        salvar_edicao = st.form_submit_button("💾 SALVAR ALTERAÇÕES", use_container_width=True)
+
+    if salvar_edicao:
+        status_por_linha, linhas_remover, emails_por_linha = calcular_alteracoes_usuarios(
+            records_u, editado.to_dict("records")
+        )
+        if not status_por_linha and not linhas_remover:
+            st.info("Nenhuma alteração.")
+        else:
+            buscar_usuarios_admin.clear()
+            if not snapshot_confere(buscar_usuarios_admin(), emails_por_linha):
+                st.warning("A lista de usuários mudou desde a última leitura. Confira e salve novamente.")
+            else:
+                banco.aplicar_alteracoes_usuarios(status_por_linha, linhas_remover)
+                buscar_usuarios_admin.clear()
+                recarregar("planilha")
+                st.success(f"Salvo: {len(status_por_linha)} status alterado(s), {len(linhas_remover)} exclusão(ões).")
+                st.rerun(scope="fragment")
+
+
+@st.fragment
+def secao_historico():
+    """Histórico de ciclos: mudar o período ou abrir a frequência não reexecuta o painel."""
+    st.divider()
+    st.subheader("📚 Histórico de Ciclos")
+    hist = historico()
+    hoje = datetime.now(FUSO_BR).date()
+    cH1, cH2 = st.columns(2)
+    with cH1:
+        h_de = st.date_input("De", value=hoje - timedelta(days=90), key="hist_de")
+    with cH2:
+        h_ate = st.date_input("Até", value=hoje, key="hist_ate")
+
+    util = hist.utilizacao(h_de, h_ate)
+    if util.empty:
+        st.caption("Nenhum ciclo arquivado no período.")
+    else:
+        st.caption(
+            f"{len(util)} ciclo(s) | ocupação média {util['ocupacao_pct'].mean():.1f}% | "
+            f"{int((util['excedentes'] > 0).sum())} com excedente ({int(util['excedentes'].sum())} militares)."
+        )
+        st.line_chart(util.set_index("ciclo")[["inscritos", "vagas"]])
 
-    df["p_g"] = df.apply(p_grad, axis=1)
-    df["dt"] = pd.to_datetime(df["DATA_HORA"], dayfirst=True, errors="coerce")
+        ver_militares = st.button("👥 Frequência por militar", use_container_width=True)
+        if ver_militares:
+            freq = hist.frequencia_por_militar(h_de, h_ate)
+            st.dataframe(freq, use_container_width=True, hide_index=True)
+            lidas = hist.ultima_consulta
+            st.caption(f"Partições lidas: {lidas['particoes_lidas']} de {lidas['particoes_total']}.")
 
-    df = df.sort_values(by=["grupo_fc", "p_o", "p_g", "dt"]).reset_index(drop=True)
-    df.insert(0, "Nº", [str(i + 1) if i < 38 else f"Exc-{i - 37:02d}" for i in range(len(df))])
 
-    df_v = df.copy()
-    for i, r in df_v.iterrows():
-        if "Exc-" in str(r["Nº"]):
-            for c in df_v.columns:
-                df_v.at[i, c] = f"<span style='color:#d32f2f; font-weight:bold;'>{r[c]}</span>"
+# ==========================================================
+# CONFERÊNCIA DO EMBARQUE (FRAGMENTO)
+# ==========================================================
+def chaves_embarque(registros):
+    """Chave estável por militar (e-mail; repetido ganha sufixo), na ordem da lista."""
+    vistos = {}
+    chaves = []
+    for row in registros:
+        email = str(row.get("EMAIL", "")).strip().lower()
+        n = vistos.get(email, 0)
+        vistos[email] = n + 1
+        chaves.append(email if n == 0 else f"{email}#{n}")
+    return chaves
+
+def _marcar_embarque(email, chave):
+    """on_change do checkbox: anota a marca (gravada depois, em lote) e o que a tela já mostra."""
+    valor = st.session_state[f"chk_p_{chave}"]
+    st.session_state._embarque[chave] = valor
+    conferencia_embarque().marcar(email, valor)
+
+@st.fragment(run_every=INTERVALO_LISTA_S)
+def secao_conferencia():
+    """
+    Checklist do embarque (3 primeiros da lista). Cada marcação e o botão
+    reexecutam só este bloco; a marcação não espera a planilha.
 
-    return df.drop(columns=["grupo_fc", "p_o", "p_g", "dt"]), df_v.drop(columns=["grupo_fc", "p_o", "p_g", "dt"])
+    As marcas ficam na planilha (coluna G), por e-mail: sobrevivem a um
+    celular recarregado e aparecem para os outros conferentes, que veem o
+    estado combinado a cada INTERVALO_LISTA_S s. Na tela, o que ainda não
+    foi confirmado na planilha (pendentes) vale sobre o snapshot.
+    """
+    st.divider()
+    st.subheader("📋 LISTA DE EMBARQUE 📋")
+    painel_btn = st.button("✍️ CONFERÊNCIA ✍️", use_container_width=True)
+    if painel_btn:
+        st.session_state.conf_ativa = not st.session_state.conf_ativa
+    if not st.session_state.conf_ativa:
+        return
+
+    snap_p = atualizador().ler("planilha")
+    dados_p_show = filtrar_linhas_presenca(snap_p.valor.presenca)
+    if not dados_p_show or len(dados_p_show) < 2:
+        return
+    lista = lista_renderizada(dados_p_show)
+
+    marcadas = conferidos(snap_p.valor.presenca)
+    pendentes = conferencia_embarque().pendentes()
+    exibidas = st.session_state._embarque   # {chave: valor que o checkbox mostra}
+    total = 0
+    for row, chave in zip(lista.registros, chaves_embarque(lista.registros)):
+        email = str(row.get("EMAIL", "")).strip().lower()
+        estado = pendentes.get(email, email in marcadas)
+        widget = f"chk_p_{chave}"
+        # marca de outro conferente (ou desfeita por ele): atualiza o checkbox antes de desenhá-lo
+        if widget not in st.session_state or exibidas.get(chave) != estado:
+            st.session_state[widget] = estado
+            exibidas[chave] = estado
+        label = f"{row.get('Nº','')} - {row.get('NOME','')}".strip()
+        st.checkbox(label if label else " ", key=widget, on_change=_marcar_embarque, args=(email, chave))
+        total += estado
+    st.caption(f"Conferidos: {total} de {lista.inscritos}" + (" (salvando...)" if pendentes else ""))
 
 
 # ==========================================================
-# PDF “mais apresentado” (AGORA COM ORIGEM À DIREITA)
+# LISTA (FRAGMENTO QUE SE ATUALIZA SOZINHO)
 # ==========================================================
-class PDFRelatorio(FPDF):
-    def __init__(self, titulo="LISTA DE PRESENÇA", sub=None):
-        super().__init__(orientation="P", unit="mm", format="A4")
-        self.titulo = titulo
-        self.sub = sub or ""
-        self.set_auto_page_break(auto=True, margin=12)
-        self.alias_nb_pages()
-
-    def header(self):
-        self.set_font("Arial", "B", 14)
-        self.cell(0, 8, self.titulo, ln=True, align="C")
-
-        self.set_font("Arial", "", 9)
-        if self.sub:
-            self.cell(0, 5, self.sub, ln=True, align="C")
-        self.ln(2)
-
-        self.set_draw_color(180, 180, 180)
-        self.line(10, self.get_y(), 200, self.get_y())
-        self.ln(4)
-
-    def footer(self):
-        self.set_y(-12)
-        self.set_font("Arial", "", 8)
-        self.set_text_color(90, 90, 90)
-        self.cell(0, 6, f"Página {self.page_no()}/{{nb}} - Rota Nova Iguaçu", align="C")
-
-
-def gerar_pdf_apresentado(df_o: pd.DataFrame, resumo: dict) -> bytes:
-    agora = datetime.now(FUSO_BR).strftime("%d/%m/%Y %H:%M:%S")
-    sub = f"Emitido em: {agora}"
-
-    pdf = PDFRelatorio(titulo="ROTA NOVA IGUAÇU - LISTA DE PRESENÇA", sub=sub)
-    pdf.add_page()
-
-    pdf.set_font("Arial", "B", 10)
-    pdf.set_fill_color(240, 240, 240)
-    pdf.cell(0, 8, "RESUMO", ln=True, fill=True)
-
-    pdf.set_font("Arial", "", 9)
-    insc = resumo.get("inscritos", 0)
-    vagas = resumo.get("vagas", 38)
-    exc = max(0, insc - vagas)
-    sobra = max(0, vagas - insc)
-
-    pdf.cell(0, 6, f"Inscritos: {insc} | Vagas: {vagas} | Sobra: {sobra} | Excedentes: {exc}", ln=True)
-    pdf.ln(2)
-
-    headers = ["Nº", "GRADUAÇÃO", "NOME", "LOTAÇÃO", "ORIGEM"]
-    col_w = [12, 26, 78, 55, 19]
-
-    pdf.set_font("Arial", "B", 9)
-    pdf.set_fill_color(30, 30, 30)
-    pdf.set_text_color(255, 255, 255)
-
-    for i, h in enumerate(headers):
-        pdf.cell(col_w[i], 7, h, border=0, align="C", fill=True)
-    pdf.ln()
-
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_font("Arial", "", 8)
-
-    for idx, (_, r) in enumerate(df_o.iterrows()):
-        is_exc = "Exc-" in str(r.get("Nº", ""))
-        if is_exc:
-            pdf.set_fill_color(255, 235, 238)
-        else:
-            if idx % 2 == 0:
-                pdf.set_fill_color(245, 245, 245)
-            else:
-                pdf.set_fill_color(255, 255, 255)
-
-        origem = str(r.get("QG_RMCF_OUTROS", "") or r.get("ORIGEM", "") or "").strip()
+@st.fragment(run_every=INTERVALO_LISTA_S)
+def secao_lista(email):
+    """
+    Inscritos, tabela, PDF e WhatsApp. Roda de novo sozinha a cada
+    INTERVALO_LISTA_S s sem reexecutar a página: lê os snapshots em memória
+    (quem vai à planilha é o atualizador, uma célula por intervalo para o
+    processo todo) e a renderização vem do cache enquanto a versão da
+    presença não muda. Se a mudança altera a posição do usuário, a página
+    inteira é refeita para atualizar o topo.
+    """
+    at = atualizador()
+    snap_v = at.ler("versao")  # mantém a conferência da versão ativa enquanto há alguém na lista
+    snap_p = at.ler("planilha")
+    dados_p_show = filtrar_linhas_presenca(snap_p.valor.presenca)
+    if not dados_p_show or len(dados_p_show) < 2:
+        return
+
+    lista = lista_renderizada(dados_p_show)
+    if snap_p.versao != st.session_state.get("_versao_lista"):
+        st.session_state._versao_lista = snap_p.versao
+        if lista.posicao_por_email.get(email, 999) != st.session_state.get("_pos_lista", 999):
+            st.rerun()
 
-        pdf.cell(col_w[0], 6, str(r.get("Nº", "")), border=0, fill=True)
-        pdf.cell(col_w[1], 6, str(r.get("GRADUAÇÃO", "")), border=0, fill=True)
-        pdf.cell(col_w[2], 6, str(r.get("NOME", ""))[:42], border=0, fill=True)
-        pdf.cell(col_w[3], 6, str(r.get("LOTAÇÃO", ""))[:34], border=0, fill=True)
-        pdf.cell(col_w[4], 6, origem[:10], border=0, align="C", fill=True)
-        pdf.ln()
+    insc = lista.inscritos
+    rest = 38 - insc
+    st.subheader(f"Inscritos: {insc} | Vagas: 38 | {'Sobra' if rest >= 0 else 'Exc'}: {abs(rest)}")
 
-    pdf.ln(4)
-    pdf.set_font("Arial", "I", 8)
-    pdf.set_text_color(80, 80, 80)
-    pdf.multi_cell(0, 5, "Observação: os itens marcados como 'Exc-xx' representam excedentes além do limite de 38 vagas.")
-    pdf.set_text_color(0, 0, 0)
+    c_up1, c_up2 = st.columns([1, 1])
+    with c_up1:
+        up_btn = st.button("🔄 ATUALIZAR", use_container_width=True)
+        if up_btn:
+            conferir_versao()
+            st.rerun()
+    with c_up2:
+        idade_v = snap_v.idade()
+        st.caption(f"Conferida há {int(idade_v or 0)}s (automático).")
+
+    st.write(lista.html_tabela, unsafe_allow_html=True)
+
+    c1, c2 = st.columns(2)
+    with c1:
+        # PDF só é gerado quando alguém pede; depois vem do cache do processo
+        if st.session_state._pdf_pedido:
+            resumo = {"inscritos": insc, "vagas": 38}
+            _ = st.download_button(
+                "📄 BAIXAR PDF",
+                lista.pdf(resumo),
+                "lista_rota_nova_iguacu.pdf",
+                mime="application/pdf",
+                use_container_width=True
+            )
+        else:
+            pdf_btn = st.button("📄 PDF (Relatório)", use_container_width=True)
+            if pdf_btn:
+                st.session_state._pdf_pedido = True
+                st.rerun(scope="fragment")
 
-    return pdf.output(dest="S").encode("latin-1")
+    with c2:
+        st.markdown(
+            f'<a href="{lista.link_whatsapp}" target="_blank">'
+            f"<button style='width:100%; height:38px; background-color:#25D366; color:white; border:none; "
+            f"border-radius:4px; font-weight:bold;'>🟢 WHATSAPP</button></a>",
+            unsafe_allow_html=True
+        )
 
 
 # ==========================================================
@@ -488,29 +678,53 @@ st.markdown("""
 
 st.markdown('<div class="titulo-container"><div class="titulo-responsivo">🚌 ROTA NOVA IGUAÇU 🚌</div></div>', unsafe_allow_html=True)
 
-ciclo_h, ciclo_d = obter_ciclo_atual()
-st.markdown(f"<div class='subtitulo-ciclo'>Ciclo atual: <b>EMBARQUE {ciclo_h}h</b> do dia <b>{ciclo_d}</b></div>", unsafe_allow_html=True)
-
 if "usuario_logado" not in st.session_state:
     st.session_state.usuario_logado = None
 if "is_admin" not in st.session_state:
     st.session_state.is_admin = False
 if "conf_ativa" not in st.session_state:
     st.session_state.conf_ativa = False
-if "_force_refresh_presenca" not in st.session_state:
-    st.session_state._force_refresh_presenca = False
+if "_embarque" not in st.session_state:
+    st.session_state._embarque = {}
 if "_adm_first_load" not in st.session_state:
     st.session_state._adm_first_load = False
 if "_tel_login_fmt" not in st.session_state:
     st.session_state._tel_login_fmt = ""
 if "_tel_cad_fmt" not in st.session_state:
     st.session_state._tel_cad_fmt = ""
+if "_pdf_pedido" not in st.session_state:
+    st.session_state._pdf_pedido = False
 
 
 try:
-    records_u_public = buscar_usuarios_cadastrados()
-    limite_max = buscar_limite_dinamico()
-    sheet_u_escrita = ws_usuarios()
+    preaquecimento()
+    reinicio_ciclo()
+
+    agenda_agora = estado_agenda()
+    if agenda_agora.ciclo is not None:
+        ciclo_h, ciclo_d = agenda_agora.ciclo.strftime("%H:%M"), agenda_agora.ciclo.strftime("%d/%m/%Y")
+        st.markdown(f"<div class='subtitulo-ciclo'>Ciclo atual: <b>EMBARQUE {ciclo_h}h</b> do dia <b>{ciclo_d}</b></div>", unsafe_allow_html=True)
+    espera_agenda = None
+    if agenda_agora.proxima_transicao is not None:
+        # dispara na transição (com folga de 1s); no máximo 1h (aí só reagenda), para tolerar relógio/suspensão
+        espera_agenda = (agenda_agora.proxima_transicao - datetime.now(FUSO_BR)).total_seconds() + 1
+    snap_regras = atualizador().ultimo("planilha")
+    if snap_regras.atualizado_em is None and snap_regras.erro is None:
+        # 1ª carga ainda não veio (regras padrão acima): refaz a página com as regras da Config
+        espera_agenda = 2.0
+    if espera_agenda is not None:
+        espera_agenda = min(max(espera_agenda, 1.0), 3600.0)
+        # meio segundo de folga: o timer do fragmento não precisa ser exato
+        st.session_state._agenda_disparo = datetime.now(FUSO_BR) + timedelta(seconds=espera_agenda - 0.5)
+        st.fragment(vigiar_agenda, run_every=espera_agenda)()
+    else:
+        st.session_state._agenda_disparo = None
+
+    # um retrato só (usuários, limite e presença do mesmo instante) para a página inteira
+    snap_planilha = atualizador().ler("planilha")
+    records_u_public = snap_planilha.valor.usuarios
+    limite_max = snap_planilha.valor.limite
+    banco = armazenamento()
 
     if st.session_state.usuario_logado is None and not st.session_state.is_admin:
         t1, t2, t3, t4, t5 = st.tabs(["Login", "Cadastro", "Instruções", "Recuperar", "ADM"])
@@ -530,15 +744,7 @@ try:
                     if not tel_is_valid_11(fmt_tel_login):
                         st.error("Telefone inválido. Use DDD + 9 dígitos (ex: (21) 98765.4321).")
                     else:
-                        tel_login_digits = tel_only_digits(fmt_tel_login)
-
-                        u_a = next(
-                            (u for u in records_u_public
-                             if str(u.get("Email", "")).strip().lower() == l_e.strip().lower()
-                             and str(u.get("Senha", "")) == str(l_s)
-                             and tel_only_digits(u.get("TELEFONE", "")) == tel_login_digits),
-                            None
-                        )
+                        u_a = records_u_public.autenticar(l_e, l_s, fmt_tel_login)
 
                         if u_a:
                             status_user = str(u_a.get("STATUS", "")).strip().upper()
@@ -595,11 +801,8 @@ try:
                         if missing:
                             st.error("Preencha corretamente todos os campos: " + ", ".join(missing) + ".")
                         else:
-                            novo_email = norm_str(n_e).lower()
-                            novo_tel_digits = tel_only_digits(fmt_tel_cad)
-
-                            email_existe = any(str(u.get("Email", "")).strip().lower() == novo_email for u in records_u_public)
-                            tel_existe = any(tel_only_digits(u.get("TELEFONE", "")) == novo_tel_digits for u in records_u_public)
+                            email_existe = records_u_public.email_existe(n_e)
+                            tel_existe = records_u_public.tel_existe(fmt_tel_cad)
 
                             if email_existe and tel_existe:
                                 st.error("E-mail e Telefone já cadastrados.")
@@ -608,7 +811,7 @@ try:
                             elif tel_existe:
                                 st.error("Telefone já cadastrado.")
                             else:
-                                gs_call(sheet_u_escrita.append_row, [
+                                banco.adicionar_usuario([
                                     norm_str(n_n),
                                     norm_str(n_g),
                                     norm_str(n_l),
@@ -633,7 +836,7 @@ try:
                                     )
                                     enviar_email(cfg["admin_to"], assunto, corpo)
 
-                                buscar_usuarios_cadastrados.clear()
+                                recarregar("planilha")
                                 buscar_usuarios_admin.clear()
                                 st.success("Cadastro realizado! Aguardando aprovação do Administrador.")
                                 st.rerun()
@@ -648,15 +851,16 @@ try:
             st.markdown("**LINK PARA NAVEGADOR:** https://presenca-rota-gbiwh9bjrwdergzc473xyg.streamlit.app/")
             st.divider()
             st.info("**CADASTRO E LOGIN:** Use seu e-mail como identificador único.")
-            st.markdown("""
+            # horários gerados das regras da agenda (as mesmas que abrem/fecham a lista)
+            ag = agenda_atual()
+            fechamentos = "\n            ".join(ag.descricao_fechamentos())
+            st.markdown(f"""
             **1. Regras de Horário:**
-            * **Manhã:** Inscrições abertas até às 05:00h. Reabre às 07:00h.
-            * **Tarde:** Inscrições abertas até às 17:00h. Reabre às 19:00h.
-            * **Finais de Semana:** Abrem domingo às 19:00h.
+            {fechamentos}
 
             **2. Observação:**
-            * Nos períodos em que a lista ficar suspensa para conferência (05:00h às 07:00h / 17:00h às 19:00h), os três PPMM que estiverem no topo da lista terão acesso à lista de check up (botão no topo da lista) para tirar a falta de quem estará entrando no ônibus. O mais antigo assume e na ausência dele o seu sucessor assume.
-            * Após o horário de 06:50h e de 18:50h, a lista será automaticamente zerada para que o novo ciclo da lista possa ocorrer. Sendo assim, caso queira manter um histórico de viagem, antes desses horários, faça o download do pdf e/ou do resumo do W.Zap.
+            * Nos períodos em que a lista ficar suspensa para conferência ({ag.descricao_conferencia()}), os três PPMM que estiverem no topo da lista terão acesso à lista de check up (botão no topo da lista) para tirar a falta de quem estará entrando no ônibus. O mais antigo assume e na ausência dele o seu sucessor assume.
+            * Após o horário de {ag.descricao_viradas()}, a lista será automaticamente zerada para que o novo ciclo da lista possa ocorrer. Sendo assim, caso queira manter um histórico de viagem, antes desses horários, faça o download do pdf e/ou do resumo do W.Zap.
             """)
 
         with t4:
@@ -664,7 +868,7 @@ try:
             e_r = st.text_input("E-mail cadastrado:")
             rec_btn = st.button("👾 ENVIAR DADOS POR E-MAIL 👾", use_container_width=True)
             if rec_btn:
-                u_r = next((u for u in records_u_public if str(u.get("Email", "")).strip().lower() == e_r.strip().lower()), None)
+                u_r, _ = records_u_public.buscar_por_email(e_r)
                 if u_r:
                     assunto = "Recuperação de acesso - Rota Nova Iguaçu"
                     corpo = (
@@ -677,13 +881,25 @@ try:
                     )
                     ok, msg = enviar_email(str(u_r.get("Email", "")).strip(), assunto, corpo)
                     if ok:
-                        st.success("✅ Enviado para o seu e-mail cadastrado.")
+                        st.session_state._email_rec_id = msg
                     else:
                         st.error(f"⚠️ Não consegui enviar: {msg}\n\n"
                                  "Confirme se o Secrets [email] está configurado e se a Senha de App está correta.")
                 else:
                     st.error("E-mail não encontrado.")
 
+            if st.session_state.get("_email_rec_id") and caixa_saida() is not None:
+                from caixa_saida import ENVIADO, FALHOU
+                # logo após o pedido, espera curta: na maioria das vezes o worker já entregou
+                st_envio = caixa_saida().aguardar(st.session_state._email_rec_id, timeout=3 if rec_btn else 0)
+                if st_envio and st_envio["status"] == ENVIADO:
+                    st.success("✅ Enviado para o seu e-mail cadastrado.")
+                elif st_envio and st_envio["status"] == FALHOU:
+                    st.error(f"⚠️ Não consegui enviar: {st_envio['erro']}\n\n"
+                             "Confirme se o Secrets [email] está configurado e se a Senha de App está correta.")
+                else:
+                    st.info("📨 E-mail na fila de envio. Ele chega em instantes; você pode fechar esta tela.")
+
         with t5:
             with st.form("form_admin"):
                 ad_u = st.text_input("Usuário ADM:")
@@ -698,6 +914,8 @@ try:
                         st.error("ADM inválido.")
 
     elif st.session_state.is_admin:
+        import pandas as pd   # só o painel ADM usa DataFrame diretamente
+
         st.header("🛡️ PAINEL ADMINISTRATIVO 🛡️")
 
         sair_btn = st.button("⬅️ SAIR DO PAINEL")
@@ -710,63 +928,99 @@ try:
             buscar_usuarios_admin.clear()
             st.session_state._adm_first_load = False
 
-        records_u = buscar_usuarios_admin()
-
-        cA, cB = st.columns([1, 1])
-        with cA:
-            att_btn = st.button("🔄 Atualizar Usuários", use_container_width=True)
-            if att_btn:
-                buscar_usuarios_admin.clear()
-                st.rerun()
-        with cB:
-            st.caption("Atualiza tudo (3s).")
-
         st.subheader("⚙️ Configurações Globais")
         novo_limite = st.number_input("Limite máximo de usuários:", value=int(limite_max))
         salvar_lim = st.button("💾 SALVAR NOVO LIMITE")
         if salvar_lim:
-            sheet_c = ws_config()
-            gs_call(sheet_c.update, "A2", [[str(novo_limite)]])
+            banco.salvar_limite(novo_limite)
+            recarregar("planilha")
             st.success("Limite atualizado!")
             st.rerun()
 
-        st.divider()
-        st.subheader("👥 Gestão de Usuários")
-        busca = st.text_input("🔍 Pesquisar por Nome ou E-mail:").strip().lower()
-
-        ativar_all = st.button("✅ ATIVAR TODOS E DESLOGAR", use_container_width=True)
-        if ativar_all:
-            if records_u:
-                start = 2
-                end = len(records_u) + 1
-                rng = f"H{start}:H{end}"
-                gs_call(sheet_u_escrita.update, rng, [["ATIVO"]] * len(records_u))
-                buscar_usuarios_admin.clear()
-                buscar_usuarios_cadastrados.clear()
-                st.session_state.clear()
-                st.rerun()
+        with st.expander("🕒 Regras de horário"):
+            regras_atuais = snap_planilha.valor.regras or REGRAS_PADRAO
+            novas_regras = st.text_area("Uma regra por linha (fechada / conferencia / virada / embarque):",
+                                        value=regras_atuais, height=170)
+            salvar_regras = st.button("💾 SALVAR REGRAS DE HORÁRIO")
+            if salvar_regras:
+                try:
+                    interpretar_regras(novas_regras)
+                except ValueError as e:
+                    st.error(f"Regras não salvas: {e}")
+                else:
+                    banco.salvar_regras(novas_regras.strip())
+                    recarregar("planilha")
+                    reinicio_ciclo().verificar_agora()
+                    st.success("Regras de horário atualizadas!")
+                    st.rerun()
+            agora_adm = datetime.now(FUSO_BR)
+            proximas = agenda_atual().transicoes(agora_adm, agora_adm + timedelta(days=2))
+            st.caption("Próximas transições: " + (" | ".join(
+                f"{t.strftime('%d/%m %H:%M')} {', '.join(m)}" for t, m in proximas[:8]) or "nenhuma"))
 
-        for i, user in enumerate(records_u):
-            if busca == "" or busca in str(user.get("Nome", "")).lower() or busca in str(user.get("Email", "")).lower():
-                status = str(user.get("STATUS", "")).upper()
-                with st.expander(f"{user.get('Graduação')} {user.get('Nome')} - {status}"):
-                    c1, c2, c3 = st.columns([2, 1, 1])
-                    c1.write(f"📧 {user.get('Email')} | 📱 {user.get('TELEFONE')}")
-                    is_ativo = (status == "ATIVO")
-
-                    new_val = c2.checkbox("Liberar", value=is_ativo, key=f"adm_chk_{i}")
-                    if new_val != is_ativo:
-                        gs_call(sheet_u_escrita.update_cell, i + 2, 8, "ATIVO" if new_val else "INATIVO")
-                        buscar_usuarios_admin.clear()
-                        buscar_usuarios_cadastrados.clear()
-                        st.rerun()
+        painel_usuarios_admin()
 
-                    del_btn = c3.button("🗑️", key=f"del_{i}")
-                    if del_btn:
-                        gs_call(sheet_u_escrita.delete_rows, i + 2)
-                        buscar_usuarios_admin.clear()
-                        buscar_usuarios_cadastrados.clear()
-                        st.rerun()
+        st.divider()
+        st.subheader("📊 Métricas do Google Sheets")
+        reg = metricas.registro()
+        resumo_m = reg.resumo()
+        if resumo_m:
+            st.dataframe(pd.DataFrame(resumo_m), use_container_width=True, hide_index=True)
+        else:
+            st.caption("Nenhuma chamada registrada desde a subida do processo.")
+
+        sf = banco.voo.estatisticas()
+        cota_m = cota.agendador().estatisticas()
+        prev_l, prev_e = (cota.agendador().previsao_espera(t) for t in (cota.LEITURA, cota.ESCRITA))
+        st.caption(
+            f"Single-flight: {sf['executadas']} leituras, {sf['economizadas']} evitadas. | "
+            f"Cota leitura: {cota_m['leitura']['na_fila']} na fila, espera total {cota_m['leitura']['espera_total_s']}s, "
+            f"próxima chamada em ~{prev_l:.1f}s. | "
+            f"Cota escrita: {cota_m['escrita']['na_fila']} na fila, espera total {cota_m['escrita']['espera_total_s']}s, "
+            f"próxima chamada em ~{prev_e:.1f}s. | "
+            f"PDF em cache: {len(cache_pdf())} versão(ões), {cache_pdf().acertos} reaproveitado(s), {cache_pdf().faltas} gerado(s)."
+        )
+        vd = banco.banco.estatisticas()
+        st.caption(
+            f"Versão dos dados: {atualizador().ler('versao').valor or '—'} | "
+            f"{vd['escritas']} escrita(s) deste processo em {vd['marcadas']} marcação(ões), "
+            f"{vd['falhas']} falha(s) ao marcar."
+        )
+        etapas_partida = partida.etapas()
+        if "primeiro_render" in etapas_partida:
+            st.caption(
+                f"Partida a frio: 1º render em {etapas_partida['primeiro_render']:.2f}s | "
+                + " | ".join(f"{k}: {v:.2f}s" for k, v in sorted(etapas_partida.items()) if k != "primeiro_render")
+            )
+        if caixa_saida() is not None:
+            cx = caixa_saida().estatisticas()
+            st.caption(
+                f"E-mails: {cx['PENDENTE']} na fila, {cx['ENVIADO']} enviado(s), {cx['FALHOU']} com falha | "
+                f"{cx['conexoes_abertas']} conexão(ões) SMTP abertas desde a subida."
+            )
+        import transporte
+        if transporte.transporte() is not None:
+            tr = transporte.transporte().estatisticas()
+            st.caption(
+                f"Conexão Sheets: token renovado {tr['renovacoes']}x (vence em {int(tr['token_vence_em_s'])}s), "
+                f"{tr['falhas_conexao']} falha(s) de conexão/autenticação, {tr['recriacoes']} recriação(ões)."
+            )
+        emb = conferencia_embarque().estatisticas()
+        st.caption(
+            f"Embarque: {emb['cliques']} clique(s), {emb['marcas_gravadas']} marcação(ões) gravadas em "
+            f"{emb['lotes']} lote(s), {emb['pendentes']} pendente(s), {emb['aguardando']} aguardando confirmação, "
+            f"{emb['refeitas']} regravada(s), {emb['falhas']} falha(s)."
+        )
+
+        cM1, cM2 = st.columns(2)
+        with cM1:
+            st.download_button("⬇️ Prometheus", reg.exportar_prometheus(), "metricas_rota.prom",
+                               mime="text/plain", use_container_width=True)
+        with cM2:
+            st.download_button("⬇️ JSON lines", reg.exportar_jsonl(), "metricas_rota.jsonl",
+                               mime="application/x-ndjson", use_container_width=True)
+
+        secao_historico()
 
     else:
         u = st.session_state.usuario_logado
@@ -783,26 +1037,23 @@ try:
         st.sidebar.markdown("---")
         st.sidebar.caption("Desenvolvido por: MAJ ANDRÉ AGUIAR - CAES®️")
 
-        sheet_p_escrita = ws_presenca()
-
-        if st.session_state._force_refresh_presenca:
-            buscar_presenca_atualizada.clear()
-            st.session_state._force_refresh_presenca = False
+        snap_p = snap_planilha
 
-        dados_p = buscar_presenca_atualizada()
+        dados_p = snap_p.valor.presenca
         dados_p_show = filtrar_linhas_presenca(dados_p)
 
-        aberto, janela_conf = verificar_status_e_limpar(sheet_p_escrita, dados_p_show)
+        aberto, janela_conf = agenda_agora.aberta, agenda_agora.conferencia
 
-        df_o, df_v = pd.DataFrame(), pd.DataFrame()
+        lista = None
         ja, pos = False, 999
 
         if dados_p_show and len(dados_p_show) > 1:
-            df_o, df_v = aplicar_ordenacao(pd.DataFrame(dados_p_show[1:], columns=dados_p_show[0]))
-            email_logado = str(u.get("Email")).strip().lower()
-            ja = any(email_logado == str(row.get("EMAIL", "")).strip().lower() for _, row in df_o.iterrows())
-            if ja:
-                pos = df_o.index[df_o["EMAIL"].str.lower() == email_logado].tolist()[0] + 1
+            # ordenação, tabela e texto do WhatsApp: uma vez por conteúdo da lista
+            lista = lista_renderizada(dados_p_show)
+            pos = lista.posicao_por_email.get(str(u.get("Email")).strip().lower(), 999)
+            ja = pos != 999
+        st.session_state._versao_lista = snap_p.versao
+        st.session_state._pos_lista = pos
 
         if ja:
             st.success(f"✅ Presença registrada: {pos}º")
@@ -810,86 +1061,47 @@ try:
             if exc_btn:
                 email_logado = str(u.get("Email")).strip().lower()
                 if dados_p and len(dados_p) > 1:
-                    for idx, r in enumerate(dados_p):
+                    for r in dados_p[1:]:
                         if len(r) >= 6 and str(r[5]).strip().lower() == email_logado:
-                            gs_call(sheet_p_escrita.delete_rows, idx + 1)
-                            buscar_presenca_atualizada.clear()
+                            # a posição no snapshot pode estar velha: exclui pela chave, relendo a linha na hora
+                            with cota.prioridade(cota.PRIORIDADE_PRESENCA):
+                                linha_removida = banco.remover_presenca_de(email_logado, r[0])
+                            if linha_removida is not None:
+                                remover_presenca_local(linha_removida, email_logado)
+                            else:
+                                recarregar("planilha")
                             st.rerun()
 
         elif aberto:
             salvar_btn = st.button("🚀 CONFIRMAR MINHA PRESENÇA ✅", use_container_width=True)
             if salvar_btn:
-                agora = datetime.now(FUSO_BR).strftime("%d/%m/%Y %H:%M:%S")
-                gs_call(sheet_p_escrita.append_row, [
-                    agora,
+                confirmacao = fila_presenca().enfileirar([
                     u.get("QG_RMCF_OUTROS") or "QG",
                     u.get("Graduação"),
                     u.get("Nome"),
                     u.get("Lotação"),
                     u.get("Email")
                 ])
-                buscar_presenca_atualizada.clear()
-                st.rerun()
+                try:
+                    with st.spinner("Registrando presença..."):
+                        confirmacao.result(timeout=60)
+                except Exception as e:
+                    st.error(f"⚠️ Não foi possível registrar: {e}")
+                else:
+                    # a fila já aplicou o lote no cache da lista
+                    st.rerun()
         else:
             st.info("⌛ Lista fechada para novas inscrições.")
 
             up_btn_fechado = st.button("🔄 ATUALIZAR", use_container_width=True)
             if up_btn_fechado:
-                buscar_presenca_atualizada.clear()
+                conferir_versao()
                 st.rerun()
 
         if ja and pos <= 3 and janela_conf:
-            st.divider()
-            st.subheader("📋 LISTA DE EMBARQUE 📋")
-            painel_btn = st.button("✍️ CONFERÊNCIA ✍️", use_container_width=True)
-            if painel_btn:
-                st.session_state.conf_ativa = not st.session_state.conf_ativa
-
-            if st.session_state.conf_ativa and (dados_p_show and len(dados_p_show) > 1):
-                for i, row in df_o.iterrows():
-                    label = f"{row.get('Nº','')} - {row.get('NOME','')}".strip()
-                    _ = st.checkbox(label if label else " ", key=f"chk_p_{i}")
-
-        if dados_p_show and len(dados_p_show) > 1:
-            insc = len(df_o)
-            rest = 38 - insc
-            st.subheader(f"Inscritos: {insc} | Vagas: 38 | {'Sobra' if rest >= 0 else 'Exc'}: {abs(rest)}")
-
-            c_up1, c_up2 = st.columns([1, 1])
-            with c_up1:
-                up_btn = st.button("🔄 ATUALIZAR", use_container_width=True)
-                if up_btn:
-                    buscar_presenca_atualizada.clear()
-                    st.rerun()
-            with c_up2:
-                st.caption("Atualiza sob demanda.")
+            secao_conferencia()
 
-            st.write(
-                f"<div class='tabela-responsiva'>{df_v.drop(columns=['EMAIL']).to_html(index=False, justify='center', border=0, escape=False)}</div>",
-                unsafe_allow_html=True
-            )
-
-            c1, c2 = st.columns(2)
-            with c1:
-                resumo = {"inscritos": insc, "vagas": 38}
-                pdf_bytes = gerar_pdf_apresentado(df_o, resumo)
-                _ = st.download_button(
-                    "📄 PDF (Relatório)",
-                    pdf_bytes,
-                    "lista_rota_nova_iguacu.pdf",
-                    use_container_width=True
-                )
-
-            with c2:
-                txt_w = "*🚌 LISTA DE PRESENÇA*\n\n"
-                for _, r in df_o.iterrows():
-                    txt_w += f"{r['Nº']}. {r['GRADUAÇÃO']} {r['NOME']}\n"
-                st.markdown(
-                    f'<a href="https://wa.me/?text={urllib.parse.quote(txt_w)}" target="_blank">'
-                    f"<button style='width:100%; height:38px; background-color:#25D366; color:white; border:none; "
-                    f"border-radius:4px; font-weight:bold;'>🟢 WHATSAPP</button></a>",
-                    unsafe_allow_html=True
-                )
+        secao_lista(str(u.get("Email")).strip().lower())
 
     st.markdown('<div class="footer">Desenvolvido por: <b>MAJ ANDRÉ AGUIAR - CAES®️</b></div>', unsafe_allow_html=True)
 
@@ -902,5 +1114,7 @@ try:
         unsafe_allow_html=True
     )
 
+    partida.primeiro_render()
+
 except Exception as e:
     st.error(f"⚠️ Erro: {e}")
@@ -0,0 +1,847 @@
+"""
+Camada de armazenamento da Rota: usuários, presença e config.
+
+Implementações:
+- ArmazenamentoSheets: Google Sheets via gspread (comportamento original).
+- ArmazenamentoSQLite: banco embutido local (latência de milissegundos, testes offline).
+- ArmazenamentoEspelhado: grava no primário e replica as escritas no espelho em segundo plano.
+
+`ler_tudo` devolve usuários, config e presença num único retrato
+(`LeituraPlanilha`); no Sheets é um só values_batch_get para as três abas.
+
+As linhas são sempre referenciadas pelo número da linha na planilha
+(cabeçalho = linha 1, primeiro registro = linha 2), inclusive no SQLite.
+"""
+import queue
+import random
+import sqlite3
+import threading
+import time as time_module
+
+import cota
+import metricas
+from diretorio import DiretorioUsuarios
+
+
+CABECALHO_USUARIOS = ["Nome", "Graduação", "Lotação", "Senha", "QG_RMCF_OUTROS", "Email", "TELEFONE", "STATUS"]
+CABECALHO_PRESENCA = ["DATA_HORA", "QG_RMCF_OUTROS", "GRADUAÇÃO", "NOME", "LOTAÇÃO", "EMAIL"]
+CABECALHO_ARQUIVO = ["CICLO"] + CABECALHO_PRESENCA
+CABECALHO_EMBARQUE = "EMBARQUE"   # coluna G da presença (ver embarque.py)
+
+COL_STATUS_USUARIO = 8
+COL_EMBARQUE = len(CABECALHO_PRESENCA) + 1
+LIMITE_PADRAO = 100
+CELULAS_VERSAO = "B1:B2"   # Config: B1 = "VERSAO", B2 = valor
+CELULAS_REGRAS = "C1:C2"   # Config: C1 = "HORARIOS", C2 = regras da agenda (agenda.py)
+
+
+def _ajustar(linha, n):
+    r = ["" if v is None else str(v) for v in list(linha)[:n]]
+    return r + [""] * (n - len(r))
+
+
+# ==========================================================
+# LEITURA CONSOLIDADA
+# ==========================================================
+class LeituraPlanilha:
+    """
+    Usuários, config e presença lidos no mesmo instante.
+    - usuarios: DiretorioUsuarios (registros no formato de get_all_records)
+    - limite: int; versao: texto da célula de versão ("" se não há)
+    - presenca: linhas a partir de `presenca_desde` (1 = com cabeçalho, como
+      get_all_values); None se ainda não há presença carregada
+    - embarque: só na leitura incremental, a coluna de embarque inteira
+      (valor por linha, cabeçalho incluído), já que marcas mudam linhas antigas
+    - regras: texto das regras de horário ("" = padrão, ver agenda.py)
+    """
+
+    def __init__(self, usuarios, limite, versao, presenca, presenca_desde=1, embarque=None, regras=""):
+        self.usuarios = usuarios
+        self.limite = limite
+        self.versao = versao
+        self.presenca = presenca
+        self.presenca_desde = presenca_desde
+        self.embarque = embarque
+        self.regras = regras
+
+    def com_presenca(self, linhas):
+        """Mesmo retrato com a presença completa trocada (None se `linhas` é None)."""
+        if linhas is None:
+            return None
+        return LeituraPlanilha(self.usuarios, self.limite, self.versao, linhas, regras=self.regras)
+
+    def __eq__(self, outro):
+        # `versao` fica de fora: a célula muda a cada escrita, inclusive as deste
+        # processo já aplicadas no cache, e não é dado que a tela mostre
+        return (
+            isinstance(outro, LeituraPlanilha)
+            and self.usuarios.registros == outro.usuarios.registros
+            and (self.limite, self.presenca, self.presenca_desde, self.embarque, self.regras)
+            == (outro.limite, outro.presenca, outro.presenca_desde, outro.embarque, outro.regras)
+        )
+
+    __hash__ = None
+
+
+# ==========================================================
+# WRAPPER COM AGENDADOR DE COTA / RETRY
+# ==========================================================
+def _nome_worksheet(func):
+    try:
+        return str(getattr(getattr(func, "__self__", None), "title", "") or "")
+    except Exception:
+        return ""
+
+
+def gs_call(func, *args, **kwargs):
+    """
+    Toda chamada pede ficha ao agendador de cota (cota.py) antes de ir à rede.
+    429: pausa o balde do tipo para todo o processo e tenta de novo na vez dela.
+    5xx: backoff exponencial com jitter, como antes.
+    Cada operação é registrada em metricas.py (latência, tentativas, resultado).
+    Prazo da requisição e recriação da conexão após falha: transporte.py.
+    """
+    from gspread.exceptions import APIError   # gspread só é carregado no 1º acesso ao Sheets
+    import transporte
+
+    tipo = cota.tipo_operacao(func)
+    prio = cota.prioridade_atual(tipo)
+    operacao = getattr(func, "__name__", "?")
+    inicio = time_module.perf_counter()
+    espera_cota = 0.0
+    n_429 = n_5xx = 0
+    max_tries = 6
+    base = 0.6
+
+    def registrar(tentativas, resultado):
+        metricas.registro().registrar(
+            operacao, _nome_worksheet(func), time_module.perf_counter() - inicio, tentativas, resultado,
+            http_429=n_429, http_5xx=n_5xx, espera_cota=espera_cota,
+        )
+
+    for attempt in range(max_tries):
+        try:
+            espera_cota += cota.agendador().adquirir(tipo, prio)
+        except cota.CotaEsgotada:
+            registrar(attempt, metricas.RESULTADO_ESGOTADO)
+            raise
+        try:
+            with transporte.prazo(tipo):
+                resultado = func(*args, **kwargs)
+            registrar(attempt + 1, metricas.RESULTADO_OK)
+            return resultado
+        except APIError as e:
+            msg = str(e)
+            is_429 = ("429" in msg) or ("Quota exceeded" in msg) or ("RESOURCE_EXHAUSTED" in msg)
+            is_5xx = any(code in msg for code in ["500", "502", "503", "504"])
+            if is_429:
+                n_429 += 1
+                cota.agendador().pausar(tipo, min(base * (2 ** attempt), 6.0))
+                continue
+            if is_5xx:
+                n_5xx += 1
+                sleep_s = (base * (2 ** attempt)) + random.uniform(0.0, 0.35)
+                time_module.sleep(min(sleep_s, 6.0))
+                continue
+            registrar(attempt + 1, metricas.RESULTADO_ERRO)
+            transporte.notificar_falha(e)
+            raise
+        except Exception as e:
+            registrar(attempt + 1, metricas.RESULTADO_ERRO)
+            transporte.notificar_falha(e)
+            raise
+    registrar(max_tries, metricas.RESULTADO_ESGOTADO)
+    raise APIError("Google Sheets: muitas requisições (429). Tente novamente em instantes.")
+
+
+# ==========================================================
+# INTERFACE
+# ==========================================================
+class Armazenamento:
+    """Contrato comum aos backends. Métodos de escrita não retornam nada (exceto marcar_versao)."""
+
+    nome = "base"
+
+    # ----- usuários -----
+    def listar_usuarios(self):
+        """Lista de dicts no formato de get_all_records (chaves = CABECALHO_USUARIOS)."""
+        raise NotImplementedError
+
+    def adicionar_usuario(self, linha):
+        raise NotImplementedError
+
+    def definir_status_usuario(self, linha_planilha, status):
+        raise NotImplementedError
+
+    def definir_status_todos(self, status, total):
+        raise NotImplementedError
+
+    def remover_usuario(self, linha_planilha):
+        raise NotImplementedError
+
+    def aplicar_alteracoes_usuarios(self, status_por_linha, linhas_remover):
+        """
+        Aplica de uma vez: status por linha ({linha: status}) e exclusão de
+        várias linhas. Todos os números de linha se referem ao estado ANTES
+        da operação. Padrão: uma chamada por item, excluindo de baixo para cima.
+        """
+        for linha, status in status_por_linha.items():
+            self.definir_status_usuario(linha, status)
+        for linha in sorted(set(linhas_remover), reverse=True):
+            self.remover_usuario(linha)
+
+    # ----- config -----
+    def ler_limite(self):
+        raise NotImplementedError
+
+    def salvar_limite(self, valor):
+        raise NotImplementedError
+
+    def ler_regras(self):
+        """Texto das regras de horário ("" = regras padrão da agenda)."""
+        raise NotImplementedError
+
+    def salvar_regras(self, texto):
+        raise NotImplementedError
+
+    # ----- versão dos dados (ver versao.py) -----
+    def ler_versao(self):
+        """Valor atual da versão (texto); muda a cada escrita marcada."""
+        raise NotImplementedError
+
+    def marcar_versao(self):
+        """Grava uma versão nova e a devolve."""
+        raise NotImplementedError
+
+    # ----- presença -----
+    def ler_presenca(self):
+        """Todas as linhas (com cabeçalho), no formato de get_all_values."""
+        raise NotImplementedError
+
+    def ler_presenca_desde(self, linha_planilha):
+        """Linhas a partir de `linha_planilha` (inclusive) até o fim."""
+        return (self.ler_presenca() or [])[linha_planilha - 1:]
+
+    def adicionar_presenca(self, linha):
+        raise NotImplementedError
+
+    def adicionar_presencas(self, linhas):
+        """Grava várias linhas de uma vez (padrão: uma a uma)."""
+        for linha in linhas:
+            self.adicionar_presenca(linha)
+
+    def remover_presenca(self, linha_planilha):
+        raise NotImplementedError
+
+    def localizar_presenca(self, email, data_hora=None):
+        """Linha (planilha) atual da inscrição de `email` (e `data_hora`, se dada); None se não está na lista."""
+        email = str(email).strip().lower()
+        for i, linha in enumerate((self.ler_presenca() or [])[1:], start=2):
+            r = _ajustar(linha, len(CABECALHO_PRESENCA))
+            if r[5].strip().lower() == email and (data_hora is None or r[0].strip() == str(data_hora).strip()):
+                return i
+        return None
+
+    def remover_presenca_de(self, email, data_hora=None):
+        """
+        Remove a inscrição pela chave (e-mail + data/hora), com a posição
+        lida na hora. Devolve a linha removida, ou None se ela não está mais lá.
+        """
+        linha = self.localizar_presenca(email, data_hora)
+        if linha is not None:
+            self.remover_presenca(linha)
+        return linha
+
+    def limpar_presenca(self):
+        raise NotImplementedError
+
+    def marcar_embarque(self, marcas):
+        """{linha_planilha: valor} na coluna de embarque, numa única escrita."""
+        raise NotImplementedError
+
+    def ler_embarque(self):
+        """Coluna de embarque inteira (cabeçalho incluído), um valor por linha."""
+        n = COL_EMBARQUE
+        return [_ajustar(l, n)[n - 1] for l in (self.ler_presenca() or [])]
+
+    def ler_marcas_embarque(self):
+        """[email, embarque] por linha (cabeçalho incluído): onde está cada e-mail agora, para gravar as marcas."""
+        n = COL_EMBARQUE
+        return [_ajustar(l, n)[n - 2:] for l in (self.ler_presenca() or [])]
+
+    # ----- arquivo de ciclos -----
+    def arquivar_presenca(self, ciclo, linhas):
+        """Copia as linhas de um ciclo encerrado para o arquivo, numa única escrita."""
+        raise NotImplementedError
+
+    # ----- leitura consolidada -----
+    def ler_tudo(self, presenca_desde=1):
+        """LeituraPlanilha com a presença a partir de `presenca_desde`. Padrão: uma leitura por parte."""
+        presenca_desde = int(presenca_desde)
+        embarque = None
+        if presenca_desde <= 1:
+            linhas = self.ler_presenca() or []
+        else:
+            linhas = self.ler_presenca_desde(presenca_desde) or []
+            embarque = self.ler_embarque()
+        return LeituraPlanilha(DiretorioUsuarios(self.listar_usuarios()), self.ler_limite(),
+                               self.ler_versao(), linhas, max(presenca_desde, 1), embarque, self.ler_regras())
+
+
+# ==========================================================
+# GOOGLE SHEETS
+# ==========================================================
+class ArmazenamentoSheets(Armazenamento):
+    """
+    Recebe funções que devolvem as worksheets (no app, as versões com
+    st.cache_resource), para que o handle seja reaproveitado entre chamadas.
+    """
+
+    nome = "sheets"
+
+    def __init__(self, ws_usuarios, ws_presenca, ws_config, ws_arquivo=None):
+        self._ws_usuarios = ws_usuarios
+        self._ws_presenca = ws_presenca
+        self._ws_config = ws_config
+        self._ws_arquivo = ws_arquivo
+
+    def listar_usuarios(self):
+        return gs_call(self._ws_usuarios().get_all_records)
+
+    def adicionar_usuario(self, linha):
+        gs_call(self._ws_usuarios().append_row, list(linha))
+
+    def definir_status_usuario(self, linha_planilha, status):
+        gs_call(self._ws_usuarios().update_cell, linha_planilha, COL_STATUS_USUARIO, status)
+
+    def definir_status_todos(self, status, total):
+        if total <= 0:
+            return
+        rng = f"H2:H{total + 1}"
+        gs_call(self._ws_usuarios().update, rng, [[status]] * total)
+
+    def remover_usuario(self, linha_planilha):
+        gs_call(self._ws_usuarios().delete_rows, linha_planilha)
+
+    def aplicar_alteracoes_usuarios(self, status_por_linha, linhas_remover):
+        sheet_u = self._ws_usuarios()
+        col = chr(ord("A") + COL_STATUS_USUARIO - 1)
+
+        # 1) status: um único batch_update de valores (linhas ainda na posição original)
+        atualizacoes = [
+            {"range": f"{col}{linha}", "values": [[status]]}
+            for linha, status in sorted(status_por_linha.items())
+        ]
+        if atualizacoes:
+            gs_call(sheet_u.batch_update, atualizacoes)
+
+        # 2) exclusões: um único batch_update estrutural, blocos contíguos de baixo
+        #    para cima, para que cada exclusão não desloque as seguintes
+        linhas = sorted(set(int(l) for l in linhas_remover), reverse=True)
+        if not linhas:
+            return
+        blocos = []
+        for linha in linhas:
+            if blocos and blocos[-1][0] == linha + 1:
+                blocos[-1][0] = linha
+            else:
+                blocos.append([linha, linha])
+        pedidos = [
+            {"deleteDimension": {"range": {
+                "sheetId": sheet_u.id, "dimension": "ROWS",
+                "startIndex": inicio - 1, "endIndex": fim,
+            }}}
+            for inicio, fim in blocos
+        ]
+        gs_call(sheet_u.spreadsheet.batch_update, {"requests": pedidos})
+
+    def ler_limite(self):
+        val = gs_call(self._ws_config().acell, "A2").value
+        return int(val)
+
+    def salvar_limite(self, valor):
+        gs_call(self._ws_config().update, "A2", [[str(valor)]])
+
+    def ler_regras(self):
+        return str(gs_call(self._ws_config().acell, "C2").value or "")
+
+    def salvar_regras(self, texto):
+        gs_call(self._ws_config().update, CELULAS_REGRAS, [["HORARIOS"], [str(texto)]])
+
+    def ler_versao(self):
+        return str(gs_call(self._ws_config().acell, "B2").value or "")
+
+    def marcar_versao(self):
+        # instante em ms em vez de contador: uma escrita só, sem ler antes
+        # (e sem corrida entre processos); basta que o valor mude
+        versao = str(time_module.time_ns() // 1_000_000)
+        gs_call(self._ws_config().update, CELULAS_VERSAO, [["VERSAO"], [versao]])
+        return versao
+
+    def ler_presenca(self):
+        return gs_call(self._ws_presenca().get_all_values)
+
+    def ler_presenca_desde(self, linha_planilha):
+        valores = gs_call(self._ws_presenca().get, f"A{int(linha_planilha)}:Z")
+        return [list(r) for r in (valores or [])]
+
+    def adicionar_presenca(self, linha):
+        gs_call(self._ws_presenca().append_row, list(linha))
+
+    def adicionar_presencas(self, linhas):
+        # append_rows = um único values_append para o lote inteiro
+        if linhas:
+            gs_call(self._ws_presenca().append_rows, [list(l) for l in linhas])
+
+    def remover_presenca(self, linha_planilha):
+        gs_call(self._ws_presenca().delete_rows, linha_planilha)
+
+    def localizar_presenca(self, email, data_hora=None):
+        # só DATA_HORA..EMAIL, numa leitura: a posição tem de ser a de agora, não a do snapshot
+        col = chr(ord("A") + len(CABECALHO_PRESENCA) - 1)
+        email = str(email).strip().lower()
+        valores = gs_call(self._ws_presenca().get, f"A1:{col}") or []
+        for i, linha in enumerate(valores[1:], start=2):
+            r = _ajustar(linha, len(CABECALHO_PRESENCA))
+            if r[5].strip().lower() == email and (data_hora is None or r[0].strip() == str(data_hora).strip()):
+                return i
+        return None
+
+    def limpar_presenca(self):
+        sheet_p = self._ws_presenca()
+        gs_call(sheet_p.resize, rows=1)
+        gs_call(sheet_p.resize, rows=100)
+
+    def marcar_embarque(self, marcas):
+        if not marcas:
+            return
+        col = chr(ord("A") + COL_EMBARQUE - 1)
+        # o cabeçalho vai junto: a coluna se explica na planilha e não custa outra chamada
+        dados = [{"range": f"{col}1", "values": [[CABECALHO_EMBARQUE]]}] + [
+            {"range": f"{col}{int(linha)}", "values": [[str(valor)]]}
+            for linha, valor in sorted(marcas.items()) if int(linha) > 1
+        ]
+        gs_call(self._ws_presenca().batch_update, dados)
+
+    def ler_embarque(self):
+        col = chr(ord("A") + COL_EMBARQUE - 1)
+        valores = gs_call(self._ws_presenca().get, f"{col}1:{col}")
+        return [r[0] if r else "" for r in (valores or [])]
+
+    def ler_marcas_embarque(self):
+        col_email, col = chr(ord("A") + COL_EMBARQUE - 2), chr(ord("A") + COL_EMBARQUE - 1)
+        valores = gs_call(self._ws_presenca().get, f"{col_email}1:{col}")
+        return [_ajustar(r, 2) for r in (valores or [])]
+
+    def arquivar_presenca(self, ciclo, linhas):
+        if self._ws_arquivo is None or not linhas:
+            return
+        n = len(CABECALHO_PRESENCA)
+        gs_call(self._ws_arquivo().append_rows, [[ciclo] + _ajustar(l, n) for l in linhas])
+
+    def ler_tudo(self, presenca_desde=1):
+        from gspread.utils import absolute_range_name, fill_gaps, numericise_all, to_records
+
+        presenca_desde = max(int(presenca_desde), 1)
+        ws_u, ws_c, ws_p = self._ws_usuarios(), self._ws_config(), self._ws_presenca()
+        faixas = [
+            absolute_range_name(ws_u.title),
+            absolute_range_name(ws_c.title, "A1:C2"),
+            absolute_range_name(ws_p.title) if presenca_desde == 1
+            else absolute_range_name(ws_p.title, f"A{presenca_desde}:Z"),
+        ]
+        if presenca_desde > 1:
+            # marcas de embarque mudam linhas já lidas: a coluna vem inteira (é estreita)
+            col = chr(ord("A") + COL_EMBARQUE - 1)
+            faixas.append(absolute_range_name(ws_p.title, f"{col}1:{col}"))
+        resposta = gs_call(ws_u.spreadsheet.values_batch_get, faixas)
+        valores = [r.get("values", []) for r in resposta.get("valueRanges", [])]
+        valores_u, valores_c, valores_p = valores[:3]
+        embarque = [r[0] if r else "" for r in valores[3]] if presenca_desde > 1 else None
+
+        # usuários exatamente como get_all_records (linhas completadas + numericise)
+        registros = []
+        if valores_u:
+            valores_u = fill_gaps(valores_u)
+            registros = to_records(valores_u[0], [numericise_all(r) for r in valores_u[1:]])
+
+        config = fill_gaps(valores_c, rows=2, cols=3)
+        try:
+            limite = int(config[1][0])
+        except ValueError:
+            limite = LIMITE_PADRAO
+
+        # presença completa como get_all_values; incremental como get
+        linhas = fill_gaps(valores_p) if presenca_desde == 1 and valores_p else [list(r) for r in valores_p]
+        return LeituraPlanilha(DiretorioUsuarios(registros), limite, str(config[1][1]), linhas, presenca_desde, embarque,
+                               str(config[1][2]))
+
+
+# ==========================================================
+# SQLITE (EMBUTIDO)
+# ==========================================================
+class ArmazenamentoSQLite(Armazenamento):
+    """
+    Uma conexão por processo, protegida por lock (as sessões do Streamlit
+    rodam em threads). A ordem das linhas é a ordem do id autoincremento,
+    reproduzindo a ordem de inserção da planilha.
+    """
+
+    nome = "sqlite"
+
+    def __init__(self, caminho=":memory:"):
+        self.caminho = caminho
+        self._lock = threading.RLock()
+        self._con = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        if caminho != ":memory:":
+            self._con.execute("PRAGMA journal_mode=WAL")
+            self._con.execute("PRAGMA synchronous=NORMAL")
+        self._criar_tabelas()
+
+    def _criar_tabelas(self):
+        cols_u = ", ".join(f"c{i} TEXT NOT NULL DEFAULT ''" for i in range(len(CABECALHO_USUARIOS)))
+        cols_p = ", ".join(f"c{i} TEXT NOT NULL DEFAULT ''" for i in range(len(CABECALHO_PRESENCA)))
+        with self._lock:
+            self._con.execute(f"CREATE TABLE IF NOT EXISTS usuarios (id INTEGER PRIMARY KEY AUTOINCREMENT, {cols_u})")
+            self._con.execute(f"CREATE TABLE IF NOT EXISTS presenca (id INTEGER PRIMARY KEY AUTOINCREMENT, {cols_p})")
+            self._con.execute("CREATE TABLE IF NOT EXISTS config (chave TEXT PRIMARY KEY, valor TEXT)")
+            cols_a = ", ".join(f"c{i} TEXT NOT NULL DEFAULT ''" for i in range(len(CABECALHO_ARQUIVO)))
+            self._con.execute(f"CREATE TABLE IF NOT EXISTS arquivo (id INTEGER PRIMARY KEY AUTOINCREMENT, {cols_a})")
+            # coluna de embarque (bancos criados antes dela também a recebem)
+            existentes = {r[1] for r in self._con.execute("PRAGMA table_info(presenca)").fetchall()}
+            if f"c{COL_EMBARQUE - 1}" not in existentes:
+                self._con.execute(f"ALTER TABLE presenca ADD COLUMN c{COL_EMBARQUE - 1} TEXT NOT NULL DEFAULT ''")
+
+    def _id_da_linha(self, tabela, linha_planilha):
+        offset = int(linha_planilha) - 2
+        if offset < 0:
+            return None
+        row = self._con.execute(
+            f"SELECT id FROM {tabela} ORDER BY id LIMIT 1 OFFSET ?", (offset,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _inserir(self, tabela, linhas, n):
+        cols = ", ".join(f"c{i}" for i in range(n))
+        marks = ", ".join("?" for _ in range(n))
+        with self._lock:
+            self._con.executemany(
+                f"INSERT INTO {tabela} ({cols}) VALUES ({marks})",
+                [_ajustar(l, n) for l in linhas],
+            )
+
+    def _remover(self, tabela, linha_planilha):
+        with self._lock:
+            rid = self._id_da_linha(tabela, linha_planilha)
+            if rid is not None:
+                self._con.execute(f"DELETE FROM {tabela} WHERE id = ?", (rid,))
+
+    # ----- usuários -----
+    def listar_usuarios(self):
+        n = len(CABECALHO_USUARIOS)
+        cols = ", ".join(f"c{i}" for i in range(n))
+        with self._lock:
+            rows = self._con.execute(f"SELECT {cols} FROM usuarios ORDER BY id").fetchall()
+        return [dict(zip(CABECALHO_USUARIOS, r)) for r in rows]
+
+    def adicionar_usuario(self, linha):
+        self._inserir("usuarios", [linha], len(CABECALHO_USUARIOS))
+
+    def definir_status_usuario(self, linha_planilha, status):
+        col = f"c{COL_STATUS_USUARIO - 1}"
+        with self._lock:
+            rid = self._id_da_linha("usuarios", linha_planilha)
+            if rid is not None:
+                self._con.execute(f"UPDATE usuarios SET {col} = ? WHERE id = ?", (str(status), rid))
+
+    def definir_status_todos(self, status, total):
+        if total <= 0:
+            return
+        col = f"c{COL_STATUS_USUARIO - 1}"
+        with self._lock:
+            self._con.execute(
+                f"UPDATE usuarios SET {col} = ? WHERE id IN (SELECT id FROM usuarios ORDER BY id LIMIT ?)",
+                (str(status), int(total)),
+            )
+
+    def remover_usuario(self, linha_planilha):
+        self._remover("usuarios", linha_planilha)
+
+    def aplicar_alteracoes_usuarios(self, status_por_linha, linhas_remover):
+        col = f"c{COL_STATUS_USUARIO - 1}"
+        with self._lock:
+            ids = [r[0] for r in self._con.execute("SELECT id FROM usuarios ORDER BY id").fetchall()]
+
+            def rid(linha):
+                pos = int(linha) - 2
+                return ids[pos] if 0 <= pos < len(ids) else None
+
+            self._con.execute("BEGIN")
+            try:
+                for linha, status in status_por_linha.items():
+                    if rid(linha) is not None:
+                        self._con.execute(f"UPDATE usuarios SET {col} = ? WHERE id = ?", (str(status), rid(linha)))
+                remover = [(rid(l),) for l in set(linhas_remover) if rid(l) is not None]
+                self._con.executemany("DELETE FROM usuarios WHERE id = ?", remover)
+                self._con.execute("COMMIT")
+            except Exception:
+                self._con.execute("ROLLBACK")
+                raise
+
+    # ----- config -----
+    def ler_limite(self):
+        with self._lock:
+            row = self._con.execute("SELECT valor FROM config WHERE chave = 'LIMITE'").fetchone()
+        return int(row[0]) if row else LIMITE_PADRAO
+
+    def salvar_limite(self, valor):
+        with self._lock:
+            self._con.execute(
+                "INSERT INTO config (chave, valor) VALUES ('LIMITE', ?) "
+                "ON CONFLICT(chave) DO UPDATE SET valor = excluded.valor",
+                (str(valor),),
+            )
+
+    def ler_regras(self):
+        with self._lock:
+            row = self._con.execute("SELECT valor FROM config WHERE chave = 'HORARIOS'").fetchone()
+        return row[0] if row else ""
+
+    def salvar_regras(self, texto):
+        with self._lock:
+            self._con.execute(
+                "INSERT INTO config (chave, valor) VALUES ('HORARIOS', ?) "
+                "ON CONFLICT(chave) DO UPDATE SET valor = excluded.valor",
+                (str(texto),),
+            )
+
+    def ler_versao(self):
+        with self._lock:
+            row = self._con.execute("SELECT valor FROM config WHERE chave = 'VERSAO'").fetchone()
+        return row[0] if row else ""
+
+    def marcar_versao(self):
+        with self._lock:
+            self._con.execute(
+                "INSERT INTO config (chave, valor) VALUES ('VERSAO', '1') "
+                "ON CONFLICT(chave) DO UPDATE SET valor = CAST(valor AS INTEGER) + 1"
+            )
+            return self._con.execute("SELECT valor FROM config WHERE chave = 'VERSAO'").fetchone()[0]
+
+    # ----- presença -----
+    def ler_presenca(self):
+        cols = ", ".join(f"c{i}" for i in range(COL_EMBARQUE))
+        with self._lock:
+            rows = self._con.execute(f"SELECT {cols} FROM presenca ORDER BY id").fetchall()
+        return [CABECALHO_PRESENCA + [CABECALHO_EMBARQUE]] + [list(r) for r in rows]
+
+    def ler_presenca_desde(self, linha_planilha):
+        linha_planilha = int(linha_planilha)
+        cols = ", ".join(f"c{i}" for i in range(COL_EMBARQUE))
+        with self._lock:
+            rows = self._con.execute(
+                f"SELECT {cols} FROM presenca ORDER BY id LIMIT -1 OFFSET ?", (max(linha_planilha - 2, 0),)
+            ).fetchall()
+        linhas = [list(r) for r in rows]
+        return [CABECALHO_PRESENCA + [CABECALHO_EMBARQUE]] + linhas if linha_planilha <= 1 else linhas
+
+    def adicionar_presenca(self, linha):
+        self._inserir("presenca", [linha], len(CABECALHO_PRESENCA))
+
+    def adicionar_presencas(self, linhas):
+        self._inserir("presenca", linhas, len(CABECALHO_PRESENCA))
+
+    def remover_presenca(self, linha_planilha):
+        self._remover("presenca", linha_planilha)
+
+    def remover_presenca_de(self, email, data_hora=None):
+        with self._lock:   # localizar e remover sem outra escrita no meio
+            return super().remover_presenca_de(email, data_hora)
+
+    def limpar_presenca(self):
+        with self._lock:
+            self._con.execute("DELETE FROM presenca")
+
+    def marcar_embarque(self, marcas):
+        col = f"c{COL_EMBARQUE - 1}"
+        with self._lock:
+            for linha, valor in marcas.items():
+                rid = self._id_da_linha("presenca", linha)
+                if rid is not None:
+                    self._con.execute(f"UPDATE presenca SET {col} = ? WHERE id = ?", (str(valor), rid))
+
+    def arquivar_presenca(self, ciclo, linhas):
+        n = len(CABECALHO_PRESENCA)
+        self._inserir("arquivo", [[ciclo] + _ajustar(l, n) for l in linhas], len(CABECALHO_ARQUIVO))
+
+    # ----- carga inicial -----
+    def esta_vazio(self):
+        with self._lock:
+            n_u = self._con.execute("SELECT COUNT(*) FROM usuarios").fetchone()[0]
+            n_c = self._con.execute("SELECT COUNT(*) FROM config").fetchone()[0]
+        return n_u == 0 and n_c == 0
+
+    def importar_de(self, origem):
+        """Copia usuários, limite, regras de horário e presença de outro backend (ex.: a planilha na 1ª subida)."""
+        usuarios = origem.listar_usuarios() or []
+        presenca = origem.ler_presenca() or []
+        limite = origem.ler_limite()
+        regras = origem.ler_regras()
+        with self._lock:
+            self._con.execute("BEGIN")
+            try:
+                self._con.execute("DELETE FROM usuarios")
+                self._con.execute("DELETE FROM presenca")
+                self._inserir("usuarios", [[u.get(c, "") for c in CABECALHO_USUARIOS] for u in usuarios],
+                              len(CABECALHO_USUARIOS))
+                self._inserir("presenca", presenca[1:], COL_EMBARQUE)
+                self.salvar_limite(limite)
+                self.salvar_regras(regras)
+                self._con.execute("COMMIT")
+            except Exception:
+                self._con.execute("ROLLBACK")
+                raise
+
+
+# ==========================================================
+# ESPELHO (PRIMÁRIO LOCAL + PLANILHA EM SEGUNDO PLANO)
+# ==========================================================
+class ArmazenamentoEspelhado(Armazenamento):
+    """
+    Leituras e escritas vão ao primário; cada escrita é reenfileirada para o
+    espelho e aplicada por uma thread própria, na mesma ordem. Falhas no
+    espelho não afetam o usuário: ficam registradas em `falhas_espelho`.
+    Exclusões de presença chegam ao espelho pela chave (e-mail + data/hora),
+    não pela posição: se os dois divergiram, a linha errada não é apagada lá.
+    """
+
+    def __init__(self, primario, espelho):
+        self.primario = primario
+        self.espelho = espelho
+        self.nome = f"{primario.nome}+{espelho.nome}"
+        self.falhas_espelho = 0
+        self._fila = queue.Queue()
+        self._thread = threading.Thread(target=self._loop_espelho, name="espelho-armazenamento", daemon=True)
+        self._thread.start()
+
+    def _loop_espelho(self):
+        while True:
+            metodo, args = self._fila.get()
+            try:
+                getattr(self.espelho, metodo)(*args)
+            except Exception:
+                self.falhas_espelho += 1
+            finally:
+                self._fila.task_done()
+
+    def pendentes_espelho(self):
+        return self._fila.qsize()
+
+    def _escrever(self, metodo, *args):
+        resultado = getattr(self.primario, metodo)(*args)
+        self._fila.put((metodo, args))
+        return resultado
+
+    def listar_usuarios(self):
+        return self.primario.listar_usuarios()
+
+    def adicionar_usuario(self, linha):
+        self._escrever("adicionar_usuario", list(linha))
+
+    def definir_status_usuario(self, linha_planilha, status):
+        self._escrever("definir_status_usuario", linha_planilha, status)
+
+    def definir_status_todos(self, status, total):
+        self._escrever("definir_status_todos", status, total)
+
+    def remover_usuario(self, linha_planilha):
+        self._escrever("remover_usuario", linha_planilha)
+
+    def aplicar_alteracoes_usuarios(self, status_por_linha, linhas_remover):
+        self._escrever("aplicar_alteracoes_usuarios", dict(status_por_linha), list(linhas_remover))
+
+    def ler_limite(self):
+        return self.primario.ler_limite()
+
+    def salvar_limite(self, valor):
+        self._escrever("salvar_limite", valor)
+
+    def ler_regras(self):
+        return self.primario.ler_regras()
+
+    def salvar_regras(self, texto):
+        self._escrever("salvar_regras", texto)
+
+    def ler_versao(self):
+        return self.primario.ler_versao()
+
+    def ler_tudo(self, presenca_desde=1):
+        return self.primario.ler_tudo(presenca_desde)
+
+    def marcar_versao(self):
+        return self._escrever("marcar_versao")
+
+    def ler_presenca(self):
+        return self.primario.ler_presenca()
+
+    def ler_presenca_desde(self, linha_planilha):
+        return self.primario.ler_presenca_desde(linha_planilha)
+
+    def adicionar_presenca(self, linha):
+        self._escrever("adicionar_presenca", list(linha))
+
+    def adicionar_presencas(self, linhas):
+        self._escrever("adicionar_presencas", [list(l) for l in linhas])
+
+    def remover_presenca(self, linha_planilha):
+        # o espelho pode ter divergido (escrita que falhou, edição manual): lá a
+        # exclusão é pela chave da linha, não pela posição
+        r = _ajustar((self.primario.ler_presenca_desde(linha_planilha) or [[]])[0], len(CABECALHO_PRESENCA))
+        self.primario.remover_presenca(linha_planilha)
+        if r[5].strip():
+            self._fila.put(("remover_presenca_de", (r[5], r[0])))
+        else:
+            self.falhas_espelho += 1   # linha sem e-mail: nada seguro para excluir no espelho
+
+    def remover_presenca_de(self, email, data_hora=None):
+        return self._escrever("remover_presenca_de", email, data_hora)
+
+    def limpar_presenca(self):
+        self._escrever("limpar_presenca")
+
+    def marcar_embarque(self, marcas):
+        self._escrever("marcar_embarque", dict(marcas))
+
+    def ler_embarque(self):
+        return self.primario.ler_embarque()
+
+    def ler_marcas_embarque(self):
+        return self.primario.ler_marcas_embarque()
+
+    def arquivar_presenca(self, ciclo, linhas):
+        self._escrever("arquivar_presenca", ciclo, [list(l) for l in linhas])
+
+
+# ==========================================================
+# FÁBRICA
+# ==========================================================
+def criar_armazenamento(cfg, ws_usuarios, ws_presenca, ws_config, ws_arquivo=None):
+    """
+    cfg (st.secrets["storage"], opcional):
+    backend = "sheets" | "sqlite"
+    sqlite_path = "rota.db"
+    espelhar_sheets = true   (só para sqlite: mantém a planilha como espelho)
+    """
+    cfg = dict(cfg or {})
+    backend = str(cfg.get("backend", "sheets")).strip().lower()
+    if backend != "sqlite":
+        return ArmazenamentoSheets(ws_usuarios, ws_presenca, ws_config, ws_arquivo)
+
+    local = ArmazenamentoSQLite(cfg.get("sqlite_path", "rota.db"))
+    if not cfg.get("espelhar_sheets", False):
+        return local
+
+    sheets = ArmazenamentoSheets(ws_usuarios, ws_presenca, ws_config, ws_arquivo)
+    if local.esta_vazio():
+        local.importar_de(sheets)
+    return ArmazenamentoEspelhado(local, sheets)
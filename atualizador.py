@@ -0,0 +1,195 @@
+"""
+Atualizador em segundo plano (stale-while-revalidate) para os snapshots
+compartilhados do processo: usuários, presença e config.
+
+Uma thread mantém cada fonte atualizada no seu próprio intervalo; as sessões
+leem sempre o último snapshot, na hora, junto com a idade dele. Só a primeira
+leitura de uma fonte (processo recém-iniciado) espera pela rede.
+
+Fontes sem leitura há mais de `ocioso_apos` segundos deixam de ser
+atualizadas (não gasta cota com o app parado) e voltam a ser assim que
+alguém as lê de novo. `ultimo` não conta como leitura: é para quem só
+consulta o snapshot (ex.: as regras de horário, de uma thread do processo)
+e não deve manter a fonte viva sem visitantes.
+
+Escrita direta no cache (`aplicar_local`): quem acabou de gravar aplica a
+própria escrita ao snapshot, que ganha uma versão nova na hora, sem reler a
+planilha. Uma carga de reconciliação é agendada logo em seguida; se a
+planilha confere com o que foi aplicado, a versão não muda. Uma carga que
+começou antes da escrita local é descartada (traria o estado sem ela) e
+refeita.
+
+`ao_mudar(valor)` (opcional, por fonte) é chamado pela thread quando uma
+carga traz valor diferente do anterior (não na 1ª carga). É assim que a
+célula de versão (versao.py), lida a cada poucos segundos, dispara a
+releitura da presença só quando algo mudou.
+"""
+import threading
+import time as time_module
+
+
+class Snapshot:
+    """`versao` só avança quando o valor carregado difere do anterior."""
+
+    def __init__(self, valor, atualizado_em, erro=None, versao=0):
+        self.valor = valor
+        self.atualizado_em = atualizado_em
+        self.erro = erro
+        self.versao = versao
+
+    def idade(self):
+        if self.atualizado_em is None:
+            return None
+        return time_module.time() - self.atualizado_em
+
+
+class _Fonte:
+    def __init__(self, nome, carregar, intervalo, padrao, ao_mudar=None):
+        self.nome = nome
+        self.carregar = carregar
+        self.intervalo = intervalo
+        self.ao_mudar = ao_mudar
+        self.snapshot = Snapshot(padrao, None)
+        self.proxima = 0.0
+        self.ultimo_acesso = time_module.time()
+        self.carregada = threading.Event()
+        self.geracao = 0
+        self.carregando = False
+        self.atualizacoes = 0
+        self.falhas = 0
+        self.escrita_local_em = 0.0
+        self.escritas_locais = 0
+
+
+class AtualizadorSnapshots:
+    def __init__(self, ocioso_apos=300.0):
+        self.ocioso_apos = ocioso_apos
+        self._fontes = {}
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._loop, name="atualizador-snapshots", daemon=True)
+        self._thread.start()
+
+    def registrar(self, nome, carregar, intervalo, padrao=None, ao_mudar=None):
+        with self._cond:
+            self._fontes[nome] = _Fonte(nome, carregar, intervalo, padrao, ao_mudar)
+            self._cond.notify_all()
+
+    # ----- leitura (nunca bloqueia depois da 1ª carga) -----
+    def ler(self, nome, timeout_primeira=30.0):
+        fonte = self._fontes[nome]
+        acordar = time_module.time() - fonte.ultimo_acesso > self.ocioso_apos
+        fonte.ultimo_acesso = time_module.time()
+        if acordar:
+            self.atualizar(nome)
+        if not fonte.carregada.is_set():
+            fonte.carregada.wait(timeout_primeira)
+        return fonte.snapshot
+
+    def ultimo(self, nome):
+        """Snapshot atual como está: não espera a 1ª carga nem acorda a fonte ociosa."""
+        return self._fontes[nome].snapshot
+
+    # ----- pedidos de atualização -----
+    def atualizar(self, nome, esperar=False, timeout=15.0):
+        """Antecipa a próxima carga da fonte; com esperar=True aguarda ela terminar."""
+        fonte = self._fontes[nome]
+        with self._cond:
+            # carga já em andamento pode ter começado antes da escrita: espera a seguinte
+            alvo = fonte.geracao + (2 if fonte.carregando else 1)
+            fonte.proxima = 0.0
+            self._cond.notify_all()
+            if esperar:
+                self._cond.wait_for(lambda: fonte.geracao >= alvo, timeout)
+        return fonte.snapshot
+
+    def aplicar_local(self, nome, transformar, reconciliar_em=2.0):
+        """
+        Snapshot novo = transformar(valor atual), com versão nova, sem ir à rede.
+        Se a fonte ainda não carregou (ou transformar falhar), só pede uma atualização.
+        """
+        fonte = self._fontes[nome]
+        with self._cond:
+            anterior = fonte.snapshot
+            try:
+                novo = transformar(anterior.valor) if fonte.carregada.is_set() else None
+            except Exception:
+                novo = None
+            if novo is not None:
+                fonte.snapshot = Snapshot(novo, anterior.atualizado_em, versao=anterior.versao + 1)
+                fonte.escrita_local_em = time_module.time()
+                fonte.escritas_locais += 1
+                fonte.proxima = min(fonte.proxima, time_module.time() + reconciliar_em)
+            else:
+                fonte.proxima = 0.0
+            self._cond.notify_all()
+        return fonte.snapshot
+
+    def estatisticas(self):
+        return {
+            nome: {
+                "idade_s": f.snapshot.idade(),
+                "atualizacoes": f.atualizacoes,
+                "falhas": f.falhas,
+                "escritas_locais": f.escritas_locais,
+                "erro": str(f.snapshot.erro) if f.snapshot.erro else "",
+            }
+            for nome, f in self._fontes.items()
+        }
+
+    # ----- thread -----
+    def _proxima_vencida(self):
+        agora = time_module.time()
+        pendente, espera = None, 1.0
+        for f in self._fontes.values():
+            ocioso = agora - f.ultimo_acesso > self.ocioso_apos and f.carregada.is_set()
+            if ocioso:
+                continue
+            if f.proxima <= agora:
+                if pendente is None or f.proxima < pendente.proxima:
+                    pendente = f
+            else:
+                espera = min(espera, f.proxima - agora)
+        return pendente, espera
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                fonte, espera = self._proxima_vencida()
+                if fonte is None:
+                    self._cond.wait(espera)
+                    continue
+                fonte.proxima = time_module.time() + fonte.intervalo
+                fonte.carregando = True
+                inicio = time_module.time()
+
+            avisar = False
+            try:
+                valor = fonte.carregar()
+                with self._cond:
+                    if fonte.escrita_local_em >= inicio:
+                        # leitura anterior à escrita aplicada no cache: descarta e relê
+                        fonte.proxima = 0.0
+                    else:
+                        anterior = fonte.snapshot
+                        primeira = anterior.atualizado_em is None
+                        mudou = primeira or valor != anterior.valor
+                        fonte.snapshot = Snapshot(valor, time_module.time(), versao=anterior.versao + (1 if mudou else 0))
+                        avisar = mudou and not primeira and fonte.ao_mudar is not None
+                fonte.atualizacoes += 1
+            except Exception as e:
+                # mantém o último valor bom; só registra o erro
+                anterior = fonte.snapshot
+                fonte.snapshot = Snapshot(anterior.valor, anterior.atualizado_em, erro=e, versao=anterior.versao)
+                fonte.falhas += 1
+
+            with self._cond:
+                fonte.geracao += 1
+                fonte.carregando = False
+                fonte.carregada.set()
+                self._cond.notify_all()
+
+            if avisar:
+                try:
+                    fonte.ao_mudar(valor)
+                except Exception:
+                    pass
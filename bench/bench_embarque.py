@@ -0,0 +1,148 @@
+"""
+Conferência do embarque contra o Google Sheets falso (bench/planilha_falsa.py).
+
+Três conferentes (cada um num processo do app, com seu próprio snapshot)
+marcam e desmarcam a sua parte da lista em rajadas, como no embarque; as
+primeiras gravações falham (sinal ruim / planilha fora). No meio da
+conferência, outro processo exclui militares da lista (as linhas abaixo
+sobem). Mostra:
+- cliques x batch_update efetivamente feitos (debounce);
+- se, ao final, a planilha e os snapshots dos três conferem com a última
+  intenção de cada militar que ficou na lista (nenhuma marca caiu na linha
+  de outro).
+
+Uso:
+  python bench/bench_embarque.py --inscritos 38 --cliques 150 --exclusoes 4
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time as time_module
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cota  # noqa: E402
+from armazenamento import ArmazenamentoSheets, CABECALHO_PRESENCA, CABECALHO_USUARIOS  # noqa: E402
+from atualizador import AtualizadorSnapshots  # noqa: E402
+from embarque import ConferenciaEmbarque, aplicar_marcas, com_embarque, conferidos  # noqa: E402
+from planilha_falsa import ServidorFalso, WorksheetFalsa  # noqa: E402
+from presenca import SincronizadorPresenca  # noqa: E402
+from versao import VersaoDados  # noqa: E402
+
+
+class _Instavel:
+    """Backend cujas primeiras `falhas` marcações de embarque dão erro."""
+
+    def __init__(self, banco, falhas):
+        self._banco = banco
+        self.restantes = falhas
+
+    def __getattr__(self, nome):
+        return getattr(self._banco, nome)
+
+    def marcar_embarque(self, marcas):
+        if self.restantes > 0:
+            self.restantes -= 1
+            raise ConnectionError("sem sinal")
+        return self._banco.marcar_embarque(marcas)
+
+
+def processo(ws_u, ws_p, ws_c, falhas, intervalo):
+    """Um processo do app: snapshot da planilha + versão + conferência."""
+    banco = VersaoDados(_Instavel(ArmazenamentoSheets(lambda: ws_u, lambda: ws_p, lambda: ws_c), falhas))
+    sinc = SincronizadorPresenca(banco)
+    at = AtualizadorSnapshots()
+
+    def carregar():
+        desde = sinc.linha_inicial()
+        leitura = banco.ler_tudo(desde)
+        return leitura.com_presenca(com_embarque(sinc.sincronizar(leitura.presenca, desde).linhas, leitura.embarque))
+
+    at.registrar("planilha", carregar, intervalo=30)
+    at.registrar("versao", banco.ler_versao, intervalo=0.5, padrao="",
+                 ao_mudar=lambda v: v != banco.versao_propria and at.atualizar("planilha"))
+    conf = ConferenciaEmbarque(
+        banco, intervalo=intervalo, intervalo_retentativa=0.5,
+        ao_gravar=lambda m: at.aplicar_local(
+            "planilha", lambda atual: atual.com_presenca(aplicar_marcas(atual.presenca, m))),
+    )
+    at.ler("planilha")
+    return at, conf
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--inscritos", type=int, default=38)
+    ap.add_argument("--cliques", type=int, default=150, help="cliques por conferente")
+    ap.add_argument("--intervalo", type=float, default=1.0, help="mínimo entre batch_update (s)")
+    ap.add_argument("--falhas", type=int, default=2, help="gravações que falham no início, por conferente")
+    ap.add_argument("--exclusoes", type=int, default=4, help="militares excluídos durante a conferência")
+    ap.add_argument("--latencia", type=float, default=0.15)
+    args = ap.parse_args()
+
+    cota.configurar(leituras_por_min=10 ** 6, escritas_por_min=10 ** 6, rajada=10 ** 6)
+    servidor = ServidorFalso(latencia=args.latencia, jitter=0.05, leituras_por_min=10 ** 6, escritas_por_min=10 ** 6)
+    emails = [f"militar{i:03d}@rota.br" for i in range(args.inscritos)]
+    ws_u = WorksheetFalsa(servidor, "Usuarios", [CABECALHO_USUARIOS])
+    ws_p = WorksheetFalsa(servidor, "Presenca", [CABECALHO_PRESENCA] + [
+        ["17/10/2026 07:00:00", "QG", "SD", f"MILITAR {i:03d}", "UNIDADE", e] for i, e in enumerate(emails)])
+    ws_c = WorksheetFalsa(servidor, "Config", [["LIMITE"], ["100"]])
+
+    conferentes = [processo(ws_u, ws_p, ws_c, args.falhas, args.intervalo) for _ in range(3)]
+    intencao = {}
+    lock = threading.Lock()
+    rnd = random.Random(7)
+
+    def conferir(conf, meus):
+        # cada conferente cuida da sua parte da fila (porta/viatura)
+        for _ in range(args.cliques):
+            email, valor = rnd.choice(meus), rnd.random() < 0.7
+            with lock:
+                conf.marcar(email, valor)
+                intencao[email] = valor
+            time_module.sleep(rnd.uniform(0.0, 0.02))
+
+    excluidos = set()
+    outro = VersaoDados(ArmazenamentoSheets(lambda: ws_u, lambda: ws_p, lambda: ws_c))
+
+    def excluir():
+        # outro processo (ou o ADM) tirando gente da lista: as linhas de baixo sobem
+        for email in rnd.sample(emails[:len(emails) // 2], min(args.exclusoes, len(emails) // 2)):
+            time_module.sleep(rnd.uniform(0.2, 0.8))
+            linhas = outro.ler_presenca()
+            linha = next(i for i, l in enumerate(linhas[1:], start=2) if l[5] == email)
+            with lock:
+                excluidos.add(email)
+            outro.remover_presenca(linha)
+
+    inicio = time_module.perf_counter()
+    threads = [threading.Thread(target=conferir, args=(conf, emails[n::3]))
+               for n, (_, conf) in enumerate(conferentes)] + [threading.Thread(target=excluir)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for _, conf in conferentes:
+        while conf.pendentes():
+            time_module.sleep(0.05)
+    gravacao_s = time_module.perf_counter() - inicio
+    time_module.sleep(3.0)   # versão lida nos outros processos e reconciliação de quem gravou (2 s)
+
+    esperado = {e for e, v in intencao.items() if v and e not in excluidos}
+    planilha = conferidos(ws_p.get_all_values())
+    cliques = sum(c.estatisticas()["cliques"] for _, c in conferentes)
+    lotes = sum(c.estatisticas()["lotes"] for _, c in conferentes)
+    falhas = sum(c.estatisticas()["falhas"] for _, c in conferentes)
+    refeitas = sum(c.estatisticas()["refeitas"] for _, c in conferentes)
+    print(f"{cliques} cliques de 3 conferentes -> {lotes} batch_update ({falhas} falhas, refeitas) "
+          f"em {gravacao_s:.1f}s; {len(excluidos)} excluídos no meio, {refeitas} marca(s) regravada(s)")
+    print(f"planilha confere com a última intenção: {planilha == esperado} ({len(esperado)} conferidos)")
+    for n, (at, _) in enumerate(conferentes, start=1):
+        print(f"snapshot do conferente {n} confere: {conferidos(at.ler('planilha').valor.presenca) == esperado}")
+    print(f"chamadas ao Sheets: {servidor.chamadas}")
+
+
+if __name__ == "__main__":
+    main()
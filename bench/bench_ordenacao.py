@@ -0,0 +1,136 @@
+"""
+Micro-benchmark da ordenação: implementação antiga (apply + iterrows) x
+ordenacao.aplicar_ordenacao (chaves vetorizadas + lexsort) x
+ordenacao.ordenar_linhas (sem pandas, registros com __slots__).
+
+Só mede tempo; a paridade entre os caminhos (ordem, Nº/Exc, tabela,
+WhatsApp) é conferida em tests/test_ordenacao.py.
+
+Uso:  python bench/bench_ordenacao.py [--repeticoes 20] [--tamanhos 38 200 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ordenacao import aplicar_ordenacao, ordenar_linhas  # noqa: E402
+from relatorio import ListaRenderizada, ordenar_pandas  # noqa: E402
+
+
+GRADS = ["TCEL", "MAJ", "CAP", "1º TEN", "2º TEN", "SUBTEN", "1º SGT",
+         "2º SGT", "3º SGT", "CB", "SD", "FC COM", "FC TER"]
+ORIGENS = ["QG", "RMCF", "OUTROS"]
+COLUNAS = ["DATA_HORA", "QG_RMCF_OUTROS", "GRADUAÇÃO", "NOME", "LOTAÇÃO", "EMAIL"]
+
+
+def aplicar_ordenacao_legado(df):
+    """
+    Versão anterior, usada só como referência. Única diferença: df_v é
+    convertido para object, senão os pandas recentes recusam gravar o span
+    nas colunas auxiliares inteiras (o código antigo quebrava com excedentes).
+    """
+    if "EMAIL" not in df.columns:
+        df["EMAIL"] = "N/A"
+
+    if "QG_RMCF_OUTROS" not in df.columns and "ORIGEM" in df.columns:
+        df["QG_RMCF_OUTROS"] = df["ORIGEM"]
+    if "QG_RMCF_OUTROS" not in df.columns:
+        df["QG_RMCF_OUTROS"] = ""
+
+    p_orig = {"QG": 1, "RMCF": 2, "OUTROS": 3}
+
+    p_grad_normal = {
+        "TCEL": 1, "MAJ": 2, "CAP": 3, "1º TEN": 4, "2º TEN": 5, "SUBTEN": 6,
+        "1º SGT": 7, "2º SGT": 8, "3º SGT": 9, "CB": 10, "SD": 11
+    }
+
+    def grupo_fc(grad):
+        g = str(grad or "").strip().upper()
+        if g == "FC COM":
+            return 1
+        if g == "FC TER":
+            return 2
+        return 0
+
+    df["grupo_fc"] = df["GRADUAÇÃO"].apply(grupo_fc)
+    df["p_o"] = df["QG_RMCF_OUTROS"].map(p_orig).fillna(99)
+
+    def p_grad(row):
+        if int(row.get("grupo_fc", 0)) == 0:
+            return p_grad_normal.get(str(row.get("GRADUAÇÃO", "")).strip().upper(), 999)
+        return 0
+
+    df["p_g"] = df.apply(p_grad, axis=1)
+    df["dt"] = pd.to_datetime(df["DATA_HORA"], dayfirst=True, errors="coerce")
+
+    df = df.sort_values(by=["grupo_fc", "p_o", "p_g", "dt"]).reset_index(drop=True)
+    df.insert(0, "Nº", [str(i + 1) if i < 38 else f"Exc-{i - 37:02d}" for i in range(len(df))])
+
+    df_v = df.copy().astype(object)
+    for i, r in df_v.iterrows():
+        if "Exc-" in str(r["Nº"]):
+            for c in df_v.columns:
+                df_v.at[i, c] = f"<span style='color:#d32f2f; font-weight:bold;'>{r[c]}</span>"
+
+    return df.drop(columns=["grupo_fc", "p_o", "p_g", "dt"]), df_v.drop(columns=["grupo_fc", "p_o", "p_g", "dt"])
+
+
+def gerar_linhas(n, semente=42):
+    """Linhas no formato da planilha, com horários distintos (ordem determinística)."""
+    rnd = random.Random(semente)
+    inicio = datetime(2026, 1, 4, 19, 0, 0)
+    linhas = []
+    for i in range(n):
+        dt = inicio + timedelta(seconds=i)
+        linhas.append([
+            dt.strftime("%d/%m/%Y %H:%M:%S"),
+            rnd.choice(ORIGENS),
+            rnd.choice(GRADS),
+            f"MILITAR {i:04d}",
+            f"UNIDADE {rnd.randint(1, 40)}",
+            f"militar{i:04d}@rota.br",
+        ])
+    rnd.shuffle(linhas)
+    return linhas
+
+
+def medir(func, linhas, repeticoes):
+    tempos = timeit.repeat(lambda: func(pd.DataFrame(linhas, columns=COLUNAS)), number=1, repeat=repeticoes)
+    return min(tempos) * 1000
+
+
+def medir_render(ordenar, linhas, repeticoes):
+    """Ordenação + tabela + WhatsApp, como o app faz a cada versão nova da lista."""
+    tempos = timeit.repeat(lambda: ListaRenderizada(*ordenar(COLUNAS, linhas)), number=1, repeat=repeticoes)
+    return min(tempos) * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--repeticoes", type=int, default=20)
+    ap.add_argument("--tamanhos", type=int, nargs="+", default=[38, 200, 2000])
+    args = ap.parse_args()
+
+    print(f"{'linhas':>8} {'legado (ms)':>12} {'vetorizado (ms)':>16} {'ganho':>7}")
+    for n in args.tamanhos:
+        linhas = gerar_linhas(n)
+        t_leg = medir(aplicar_ordenacao_legado, linhas, args.repeticoes)
+        t_new = medir(aplicar_ordenacao, linhas, args.repeticoes)
+        print(f"{n:>8} {t_leg:>12.2f} {t_new:>16.2f} {t_leg / t_new:>6.1f}x")
+
+    print(f"\n{'linhas':>8} {'render pandas (ms)':>19} {'render sem pandas (ms)':>23} {'ganho':>7}")
+    for n in args.tamanhos:
+        linhas = gerar_linhas(n)
+        t_pd = medir_render(ordenar_pandas, linhas, args.repeticoes)
+        t_rap = medir_render(ordenar_linhas, linhas, args.repeticoes)
+        print(f"{n:>8} {t_pd:>19.2f} {t_rap:>23.2f} {t_pd / t_rap:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+Teste de carga offline: simula a corrida da abertura da lista (19:00 de
+domingo / 07:00) contra um Google Sheets falso (bench/planilha_falsa.py),
+sem rede.
+
+Cada usuário simulado: atualiza a lista, renderiza (ordenação + PDF),
+confirma presença, atualiza de novo e, com probabilidade --p-exclusao,
+exclui a presença. Em paralelo, --admins administradores listam usuários e
+alteram status.
+
+Modos:
+  atual   como o app: snapshot em segundo plano (sincronização incremental),
+          fila de escrita em lote, single-flight e agendador de cota
+  legado  um append_row por clique + get_all_values completo a cada atualização
+
+Relata p50/p95/p99 por caminho, chamadas ao Sheets por usuário, 429s e
+esgotamento de cota. Com --saida grava JSON; com --baseline compara.
+
+Uso:
+  python bench/carga.py --usuarios 40 --modo atual --saida atual.json
+  python bench/carga.py --usuarios 40 --modo legado --saida legado.json
+  python bench/carga.py --usuarios 40 --baseline legado.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time as time_module
+import urllib.parse
+from datetime import datetime
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cota  # noqa: E402
+import metricas  # noqa: E402
+from armazenamento import (  # noqa: E402
+    ArmazenamentoSheets, CABECALHO_PRESENCA, CABECALHO_USUARIOS, LIMITE_PADRAO, LeituraPlanilha)
+from atualizador import AtualizadorSnapshots  # noqa: E402
+from concorrencia import LeiturasCompartilhadas  # noqa: E402
+from diretorio import DiretorioUsuarios  # noqa: E402
+from embarque import com_embarque  # noqa: E402
+from fila_presenca import FilaPresenca  # noqa: E402
+from ordenacao import aplicar_ordenacao  # noqa: E402
+from planilha_falsa import ServidorFalso, WorksheetFalsa  # noqa: E402
+from presenca import SincronizadorPresenca, acrescentar_linhas, remover_linha  # noqa: E402
+from relatorio import lista_renderizada  # noqa: E402
+from relatorio_pdf import gerar_pdf_apresentado  # noqa: E402
+from versao import VersaoDados  # noqa: E402
+
+
+GRADS = ["TCEL", "MAJ", "CAP", "1º TEN", "2º TEN", "SUBTEN", "1º SGT",
+         "2º SGT", "3º SGT", "CB", "SD", "FC COM", "FC TER"]
+ORIGENS = ["QG", "RMCF", "OUTROS"]
+CAMINHOS = ("atualizar", "recarregar", "renderizar", "confirmar", "excluir", "admin", "pdf")
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    v = sorted(valores)
+    k = min(len(v) - 1, max(0, int(round(p / 100.0 * (len(v) - 1)))))
+    return v[k]
+
+
+class Cenario:
+    def __init__(self, args):
+        self.args = args
+        self.rnd = random.Random(args.semente)
+        self.servidor = ServidorFalso(
+            latencia=args.latencia, jitter=args.jitter,
+            leituras_por_min=args.cota_leitura, escritas_por_min=args.cota_escrita,
+            minuto=args.minuto,
+        )
+        escala = 60.0 / args.minuto
+        if args.modo == "legado":
+            # sem agendador: só o backoff cego do retry
+            cota.configurar(leituras_por_min=10 ** 9, escritas_por_min=10 ** 9, rajada=10 ** 9)
+        else:
+            cota.configurar(leituras_por_min=args.cota_leitura * escala,
+                            escritas_por_min=args.cota_escrita * escala, rajada=10)
+
+        self.usuarios = [self._usuario(i) for i in range(args.usuarios)]
+        self.ws_u = WorksheetFalsa(self.servidor, "Usuarios",
+                                   [CABECALHO_USUARIOS] + [[u[c] for c in CABECALHO_USUARIOS] for u in self.usuarios])
+        self.ws_p = WorksheetFalsa(self.servidor, "Presenca", [CABECALHO_PRESENCA])
+        self.ws_c = WorksheetFalsa(self.servidor, "Config", [["LIMITE"], ["100"]])
+
+        sheets = ArmazenamentoSheets(lambda: self.ws_u, lambda: self.ws_p, lambda: self.ws_c)
+        self.banco = LeiturasCompartilhadas(sheets if args.modo == "legado" else VersaoDados(sheets))
+        self.sinc = SincronizadorPresenca(self.banco)
+        self.atualizador = AtualizadorSnapshots()
+        self.atualizador.registrar("planilha", self._carregar_planilha, intervalo=30,
+                                   padrao=LeituraPlanilha(DiretorioUsuarios([]), LIMITE_PADRAO, "", None))
+        if args.modo != "legado":
+            self.atualizador.registrar("versao", self.banco.ler_versao, intervalo=3, padrao="",
+                                       ao_mudar=self._versao_mudou)
+        self.fila = FilaPresenca(self.banco, relogio=datetime.now, intervalo=args.intervalo_fila,
+                                 ao_gravar=self._gravado)
+
+        self.latencias = {c: [] for c in CAMINHOS}
+        self.falhas = {c: 0 for c in CAMINHOS}
+        self._lock = threading.Lock()
+
+    def _carregar_planilha(self):
+        """Como no app: usuários, config e presença (incremental) numa leitura só."""
+        desde = self.sinc.linha_inicial()
+        leitura = self.banco.ler_tudo(desde)
+        linhas = self.sinc.sincronizar(leitura.presenca, desde).linhas
+        return leitura.com_presenca(com_embarque(linhas, leitura.embarque))
+
+    def _gravado(self, linhas):
+        """Como no app: o lote gravado entra direto no cache da lista."""
+        self.sinc.acrescentar_local(linhas)
+        self.atualizador.aplicar_local(
+            "planilha", lambda atual: atual.com_presenca(acrescentar_linhas(atual.presenca, linhas)))
+
+    def _versao_mudou(self, versao):
+        if versao != self.banco.versao_propria:
+            self.atualizador.atualizar("planilha")
+
+    def _usuario(self, i):
+        return {
+            "Nome": f"MILITAR {i:04d}", "Graduação": self.rnd.choice(GRADS), "Lotação": f"UNIDADE {i % 40}",
+            "Senha": "123", "QG_RMCF_OUTROS": self.rnd.choice(ORIGENS), "Email": f"militar{i:04d}@rota.br",
+            "TELEFONE": "(21) 99999.0000", "STATUS": "ATIVO",
+        }
+
+    # ----- caminhos -----
+    def _medir(self, caminho, func, *args):
+        inicio = time_module.perf_counter()
+        try:
+            return func(*args)
+        except Exception:
+            with self._lock:
+                self.falhas[caminho] += 1
+            return None
+        finally:
+            with self._lock:
+                self.latencias[caminho].append(time_module.perf_counter() - inicio)
+
+    def atualizar(self):
+        if self.args.modo == "legado":
+            return self.banco.ler_presenca()
+        return self.atualizador.ler("planilha").valor.presenca
+
+    def recarregar(self):
+        """Depois de uma escrita: no legado relê tudo; no atual a escrita já está no cache."""
+        if self.args.modo == "legado":
+            return self.banco.ler_presenca()
+        return self.atualizador.ler("planilha").valor.presenca
+
+    def renderizar(self, linhas):
+        """Ordenação + tabela HTML + texto do WhatsApp; no atual, uma vez por conteúdo."""
+        if not linhas or len(linhas) < 2:
+            return None
+        linhas = [l[:6] for l in linhas]
+        if self.args.modo == "legado":
+            df_o, df_v = aplicar_ordenacao(pd.DataFrame(linhas[1:], columns=linhas[0]))
+            df_v.drop(columns=["EMAIL"]).to_html(index=False, justify="center", border=0, escape=False)
+            urllib.parse.quote("".join(f"{r['Nº']}. {r['GRADUAÇÃO']} {r['NOME']}\n" for _, r in df_o.iterrows()))
+            return [r for _, r in df_o.iterrows()]
+        return lista_renderizada(linhas)
+
+    def pdf(self, lista):
+        if lista is None:
+            return None
+        if self.args.modo == "legado":
+            return gerar_pdf_apresentado(lista, {"inscritos": len(lista), "vagas": 38})
+        return lista.pdf({"inscritos": lista.inscritos, "vagas": 38})
+
+    def confirmar(self, u):
+        dados = [u["QG_RMCF_OUTROS"], u["Graduação"], u["Nome"], u["Lotação"], u["Email"]]
+        if self.args.modo == "legado":
+            with cota.prioridade(cota.PRIORIDADE_PRESENCA):
+                self.banco.adicionar_presenca([datetime.now().strftime("%d/%m/%Y %H:%M:%S")] + dados)
+            return True
+        return self.fila.enfileirar(dados).result(timeout=300)
+
+    def excluir(self, u):
+        linhas = self.atualizar() or []
+        for idx, r in enumerate(linhas):
+            if len(r) >= 6 and r[5] == u["Email"]:
+                if self.args.modo == "legado":
+                    with cota.prioridade(cota.PRIORIDADE_PRESENCA):
+                        self.banco.remover_presenca(idx + 1)
+                    return True
+                # como o app: pela chave, com a posição relida na hora
+                with cota.prioridade(cota.PRIORIDADE_PRESENCA):
+                    linha = self.banco.remover_presenca_de(u["Email"], r[0])
+                if linha is not None:
+                    self.sinc.remover_local(linha, u["Email"])
+                    self.atualizador.aplicar_local(
+                        "planilha", lambda atual: atual.com_presenca(remover_linha(atual.presenca, linha, u["Email"])))
+                return linha is not None
+        return False
+
+    def admin(self):
+        registros = self.banco.listar_usuarios()
+        if registros:
+            linhas = self.rnd.sample(range(2, len(registros) + 2), min(5, len(registros)))
+            self.banco.aplicar_alteracoes_usuarios({l: "ATIVO" for l in linhas}, [])
+
+    # ----- atores -----
+    def usuario(self, u, atraso):
+        time_module.sleep(atraso)
+        linhas = self._medir("atualizar", self.atualizar)
+        lista = self._medir("renderizar", self.renderizar, linhas)
+        self._medir("pdf", self.pdf, lista)
+        self._medir("confirmar", self.confirmar, u)
+        self._medir("recarregar", self.recarregar)
+        if self.rnd.random() < self.args.p_exclusao:
+            self._medir("excluir", self.excluir, u)
+            self._medir("recarregar", self.recarregar)
+
+    def administrador(self, rodadas):
+        for _ in range(rodadas):
+            self._medir("admin", self.admin)
+            time_module.sleep(self.args.rampa / max(rodadas, 1))
+
+    def executar(self):
+        threads = [
+            threading.Thread(target=self.usuario, args=(u, self.rnd.uniform(0, self.args.rampa)), daemon=True)
+            for u in self.usuarios
+        ]
+        threads += [threading.Thread(target=self.administrador, args=(5,), daemon=True)
+                    for _ in range(self.args.admins)]
+        inicio = time_module.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time_module.perf_counter() - inicio
+
+    def relatorio(self, duracao):
+        caminhos = {}
+        for c in CAMINHOS:
+            lat = self.latencias[c]
+            if not lat:
+                continue
+            caminhos[c] = {
+                "n": len(lat),
+                "falhas": self.falhas[c],
+                "p50_ms": round(_percentil(lat, 50) * 1000, 1),
+                "p95_ms": round(_percentil(lat, 95) * 1000, 1),
+                "p99_ms": round(_percentil(lat, 99) * 1000, 1),
+            }
+        eventos = metricas.registro().eventos()
+        cota_m = cota.agendador().estatisticas()
+        linhas_finais = self.ws_p.get_all_values()
+        return {
+            "modo": self.args.modo,
+            "usuarios": self.args.usuarios,
+            "duracao_s": round(duracao, 2),
+            "caminhos": caminhos,
+            "sheets": {
+                "chamadas": self.servidor.total_chamadas(),
+                "chamadas_por_usuario": round(self.servidor.total_chamadas() / max(self.args.usuarios, 1), 2),
+                "por_operacao": dict(sorted(self.servidor.chamadas.items())),
+                "respostas_429": self.servidor.erros_429,
+                "cota_esgotada": sum(1 for e in eventos if e["resultado"] == metricas.RESULTADO_ESGOTADO),
+                "espera_cota_s": round(sum(v["espera_total_s"] for v in cota_m.values()), 2),
+            },
+            "linhas_gravadas": len(linhas_finais) - 1,
+        }
+
+
+def imprimir(rel, base=None):
+    print(f"\nmodo={rel['modo']} usuarios={rel['usuarios']} duração={rel['duracao_s']}s "
+          f"linhas gravadas={rel['linhas_gravadas']}")
+    print(f"{'caminho':<12} {'n':>5} {'falhas':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for c, v in rel["caminhos"].items():
+        linha = f"{c:<12} {v['n']:>5} {v['falhas']:>7} {v['p50_ms']:>9} {v['p95_ms']:>9} {v['p99_ms']:>9}"
+        if base and c in base["caminhos"] and base["caminhos"][c]["p95_ms"]:
+            linha += f"   p95 {v['p95_ms'] / base['caminhos'][c]['p95_ms']:.2f}x da baseline"
+        print(linha)
+    s = rel["sheets"]
+    print(f"\nSheets: {s['chamadas']} chamadas ({s['chamadas_por_usuario']}/usuário), "
+          f"429: {s['respostas_429']}, cota esgotada: {s['cota_esgotada']}, espera na cota: {s['espera_cota_s']}s")
+    if base:
+        b = base["sheets"]
+        print(f"Baseline ({base['modo']}): {b['chamadas']} chamadas ({b['chamadas_por_usuario']}/usuário), "
+              f"429: {b['respostas_429']}")
+    print("Por operação:", s["por_operacao"])
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Teste de carga offline da abertura da lista.")
+    ap.add_argument("--usuarios", type=int, default=40)
+    ap.add_argument("--admins", type=int, default=1)
+    ap.add_argument("--modo", choices=["atual", "legado"], default="atual")
+    ap.add_argument("--rampa", type=float, default=5.0, help="janela (s) em que os usuários chegam")
+    ap.add_argument("--p-exclusao", type=float, default=0.1)
+    ap.add_argument("--latencia", type=float, default=0.15, help="latência base por chamada (s)")
+    ap.add_argument("--jitter", type=float, default=0.10)
+    ap.add_argument("--cota-leitura", type=int, default=60, help="leituras por minuto")
+    ap.add_argument("--cota-escrita", type=int, default=60, help="escritas por minuto")
+    ap.add_argument("--minuto", type=float, default=60.0, help="duração simulada de 1 minuto de cota (s)")
+    ap.add_argument("--intervalo-fila", type=float, default=0.3)
+    ap.add_argument("--semente", type=int, default=42)
+    ap.add_argument("--saida", help="grava o resultado em JSON")
+    ap.add_argument("--baseline", help="JSON de uma execução anterior para comparar")
+    args = ap.parse_args()
+
+    cen = Cenario(args)
+    rel = cen.relatorio(cen.executar())
+
+    base = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            base = json.load(f)
+    imprimir(rel, base)
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(rel, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
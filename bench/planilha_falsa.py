@@ -0,0 +1,218 @@
+"""
+Google Sheets falso, em memória, para testes de carga offline.
+
+Implementa só o pedaço da API do gspread que o app usa, com:
+- latência injetada por chamada (base + jitter);
+- cota por minuto de leituras e escritas, como a do Sheets: acima dela a
+  chamada responde 429 (APIError de verdade do gspread);
+- contadores de chamadas e de 429 por operação.
+
+`minuto` permite comprimir o tempo (ex.: minuto=6 -> a cota vale por 6 s).
+"""
+import random
+import threading
+import time as time_module
+from collections import deque
+
+from gspread.exceptions import APIError
+
+import cota
+
+
+class _RespostaFalsa:
+    def __init__(self, codigo, mensagem, status):
+        self.status_code = codigo
+        self.text = mensagem
+        self._corpo = {"error": {"code": codigo, "message": mensagem, "status": status}}
+
+    def json(self):
+        return self._corpo
+
+
+def erro_429():
+    return APIError(_RespostaFalsa(429, "Quota exceeded for quota metric 'Read requests'", "RESOURCE_EXHAUSTED"))
+
+
+class _Celula:
+    def __init__(self, valor):
+        self.value = valor
+
+
+class ServidorFalso:
+    """Estado compartilhado: cota, latência e contadores de todas as worksheets."""
+
+    def __init__(self, latencia=0.15, jitter=0.10, leituras_por_min=60, escritas_por_min=60,
+                 minuto=60.0, semente=7):
+        self.latencia = latencia
+        self.jitter = jitter
+        self.limites = {cota.LEITURA: leituras_por_min, cota.ESCRITA: escritas_por_min}
+        self.minuto = minuto
+        self._rnd = random.Random(semente)
+        self._lock = threading.Lock()
+        self._janelas = {cota.LEITURA: deque(), cota.ESCRITA: deque()}
+        self.chamadas = {}
+        self.erros_429 = 0
+        self.worksheets = {}
+
+    def atender(self, operacao, tipo):
+        with self._lock:
+            agora = time_module.monotonic()
+            janela = self._janelas[tipo]
+            while janela and agora - janela[0] > self.minuto:
+                janela.popleft()
+            self.chamadas[operacao] = self.chamadas.get(operacao, 0) + 1
+            estourou = len(janela) >= self.limites[tipo]
+            if estourou:
+                self.erros_429 += 1
+            else:
+                janela.append(agora)
+            atraso = max(0.0, self.latencia + self._rnd.uniform(-self.jitter, self.jitter))
+        time_module.sleep(atraso if not estourou else atraso / 3)
+        if estourou:
+            raise erro_429()
+
+    def total_chamadas(self):
+        with self._lock:
+            return sum(self.chamadas.values())
+
+
+def _coordenadas(celula):
+    """"B2" -> (linha 2, coluna 2); partes ausentes viram None."""
+    letras = "".join(ch for ch in celula if ch.isalpha())
+    digitos = "".join(ch for ch in celula if ch.isdigit())
+    col = ord(letras.upper()) - ord("A") + 1 if letras else None
+    return (int(digitos) if digitos else None), col
+
+
+class _PlanilhaFalsa:
+    """batch_update estrutural (deleteDimension de linhas) e values_batch_get."""
+
+    def __init__(self, worksheet):
+        self._ws = worksheet
+
+    def values_batch_get(self, faixas, params=None):
+        """Uma chamada para várias faixas ("'Aba'!A1:B2", "'Aba'", "'Aba'!A5:Z")."""
+        self._ws._atender("values_batch_get")
+        resposta = []
+        for faixa in faixas:
+            aba, _, celulas = faixa.partition("!")
+            ws = self._ws.servidor.worksheets[aba.strip("'").replace("''", "'")]
+            ini, fim = (celulas.split(":") + [""])[:2] if celulas else ("", "")
+            lin_i, col_i = _coordenadas(ini) if ini else (None, None)
+            lin_f, col_f = _coordenadas(fim) if fim else (None, None)
+            with ws._lock:
+                linhas = ws._linhas[(lin_i or 1) - 1:lin_f]
+                valores = [list(l)[(col_i or 1) - 1:col_f] for l in linhas]
+            # como a API: sem células vazias no fim das linhas nem linhas vazias no fim
+            valores = [l[:max((i + 1 for i, v in enumerate(l) if v != ""), default=0)] for l in valores]
+            while valores and not valores[-1]:
+                valores.pop()
+            resposta.append({"range": faixa, "values": valores} if valores else {"range": faixa})
+        return {"valueRanges": resposta}
+
+    def batch_update(self, corpo):
+        self._ws._atender("batch_update")
+        with self._ws._lock:
+            for pedido in corpo.get("requests", []):
+                rng = pedido["deleteDimension"]["range"]
+                del self._ws._linhas[rng["startIndex"]:rng["endIndex"]]
+
+
+class WorksheetFalsa:
+    def __init__(self, servidor, title, linhas, id=0):
+        self.servidor = servidor
+        self.title = title
+        self.id = id
+        self.spreadsheet = _PlanilhaFalsa(self)
+        self._linhas = [list(map(str, l)) for l in linhas]
+        self._lock = threading.Lock()
+        servidor.worksheets[title] = self
+
+    def _atender(self, operacao):
+        tipo = cota.LEITURA if operacao in cota.OPERACOES_LEITURA else cota.ESCRITA
+        self.servidor.atender(operacao, tipo)
+
+    # ----- leituras -----
+    def get_all_values(self):
+        self._atender("get_all_values")
+        with self._lock:
+            largura = max((len(l) for l in self._linhas), default=0)
+            return [l + [""] * (largura - len(l)) for l in self._linhas]
+
+    def get_all_records(self):
+        self._atender("get_all_records")
+        with self._lock:
+            if not self._linhas:
+                return []
+            cab = self._linhas[0]
+            return [dict(zip(cab, l + [""] * (len(cab) - len(l)))) for l in self._linhas[1:]]
+
+    def get(self, intervalo):
+        self._atender("get")
+        ini, fim = (intervalo.split(":") + [""])[:2]
+        inicio, col_i = _coordenadas(ini)
+        _, col_f = _coordenadas(fim)
+        with self._lock:
+            return [list(l)[(col_i or 1) - 1:col_f] for l in self._linhas[(inicio or 1) - 1:]]
+
+    def acell(self, rotulo):
+        self._atender("acell")
+        col = ord(rotulo[0].upper()) - ord("A")
+        lin = int(rotulo[1:]) - 1
+        with self._lock:
+            try:
+                return _Celula(self._linhas[lin][col])
+            except IndexError:
+                return _Celula(None)
+
+    # ----- escritas -----
+    def append_row(self, linha, **kwargs):
+        self._atender("append_row")
+        with self._lock:
+            self._linhas.append([str(v) for v in linha])
+
+    def append_rows(self, linhas, **kwargs):
+        self._atender("append_rows")
+        with self._lock:
+            self._linhas.extend([str(v) for v in l] for l in linhas)
+
+    def delete_rows(self, inicio, fim=None):
+        self._atender("delete_rows")
+        fim = fim or inicio
+        with self._lock:
+            del self._linhas[inicio - 1:fim]
+
+    def update_cell(self, linha, coluna, valor):
+        self._atender("update_cell")
+        with self._lock:
+            r = self._linhas[linha - 1]
+            r.extend([""] * (coluna - len(r)))
+            r[coluna - 1] = str(valor)
+
+    def update(self, intervalo, valores, **kwargs):
+        self._atender("update")
+        self._gravar(intervalo, valores)
+
+    def _gravar(self, intervalo, valores):
+        primeira = intervalo.split(":")[0]
+        col = ord(primeira[0].upper()) - ord("A")
+        lin = int(primeira[1:]) - 1
+        with self._lock:
+            for i, linha in enumerate(valores):
+                while len(self._linhas) <= lin + i:
+                    self._linhas.append([])
+                r = self._linhas[lin + i]
+                for j, v in enumerate(linha):
+                    r.extend([""] * (col + j + 1 - len(r)))
+                    r[col + j] = str(v)
+
+    def batch_update(self, dados, **kwargs):
+        self._atender("batch_update")
+        for item in dados:
+            self._gravar(item["range"], item["values"])
+
+    def resize(self, rows=None, cols=None):
+        self._atender("resize")
+        if rows is not None:
+            with self._lock:
+                self._linhas = self._linhas[:rows]
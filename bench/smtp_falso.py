@@ -0,0 +1,137 @@
+"""
+Servidor SMTP falso, local, para exercitar a caixa de saída (caixa_saida.py)
+sem Gmail.
+
+Fala o mínimo do protocolo (EHLO/HELO, MAIL, RCPT, DATA, NOOP, RSET, QUIT),
+sem STARTTLS nem AUTH: use a caixa com starttls=False e pass vazio.
+Guarda as mensagens recebidas e conta conexões; `falhar_proximas` faz as
+próximas N transações responderem 451 (falha temporária) e `recusar` lista
+destinatários respondidos com 550.
+
+Uso direto (envia um lote e mostra o que chegou):
+  python bench/smtp_falso.py --mensagens 30
+"""
+import argparse
+import os
+import socketserver
+import sys
+import threading
+import time as time_module
+
+
+class _Sessao(socketserver.StreamRequestHandler):
+    def _responder(self, linha):
+        self.wfile.write((linha + "\r\n").encode())
+
+    def handle(self):
+        srv = self.server.falso
+        with srv._lock:
+            srv.conexoes += 1
+        self._responder("220 smtp-falso pronto")
+        remetente, destinatarios = None, []
+        while True:
+            linha = self.rfile.readline()
+            if not linha:
+                return
+            cmd = linha.decode(errors="replace").strip()
+            verbo = cmd.split(" ", 1)[0].upper()
+            if verbo in ("EHLO", "HELO"):
+                self._responder("250 smtp-falso")
+            elif verbo == "MAIL":
+                remetente, destinatarios = cmd.split(":", 1)[1].strip().strip("<>"), []
+                self._responder("250 OK")
+            elif verbo == "RCPT":
+                dest = cmd.split(":", 1)[1].strip().strip("<>")
+                if dest in srv.recusar:
+                    self._responder("550 destinatario inexistente")
+                else:
+                    destinatarios.append(dest)
+                    self._responder("250 OK")
+            elif verbo == "DATA":
+                self._responder("354 termine com <CRLF>.<CRLF>")
+                corpo = []
+                while True:
+                    l = self.rfile.readline()
+                    if not l or l in (b".\r\n", b".\n"):
+                        break
+                    corpo.append(l.decode(errors="replace"))
+                time_module.sleep(srv.latencia)
+                with srv._lock:
+                    falhar = srv.falhar_proximas > 0
+                    if falhar:
+                        srv.falhar_proximas -= 1
+                    else:
+                        srv.recebidas.append({"de": remetente, "para": destinatarios, "dados": "".join(corpo)})
+                self._responder("451 tente mais tarde" if falhar else "250 OK enfileirada")
+            elif verbo == "NOOP":
+                self._responder("250 OK")
+            elif verbo == "RSET":
+                remetente, destinatarios = None, []
+                self._responder("250 OK")
+            elif verbo == "QUIT":
+                self._responder("221 tchau")
+                return
+            else:
+                self._responder("502 comando nao implementado")
+
+
+class _Servidor(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ServidorSMTPFalso:
+    def __init__(self, host="127.0.0.1", porta=0, latencia=0.0):
+        self.latencia = latencia
+        self.recebidas = []
+        self.conexoes = 0
+        self.falhar_proximas = 0
+        self.recusar = set()
+        self._lock = threading.Lock()
+        self._srv = _Servidor((host, porta), _Sessao)
+        self._srv.falso = self
+        self.host, self.porta = self._srv.server_address
+        self._thread = threading.Thread(target=self._srv.serve_forever, name="smtp-falso", daemon=True)
+        self._thread.start()
+
+    def cfg_caixa(self):
+        """Config no formato esperado por CaixaSaida."""
+        return {"host": self.host, "port": self.porta, "from": "rota@local", "pass": "", "starttls": False}
+
+    def parar(self):
+        self._srv.shutdown()
+        self._srv.server_close()
+
+
+def main():
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from caixa_saida import CaixaSaida
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--mensagens", type=int, default=30)
+    ap.add_argument("--latencia", type=float, default=0.02, help="atraso do servidor por mensagem (s)")
+    ap.add_argument("--falhas", type=int, default=3, help="transações que recebem 451 antes de aceitar")
+    args = ap.parse_args()
+
+    servidor = ServidorSMTPFalso(latencia=args.latencia)
+    servidor.falhar_proximas = args.falhas
+    servidor.recusar.add("inexistente@rota.br")
+    caixa = CaixaSaida(servidor.cfg_caixa(), caminho=":memory:", intervalo=0.1)
+
+    inicio = time_module.perf_counter()
+    ids = [caixa.enfileirar(f"militar{i:03d}@rota.br", f"Teste {i}", "corpo") for i in range(args.mensagens)]
+    ids.append(caixa.enfileirar("inexistente@rota.br", "Recusado", "corpo"))
+    enfileirar_ms = (time_module.perf_counter() - inicio) * 1000
+    for i in ids:
+        caixa.aguardar(i, timeout=30)
+    total_s = time_module.perf_counter() - inicio
+
+    print(f"enfileirar {len(ids)} mensagens: {enfileirar_ms:.1f} ms (tempo que o usuário espera)")
+    print(f"entrega completa: {total_s:.2f} s | recebidas: {len(servidor.recebidas)} | "
+          f"conexões SMTP: {servidor.conexoes}")
+    print(caixa.estatisticas())
+    servidor.parar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Caixa de saída de e-mails (cadastro pendente, recuperação de acesso).
+
+O envio saiu da requisição do usuário: `enfileirar` só grava a mensagem num
+SQLite local e acorda o worker. Uma thread por processo:
+
+- reaproveita a mesma conexão SMTP autenticada entre mensagens (NOOP para
+  conferir se ainda está viva quando ficou parada; fecha depois de
+  `ocioso_fecha` s sem uso);
+- envia em lotes de até `max_lote` mensagens por volta;
+- em falha temporária (conexão caiu, 4xx, timeout) reagenda com backoff
+  exponencial; erro permanente (5xx, destinatário recusado) ou mais de
+  `max_tentativas` marca a mensagem como FALHOU.
+
+Cada mensagem tem status consultável (PENDENTE / ENVIADO / FALHOU). Como a
+fila é persistida, mensagens pendentes sobrevivem a um restart do app.
+
+O corpo só fica no disco enquanto a mensagem está PENDENTE: ao virar
+ENVIADO ou FALHOU ele é apagado (a recuperação de acesso manda a senha no
+texto, e o SQLite não deve guardar cópia dela). Ficam destinatário,
+assunto, status e erro.
+
+`cfg`: host, port, from, pass (vazio = sem login) e starttls (padrão True).
+"""
+import smtplib
+import sqlite3
+import threading
+import time as time_module
+from email.message import EmailMessage
+
+
+PENDENTE = "PENDENTE"
+ENVIADO = "ENVIADO"
+FALHOU = "FALHOU"
+
+
+def _classificar(erro):
+    """True se vale tentar de novo."""
+    if isinstance(erro, smtplib.SMTPRecipientsRefused):
+        return False
+    if isinstance(erro, smtplib.SMTPResponseException):
+        return 400 <= erro.smtp_code < 500
+    return isinstance(erro, (smtplib.SMTPException, OSError))
+
+
+class CaixaSaida:
+    def __init__(self, cfg, caminho="caixa_saida.db", intervalo=2.0, max_lote=20,
+                 max_tentativas=5, ocioso_fecha=60.0, timeout=20.0):
+        self.cfg = dict(cfg)
+        self.intervalo = intervalo
+        self.max_lote = max_lote
+        self.max_tentativas = max_tentativas
+        self.ocioso_fecha = ocioso_fecha
+        self.timeout = timeout
+
+        self._lock = threading.RLock()
+        self._con = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        if caminho != ":memory:":
+            self._con.execute("PRAGMA journal_mode=WAL")
+            # páginas liberadas (corpo apagado) são zeradas, não só desligadas
+            self._con.execute("PRAGMA secure_delete=ON")
+        self._con.execute(
+            "CREATE TABLE IF NOT EXISTS mensagens ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " destinatario TEXT NOT NULL, assunto TEXT NOT NULL, corpo TEXT NOT NULL,"
+            " status TEXT NOT NULL, tentativas INTEGER NOT NULL DEFAULT 0,"
+            " criado_em REAL NOT NULL, proxima_em REAL NOT NULL, enviado_em REAL,"
+            " erro TEXT NOT NULL DEFAULT '')"
+        )
+        self._con.execute("CREATE INDEX IF NOT EXISTS ix_mensagens_fila ON mensagens (status, proxima_em)")
+        # mensagens encerradas antes de o corpo passar a ser apagado na hora
+        self._con.execute("UPDATE mensagens SET corpo = '' WHERE status != ? AND corpo != ''", (PENDENTE,))
+
+        self._evento = threading.Event()
+        self._smtp = None
+        self._smtp_usado_em = 0.0
+
+        self.conexoes_abertas = 0
+        self.lotes = 0
+
+        self._thread = threading.Thread(target=self._loop, name="caixa-saida", daemon=True)
+        self._thread.start()
+
+    # ----- API -----
+    def enfileirar(self, destinatario, assunto, corpo):
+        """Grava a mensagem e devolve o id (para consultar o status depois)."""
+        agora = time_module.time()
+        with self._lock:
+            cur = self._con.execute(
+                "INSERT INTO mensagens (destinatario, assunto, corpo, status, criado_em, proxima_em) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (str(destinatario).strip(), str(assunto), str(corpo), PENDENTE, agora, agora),
+            )
+            id_msg = cur.lastrowid
+        self._evento.set()
+        return id_msg
+
+    def status(self, id_msg):
+        """{"status", "tentativas", "erro", "enviado_em"} ou None se o id não existe."""
+        with self._lock:
+            row = self._con.execute(
+                "SELECT status, tentativas, erro, enviado_em FROM mensagens WHERE id = ?", (int(id_msg),)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"status": row[0], "tentativas": row[1], "erro": row[2], "enviado_em": row[3]}
+
+    def aguardar(self, id_msg, timeout=5.0):
+        """Espera a mensagem sair de PENDENTE (ou o timeout); devolve o status."""
+        limite = time_module.monotonic() + timeout
+        while True:
+            st = self.status(id_msg)
+            if st is None or st["status"] != PENDENTE or time_module.monotonic() >= limite:
+                return st
+            time_module.sleep(0.05)
+
+    def estatisticas(self):
+        with self._lock:
+            rows = self._con.execute("SELECT status, COUNT(*) FROM mensagens GROUP BY status").fetchall()
+        out = {PENDENTE: 0, ENVIADO: 0, FALHOU: 0}
+        out.update(dict(rows))
+        out["conexoes_abertas"] = self.conexoes_abertas
+        out["lotes"] = self.lotes
+        return out
+
+    # ----- conexão -----
+    def _conectar(self):
+        smtp = smtplib.SMTP(self.cfg["host"], int(self.cfg["port"]), timeout=self.timeout)
+        try:
+            smtp.ehlo()
+            if self.cfg.get("starttls", True):
+                smtp.starttls()
+                smtp.ehlo()
+            if self.cfg.get("pass"):
+                smtp.login(self.cfg.get("usuario") or self.cfg["from"], self.cfg["pass"])
+        except Exception:
+            self._fechar(smtp)
+            raise
+        self.conexoes_abertas += 1
+        return smtp
+
+    @staticmethod
+    def _fechar(smtp):
+        try:
+            smtp.quit()
+        except Exception:
+            try:
+                smtp.close()
+            except Exception:
+                pass
+
+    def _conexao(self):
+        if self._smtp is not None:
+            # dentro do mesmo lote a conexão acabou de ser usada: dispensa o NOOP
+            if time_module.monotonic() - self._smtp_usado_em < 5.0:
+                return self._smtp
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except Exception:
+                pass
+            self._descartar_conexao()
+        self._smtp = self._conectar()
+        return self._smtp
+
+    def _descartar_conexao(self):
+        if self._smtp is not None:
+            self._fechar(self._smtp)
+            self._smtp = None
+
+    # ----- worker -----
+    def _vencidas(self):
+        with self._lock:
+            return self._con.execute(
+                "SELECT id, destinatario, assunto, corpo, tentativas FROM mensagens "
+                "WHERE status = ? AND proxima_em <= ? ORDER BY id LIMIT ?",
+                (PENDENTE, time_module.time(), self.max_lote),
+            ).fetchall()
+
+    def _proxima_espera(self):
+        with self._lock:
+            row = self._con.execute(
+                "SELECT MIN(proxima_em) FROM mensagens WHERE status = ?", (PENDENTE,)
+            ).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time_module.time())
+
+    def _marcar(self, id_msg, status, tentativas, erro="", proxima_em=None):
+        agora = time_module.time()
+        # encerrada (ENVIADO/FALHOU): o corpo não é mais necessário e pode conter senha
+        apagar_corpo = ", corpo = ''" if status != PENDENTE else ""
+        with self._lock:
+            self._con.execute(
+                "UPDATE mensagens SET status = ?, tentativas = ?, erro = ?, proxima_em = ?, enviado_em = ?"
+                f"{apagar_corpo} WHERE id = ?",
+                (status, tentativas, erro[:500], proxima_em or agora, agora if status == ENVIADO else None, id_msg),
+            )
+
+    def _montar(self, destinatario, assunto, corpo):
+        msg = EmailMessage()
+        msg["Subject"] = assunto
+        msg["From"] = self.cfg["from"]
+        msg["To"] = destinatario
+        msg.set_content(corpo)
+        return msg
+
+    def _enviar_lote(self, lote):
+        self.lotes += 1
+        for id_msg, destinatario, assunto, corpo, tentativas in lote:
+            tentativas += 1
+            try:
+                self._conexao().send_message(self._montar(destinatario, assunto, corpo))
+                self._smtp_usado_em = time_module.monotonic()
+                self._marcar(id_msg, ENVIADO, tentativas)
+            except Exception as e:
+                temporario = _classificar(e)
+                if not isinstance(e, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+                    # caiu ou ficou num estado desconhecido: a próxima mensagem abre outra
+                    self._descartar_conexao()
+                if temporario and tentativas < self.max_tentativas:
+                    atraso = min(self.intervalo * (2 ** tentativas), 300.0)
+                    self._marcar(id_msg, PENDENTE, tentativas, str(e), time_module.time() + atraso)
+                else:
+                    self._marcar(id_msg, FALHOU, tentativas, str(e))
+
+    def _loop(self):
+        while True:
+            lote = self._vencidas()
+            if lote:
+                self._enviar_lote(lote)
+                continue
+
+            if self._smtp is not None and time_module.monotonic() - self._smtp_usado_em > self.ocioso_fecha:
+                self._descartar_conexao()
+
+            espera = self._proxima_espera()
+            espera = self.ocioso_fecha if espera is None else min(espera, self.ocioso_fecha)
+            self._evento.wait(max(espera, 0.05))
+            self._evento.clear()
@@ -0,0 +1,127 @@
+"""
+Virada de ciclo da lista de presença, nos horários de virada da agenda
+(agenda.py; padrão 06:50 e 18:50).
+
+Antes, cada render de usuário logado comparava a última linha com o marco
+e a sessão que chegasse primeiro zerava a planilha (e várias podiam chegar
+juntas). Agora um único agendador por processo dorme até a próxima virada
+da agenda, e a virada acontece uma vez por ciclo, sob lock:
+
+1. relê a presença (fora dos snapshots, para não agir sobre dado velho);
+2. se a última linha é anterior ao marco, copia a lista que sai para o
+   arquivo num único append em lote;
+3. limpa a presença e avisa quem precisa recarregar (`ao_limpar`).
+
+Com `historico` (historico.ArquivoHistorico), o ciclo também entra no
+arquivo local de consulta; falha nele não impede a virada.
+
+Se alguma etapa falhar, o marco não é dado como concluído e a virada é
+tentada de novo em `intervalo_retentativa` segundos. Nas regras padrão a
+lista está fechada em toda virada, então não há confirmações chegando
+perto do marco.
+
+`agenda`: função que devolve a agenda vigente (as regras podem mudar na
+Config); sem ela, as regras padrão.
+"""
+import threading
+from datetime import datetime
+
+from agenda import REGRAS_PADRAO, agenda_de
+from cota import PRIORIDADE_RESET, prioridade
+from ordenacao import FORMATO_DATA_HORA
+
+
+FORMATO_CICLO = "%Y-%m-%d %H:%M"
+
+
+def lista_vencida(linhas, marco):
+    """True se a última linha da presença foi registrada antes do `marco`."""
+    if not linhas or len(linhas) < 2:
+        return False
+    try:
+        ultima = datetime.strptime(str(linhas[-1][0]).strip(), FORMATO_DATA_HORA)
+    except (ValueError, IndexError):
+        return False
+    if marco.tzinfo is not None:
+        ultima = marco.tzinfo.localize(ultima) if hasattr(marco.tzinfo, "localize") else ultima.replace(tzinfo=marco.tzinfo)
+    return ultima < marco
+
+
+class ReinicioCiclo:
+    def __init__(self, banco, relogio, ao_limpar=None, historico=None, intervalo_retentativa=30.0, agenda=None):
+        self.banco = banco
+        self.relogio = relogio
+        self.agenda = agenda or (lambda: agenda_de(REGRAS_PADRAO))
+        self.ao_limpar = ao_limpar
+        self.historico = historico
+        self.intervalo_retentativa = intervalo_retentativa
+
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self.marco_concluido = None
+
+        self.viradas = 0
+        self.linhas_arquivadas = 0
+        self.falhas = 0
+        self.falhas_historico = 0
+        self.ultimo_erro = None
+
+        self._thread = threading.Thread(target=self._loop, name="reinicio-ciclo", daemon=True)
+        self._thread.start()
+
+    def verificar_agora(self):
+        """Acorda o agendador fora de hora (ex.: botão do ADM, regras de horário salvas)."""
+        self._acordar.set()
+
+    def executar(self):
+        """
+        Faz a virada do marco vigente, se ainda não foi feita.
+        Retorna o número de linhas arquivadas (0 se não havia o que virar).
+        """
+        with self._lock:
+            marco = self.agenda().virada_vigente(self.relogio())
+            if marco is None or (self.marco_concluido is not None and self.marco_concluido >= marco):
+                return 0
+
+            with prioridade(PRIORIDADE_RESET):
+                linhas = self.banco.ler_presenca() or []
+                if not lista_vencida(linhas, marco):
+                    self.marco_concluido = marco
+                    return 0
+
+                saindo = [l for l in linhas[1:] if any(str(v).strip() for v in l)]
+                ciclo = marco.strftime(FORMATO_CICLO)
+                if saindo:
+                    self.banco.arquivar_presenca(ciclo, saindo)
+                self.banco.limpar_presenca()
+
+            self.marco_concluido = marco
+            self.viradas += 1
+            self.linhas_arquivadas += len(saindo)
+
+        if self.historico is not None:
+            try:
+                self.historico.registrar_ciclo(ciclo, saindo)
+            except Exception:
+                self.falhas_historico += 1
+        if self.ao_limpar is not None:
+            self.ao_limpar()
+        return len(saindo)
+
+    def _loop(self):
+        while True:
+            espera = None
+            try:
+                self.executar()
+                self.ultimo_erro = None
+            except Exception as e:
+                self.falhas += 1
+                self.ultimo_erro = e
+                espera = self.intervalo_retentativa
+            if espera is None:
+                agora = self.relogio()
+                proxima = self.agenda().proxima_virada(agora)
+                # acorda na virada, e ao menos a cada minuto: tolera ajuste de relógio/suspensão
+                espera = 60.0 if proxima is None else min(60.0, max(0.05, (proxima - agora).total_seconds()))
+            self._acordar.wait(espera)
+            self._acordar.clear()
@@ -0,0 +1,94 @@
+"""
+Single-flight: deduplica leituras concorrentes da mesma chave.
+
+Quando várias sessões (ou o atualizador e o ADM) pedem a mesma leitura ao
+mesmo tempo, só a primeira vai à rede; as demais esperam e recebem o mesmo
+resultado (ou a mesma exceção). O resultado é compartilhado: não modifique.
+"""
+import threading
+
+
+class _Voo:
+    def __init__(self):
+        self.pronto = threading.Event()
+        self.resultado = None
+        self.erro = None
+        self.aguardando = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._em_voo = {}
+        self.executadas = 0
+        self.economizadas = 0
+
+    def executar(self, chave, func, *args, **kwargs):
+        with self._lock:
+            voo = self._em_voo.get(chave)
+            lider = voo is None
+            if lider:
+                voo = _Voo()
+                self._em_voo[chave] = voo
+                self.executadas += 1
+            else:
+                voo.aguardando += 1
+                self.economizadas += 1
+
+        if not lider:
+            voo.pronto.wait()
+            if voo.erro is not None:
+                raise voo.erro
+            return voo.resultado
+
+        try:
+            voo.resultado = func(*args, **kwargs)
+            return voo.resultado
+        except Exception as e:
+            voo.erro = e
+            raise
+        finally:
+            with self._lock:
+                self._em_voo.pop(chave, None)
+            voo.pronto.set()
+
+    def estatisticas(self):
+        with self._lock:
+            em_voo = len(self._em_voo)
+        return {"executadas": self.executadas, "economizadas": self.economizadas, "em_voo": em_voo}
+
+
+class LeiturasCompartilhadas:
+    """
+    Envolve um backend de armazenamento: as leituras passam pelo
+    SingleFlight (chave = método + argumentos), as escritas seguem direto.
+
+    Cada escrita avança a geração, que entra na chave: uma leitura pedida
+    depois de uma escrita nunca pega carona num voo iniciado antes dela.
+    """
+
+    LEITURAS = ("listar_usuarios", "ler_limite", "ler_regras", "ler_versao", "ler_presenca", "ler_presenca_desde",
+                "ler_marcas_embarque", "ler_tudo")
+
+    def __init__(self, banco, voo=None):
+        self.banco = banco
+        self.voo = voo or SingleFlight()
+        self.nome = banco.nome
+        self._geracao = 0
+
+    def __getattr__(self, nome):
+        attr = getattr(self.banco, nome)
+        if not callable(attr):
+            return attr
+
+        if nome in self.LEITURAS:
+            def ler(*args):
+                return self.voo.executar((self._geracao, nome) + args, attr, *args)
+            return ler
+
+        def escrever(*args, **kwargs):
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                self._geracao += 1
+        return escrever
@@ -0,0 +1,184 @@
+"""
+Agendador de cota do Google Sheets (token bucket por processo).
+
+A API limita leituras e escritas por minuto. Em vez de cada chamada
+descobrir o limite tomando 429 e dormir por conta própria, todo gs_call pede
+uma ficha ao balde do seu tipo antes de ir à rede. Quando falta ficha, as
+chamadas esperam em fila por prioridade (e por ordem de chegada dentro da
+mesma prioridade):
+
+    presença (escrita) > reset do ciclo > escritas do ADM/cadastro > leituras
+
+Um 429 mesmo assim (cota dividida com outro processo) pausa o balde inteiro:
+todos esperam a mesma pausa, em ordem, sem tempestade de retries.
+"""
+import contextvars
+import heapq
+import itertools
+import threading
+import time as time_module
+from contextlib import contextmanager
+
+
+LEITURA = "leitura"
+ESCRITA = "escrita"
+
+PRIORIDADE_PRESENCA = 0
+PRIORIDADE_RESET = 1
+PRIORIDADE_ADMIN = 2
+PRIORIDADE_LEITURA = 3
+
+NOMES_PRIORIDADE = {
+    PRIORIDADE_PRESENCA: "presenca",
+    PRIORIDADE_RESET: "reset",
+    PRIORIDADE_ADMIN: "admin",
+    PRIORIDADE_LEITURA: "leitura",
+}
+
+# métodos do gspread que só leem; o resto conta como escrita
+OPERACOES_LEITURA = {
+    "open", "open_by_key", "worksheet", "worksheets", "get", "batch_get", "get_all_values",
+    "get_all_records", "get_values", "acell", "cell", "col_values", "row_values",
+    "values_get", "values_batch_get", "fetch_sheet_metadata",
+}
+
+
+class CotaEsgotada(Exception):
+    pass
+
+
+_prioridade = contextvars.ContextVar("prioridade_sheets", default=None)
+
+
+@contextmanager
+def prioridade(valor):
+    """Define a prioridade das chamadas gs_call feitas dentro do bloco (nesta thread)."""
+    token = _prioridade.set(valor)
+    try:
+        yield
+    finally:
+        _prioridade.reset(token)
+
+
+def tipo_operacao(func) -> str:
+    return LEITURA if getattr(func, "__name__", "") in OPERACOES_LEITURA else ESCRITA
+
+
+def prioridade_atual(tipo) -> int:
+    p = _prioridade.get()
+    if p is not None:
+        return p
+    return PRIORIDADE_LEITURA if tipo == LEITURA else PRIORIDADE_ADMIN
+
+
+class _Balde:
+    def __init__(self, por_minuto, rajada):
+        self.taxa = por_minuto / 60.0
+        self.capacidade = float(rajada)
+        self.tokens = float(rajada)
+        self.atualizado = time_module.monotonic()
+        self.pausado_ate = 0.0
+        self.fila = []            # heap de (prioridade, seq, evento)
+
+    def repor(self, agora):
+        if agora < self.pausado_ate:
+            self.atualizado = agora
+            return
+        inicio = max(self.atualizado, self.pausado_ate)
+        self.tokens = min(self.capacidade, self.tokens + (agora - inicio) * self.taxa)
+        self.atualizado = agora
+
+    def espera_proxima(self, agora):
+        if agora < self.pausado_ate:
+            return self.pausado_ate - agora + max(0.0, 1.0 - self.tokens) / self.taxa
+        return max(0.0, 1.0 - self.tokens) / self.taxa
+
+
+class AgendadorCota:
+    def __init__(self, leituras_por_min=60, escritas_por_min=60, rajada=10):
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._baldes = {
+            LEITURA: _Balde(leituras_por_min, rajada),
+            ESCRITA: _Balde(escritas_por_min, rajada),
+        }
+        self.concedidas = {LEITURA: 0, ESCRITA: 0}
+        self.espera_total = {LEITURA: 0.0, ESCRITA: 0.0}
+        self.pausas = 0
+
+    def adquirir(self, tipo, prioridade, timeout=120.0):
+        """Bloqueia até haver ficha para `tipo`; devolve quantos segundos esperou."""
+        balde = self._baldes[tipo]
+        inicio = time_module.monotonic()
+        ticket = (prioridade, next(self._seq))
+        with self._cond:
+            heapq.heappush(balde.fila, ticket)
+            while True:
+                agora = time_module.monotonic()
+                balde.repor(agora)
+                primeiro = balde.fila[0] == ticket
+                if primeiro and balde.tokens >= 1.0:
+                    heapq.heappop(balde.fila)
+                    balde.tokens -= 1.0
+                    esperou = agora - inicio
+                    self.concedidas[tipo] += 1
+                    self.espera_total[tipo] += esperou
+                    self._cond.notify_all()
+                    return esperou
+
+                if agora - inicio >= timeout:
+                    balde.fila.remove(ticket)
+                    heapq.heapify(balde.fila)
+                    self._cond.notify_all()
+                    raise CotaEsgotada("Google Sheets: cota esgotada. Tente novamente em instantes.")
+
+                # só o primeiro da fila sabe quanto falta; os demais esperam ser avisados
+                espera = balde.espera_proxima(agora) if primeiro else 1.0
+                self._cond.wait(min(max(espera, 0.01), timeout - (agora - inicio)))
+
+    def pausar(self, tipo, segundos):
+        """Chamado após um 429: zera o balde e segura todos por `segundos`."""
+        with self._cond:
+            balde = self._baldes[tipo]
+            agora = time_module.monotonic()
+            balde.repor(agora)
+            balde.tokens = min(balde.tokens, 0.0)
+            balde.pausado_ate = max(balde.pausado_ate, agora + segundos)
+            self.pausas += 1
+            self._cond.notify_all()
+
+    def previsao_espera(self, tipo):
+        """Estimativa (s) para uma nova chamada de `tipo` ser atendida agora."""
+        with self._cond:
+            balde = self._baldes[tipo]
+            agora = time_module.monotonic()
+            balde.repor(agora)
+            faltam = len(balde.fila) + 1 - balde.tokens
+            atraso_pausa = max(0.0, balde.pausado_ate - agora)
+            return atraso_pausa + max(0.0, faltam) / balde.taxa
+
+    def estatisticas(self):
+        with self._cond:
+            return {
+                tipo: {
+                    "fichas": round(b.tokens, 2),
+                    "na_fila": len(b.fila),
+                    "concedidas": self.concedidas[tipo],
+                    "espera_total_s": round(self.espera_total[tipo], 3),
+                }
+                for tipo, b in self._baldes.items()
+            }
+
+
+_agendador = AgendadorCota()
+
+
+def agendador():
+    return _agendador
+
+
+def configurar(leituras_por_min=60, escritas_por_min=60, rajada=10):
+    """Substitui o agendador do processo (chamar uma vez, na subida)."""
+    global _agendador
+    _agendador = AgendadorCota(leituras_por_min, escritas_por_min, rajada)
+    return _agendador
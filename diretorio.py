@@ -0,0 +1,114 @@
+"""
+Diretório de usuários indexado (Login / Cadastro / Recuperar).
+
+Montado uma vez por snapshot de usuários: e-mail e telefone já normalizados
+viram chaves de dicionário, então cada consulta é O(1) em vez de varrer e
+re-normalizar todos os registros a cada rerun.
+"""
+from telefone import tel_only_digits
+
+
+def norm_email(s) -> str:
+    return str(s or "").strip().lower()
+
+
+class DiretorioUsuarios:
+    """
+    `registros` mantém a ordem da planilha; os índices guardam, para cada
+    chave, as posições na ordem original (a 1ª ocorrência vence, como no
+    `next(...)` que existia antes). Linha na planilha = posição + 2.
+    """
+
+    def __init__(self, registros):
+        self.registros = list(registros or [])
+        self._por_email = {}
+        self._por_tel = {}
+        for i, u in enumerate(self.registros):
+            self._por_email.setdefault(norm_email(u.get("Email", "")), []).append(i)
+            tel = tel_only_digits(u.get("TELEFONE", ""))
+            if tel:
+                self._por_tel.setdefault(tel, []).append(i)
+
+    def __len__(self):
+        return len(self.registros)
+
+    def __iter__(self):
+        return iter(self.registros)
+
+    @staticmethod
+    def linha_planilha(posicao: int) -> int:
+        return posicao + 2
+
+    def email_existe(self, email) -> bool:
+        return norm_email(email) in self._por_email
+
+    def tel_existe(self, tel) -> bool:
+        return tel_only_digits(tel) in self._por_tel
+
+    def buscar_por_email(self, email):
+        """(registro, linha_planilha) do 1º usuário com o e-mail, ou (None, None)."""
+        pos = self._por_email.get(norm_email(email))
+        if not pos:
+            return None, None
+        return self.registros[pos[0]], self.linha_planilha(pos[0])
+
+    def autenticar(self, email, senha, tel):
+        """Registro que confere e-mail + senha + telefone, ou None."""
+        tel_digits = tel_only_digits(tel)
+        for i in self._por_email.get(norm_email(email), []):
+            u = self.registros[i]
+            if str(u.get("Senha", "")) == str(senha) and tel_only_digits(u.get("TELEFONE", "")) == tel_digits:
+                return u
+        return None
+
+
+# ==========================================================
+# EDIÇÃO EM LOTE (PAINEL ADM)
+# ==========================================================
+def calcular_alteracoes_usuarios(registros, editados):
+    """
+    Compara o snapshot (`registros`, na ordem da planilha) com as linhas do
+    editor (`editados`: dicts com "Linha", "Email", "Liberar", "Excluir").
+
+    Retorna (status_por_linha, linhas_remover, emails_por_linha):
+    - status_por_linha: {linha_planilha: "ATIVO" | "INATIVO"} só do que mudou
+      (linhas que serão excluídas não recebem update);
+    - linhas_remover: números de linha a excluir, em ordem crescente;
+    - emails_por_linha: e-mail esperado em cada linha tocada, para conferir
+      que a planilha não mudou desde o snapshot.
+    """
+    status_por_linha = {}
+    linhas_remover = set()
+    emails_por_linha = {}
+
+    for ed in editados:
+        linha = int(ed["Linha"])
+        pos = linha - 2
+        if pos < 0 or pos >= len(registros):
+            continue
+        u = registros[pos]
+        if norm_email(u.get("Email", "")) != norm_email(ed.get("Email", "")):
+            continue
+
+        if bool(ed.get("Excluir")):
+            linhas_remover.add(linha)
+            emails_por_linha[linha] = norm_email(u.get("Email", ""))
+            continue
+
+        era_ativo = str(u.get("STATUS", "")).strip().upper() == "ATIVO"
+        if bool(ed.get("Liberar")) != era_ativo:
+            status_por_linha[linha] = "ATIVO" if ed.get("Liberar") else "INATIVO"
+            emails_por_linha[linha] = norm_email(u.get("Email", ""))
+
+    return status_por_linha, sorted(linhas_remover), emails_por_linha
+
+
+def snapshot_confere(registros_atuais, emails_por_linha):
+    """True se cada linha tocada ainda tem o mesmo e-mail na leitura atual."""
+    for linha, email in emails_por_linha.items():
+        pos = linha - 2
+        if pos < 0 or pos >= len(registros_atuais):
+            return False
+        if norm_email(registros_atuais[pos].get("Email", "")) != email:
+            return False
+    return True
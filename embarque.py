@@ -0,0 +1,209 @@
+"""
+Conferência do embarque persistida na planilha (coluna G da presença).
+
+Marcar alguém grava, na linha dele, o próprio e-mail na coluna EMBARQUE. A
+marca só vale se bate com o e-mail da linha (coluna F). Desmarcar grava
+vazio.
+
+A escrita é por posição (G{linha}), e uma linha errada não só deixa de
+conferir quem foi marcado: sobrescreve (ou apaga) a marca de outra pessoa.
+Por isso a linha de cada e-mail não vem do snapshot, que pode estar atrás
+de uma exclusão feita por outro processo ou à mão, e sim das colunas F:G
+lidas logo antes de cada lote (`ler_marcas_embarque`). Sobra a janela entre
+essa leitura e a escrita: a marca gravada só sai da fila quando a leitura
+do lote seguinte confirma que ela ficou na linha daquele e-mail; se não
+ficou, é gravada de novo (a de quem estava na linha atingida, essa, se
+perde: a janela é de uma requisição, não de um ciclo de snapshot).
+
+`ConferenciaEmbarque` tira a gravação do clique: `marcar` só anota a
+intenção (por e-mail; a última vence) e uma thread grava tudo o que juntou
+num único batch_update, no máximo um a cada `intervalo` segundos. O
+celular de quem confere só fala com o servidor do app; com sinal ruim, um
+clique que chegou já está salvo no servidor, e a tela recarregada volta
+com as marcas. Falha na gravação mantém as marcas pendentes e tenta de
+novo (sem sobrescrever cliques mais novos).
+
+Os outros conferentes veem as marcas pelo snapshot da lista: quem gravou
+aplica o lote no cache (`ao_gravar`), e a versão dos dados (versao.py)
+avisa os outros processos.
+"""
+import threading
+import time as time_module
+
+from armazenamento import CABECALHO_EMBARQUE, COL_EMBARQUE
+from cota import PRIORIDADE_PRESENCA, prioridade
+
+
+def _email(linha):
+    return str(linha[5]).strip().lower() if len(linha) >= 6 else ""
+
+
+def conferidos(linhas):
+    """E-mails com marca válida (coluna de embarque = e-mail da própria linha)."""
+    out = set()
+    for linha in (linhas or [])[1:]:
+        email = _email(linha)
+        if email and len(linha) >= COL_EMBARQUE and str(linha[COL_EMBARQUE - 1]).strip().lower() == email:
+            out.add(email)
+    return out
+
+
+def com_embarque(linhas, coluna):
+    """`linhas` com a coluna de embarque trocada por `coluna` (um valor por linha); None = sem mudança."""
+    if coluna is None or not linhas:
+        return linhas
+    out = []
+    for i, linha in enumerate(linhas):
+        r = list(linha) + [""] * (COL_EMBARQUE - len(linha))
+        r[COL_EMBARQUE - 1] = CABECALHO_EMBARQUE if i == 0 else (str(coluna[i]) if i < len(coluna) else "")
+        out.append(r)
+    return out
+
+
+def aplicar_marcas(linhas, marcas):
+    """
+    `linhas` com {email: conferido} aplicado na 1ª linha de cada e-mail.
+    Retorna None se não há cabeçalho para aplicar em cima.
+    """
+    if not linhas:
+        return None
+    coluna = [linha[COL_EMBARQUE - 1] if len(linha) >= COL_EMBARQUE else "" for linha in linhas]
+    vistos = set()
+    for i, linha in enumerate(linhas[1:], start=1):
+        email = _email(linha)
+        if email in marcas and email not in vistos:
+            vistos.add(email)
+            coluna[i] = email if marcas[email] else ""
+    return com_embarque(linhas, coluna)
+
+
+class ConferenciaEmbarque:
+    """
+    banco: armazenamento (ler_marcas_embarque, marcar_embarque).
+    ao_gravar(marcas): chamado com {email: conferido} depois de cada lote gravado.
+    """
+
+    def __init__(self, banco, ao_gravar=None, intervalo=3.0, intervalo_retentativa=5.0):
+        self.banco = banco
+        self.ao_gravar = ao_gravar
+        self.intervalo = intervalo
+        self.intervalo_retentativa = intervalo_retentativa
+
+        self._lock = threading.Lock()
+        self._pendentes = {}
+        self._aguardando = {}   # gravadas, à espera de confirmação: {email: (linha, conferido)}
+        self._acordar = threading.Event()
+        self._ultimo_lote = 0.0
+
+        self.cliques = 0
+        self.lotes = 0
+        self.marcas_gravadas = 0
+        self.descartadas = 0
+        self.refeitas = 0
+        self.falhas = 0
+
+        self._thread = threading.Thread(target=self._loop, name="conferencia-embarque", daemon=True)
+        self._thread.start()
+
+    # ----- API -----
+    def marcar(self, email, conferido):
+        """Anota a marca (não espera a planilha)."""
+        email = str(email).strip().lower()
+        if not email:
+            return
+        with self._lock:
+            self._pendentes[email] = bool(conferido)
+            self.cliques += 1
+        self._acordar.set()
+
+    def pendentes(self):
+        """{email: conferido} ainda não confirmados na planilha (a tela sobrepõe ao snapshot)."""
+        with self._lock:
+            out = {email: conferido for email, (_, conferido) in self._aguardando.items()}
+            out.update(self._pendentes)
+        return out
+
+    def estatisticas(self):
+        with self._lock:
+            pendentes, aguardando = len(self._pendentes), len(self._aguardando)
+        return {"cliques": self.cliques, "lotes": self.lotes, "marcas_gravadas": self.marcas_gravadas,
+                "descartadas": self.descartadas, "refeitas": self.refeitas, "falhas": self.falhas,
+                "pendentes": pendentes, "aguardando": aguardando}
+
+    # ----- thread -----
+    @staticmethod
+    def _posicoes(linhas):
+        """{email: (linha_planilha, conferido)} da 1ª linha de cada e-mail."""
+        out = {}
+        for i, (email, marca) in enumerate((linhas or [])[1:], start=2):
+            email = str(email).strip().lower()
+            if email and email not in out:
+                out[email] = (i, str(marca).strip().lower() == email)
+        return out
+
+    def _conferir(self, posicoes):
+        """Confirma as marcas do lote anterior; as que não ficaram na linha do e-mail voltam à fila."""
+        with self._lock:
+            aguardando, self._aguardando = self._aguardando, {}
+            for email, (linha, conferido) in aguardando.items():
+                atual = posicoes.get(email)
+                if atual is None:
+                    continue   # saiu da lista
+                # mesma linha: a escrita caiu nele (o valor de agora pode ser de outro conferente)
+                if atual[0] == linha or atual[1] == conferido:
+                    continue
+                if email not in self._pendentes:
+                    self._pendentes[email] = conferido
+                    self.refeitas += 1
+
+    def _gravar(self):
+        with self._lock:
+            if not self._pendentes and not self._aguardando:
+                return
+        self._ultimo_lote = time_module.monotonic()
+        try:
+            with prioridade(PRIORIDADE_PRESENCA):
+                posicoes = self._posicoes(self.banco.ler_marcas_embarque())
+                self._conferir(posicoes)
+                with self._lock:
+                    marcas = dict(self._pendentes)
+                # só grava o que está na lista e ainda não está como pedido
+                linhas = {e: posicoes[e][0] for e, v in marcas.items() if e in posicoes and posicoes[e][1] != v}
+                if linhas:
+                    self.banco.marcar_embarque({linhas[e]: e if marcas[e] else "" for e in linhas})
+        except Exception:
+            # continuam pendentes; cliques feitos durante a tentativa já as substituíram
+            self.falhas += 1
+            self._acordar.wait(self.intervalo_retentativa)
+            self._acordar.set()
+            return
+        if linhas:
+            self.lotes += 1
+            self.marcas_gravadas += len(linhas)
+        self.descartadas += sum(1 for e in marcas if e not in posicoes)
+        if self.ao_gravar is not None:
+            try:
+                self.ao_gravar(marcas)
+            except Exception:
+                pass
+        with self._lock:
+            # só sai da fila o que foi gravado com o mesmo valor (o snapshot já tem)
+            for email, conferido in marcas.items():
+                if self._pendentes.get(email) == conferido:
+                    del self._pendentes[email]
+                    if email in linhas:
+                        self._aguardando[email] = (linhas[email], conferido)
+            conferir = bool(self._aguardando)
+        if conferir:
+            # a confirmação vem da leitura do próximo lote (depois do intervalo)
+            self._acordar.set()
+
+    def _loop(self):
+        while True:
+            self._acordar.wait()
+            self._acordar.clear()
+            # debounce: junta os cliques e respeita o intervalo mínimo entre lotes
+            espera = self.intervalo - (time_module.monotonic() - self._ultimo_lote)
+            if espera > 0:
+                time_module.sleep(espera)
+            self._gravar()
@@ -0,0 +1,107 @@
+"""
+Fila de escrita (write-behind) das confirmações de presença.
+
+Na abertura da lista (domingo 19:00 e reaberturas) todos confirmam ao mesmo
+tempo; em vez de um append_row por clique, as confirmações de todas as sessões
+são juntadas e gravadas a cada `intervalo` segundos num único append em lote.
+
+- O horário (DATA_HORA) é atribuído no momento em que entra na fila, sob o
+  mesmo lock que define a ordem, então a ordem de chegada é preservada.
+- Cada sessão recebe um Future que só é resolvido depois que o lote que
+  contém a sua linha foi gravado (ou falhou).
+- `ao_gravar(linhas)`, se informado, recebe cada lote gravado antes de os
+  Futures serem resolvidos (o app aplica o lote direto no cache da lista).
+"""
+import threading
+import time as time_module
+from concurrent.futures import Future
+
+from cota import PRIORIDADE_PRESENCA, prioridade
+
+
+FORMATO_DATA_HORA = "%d/%m/%Y %H:%M:%S"
+
+
+class FilaPresenca:
+    def __init__(self, banco, relogio, intervalo=0.3, max_lote=200, ao_gravar=None):
+        self.banco = banco
+        self.relogio = relogio
+        self.ao_gravar = ao_gravar
+        self.intervalo = intervalo
+        self.max_lote = max_lote
+
+        self._lock = threading.Lock()
+        self._evento = threading.Event()
+        self._pendentes = []          # [(linha, future)] na ordem de chegada
+        self._por_email = {}          # email -> future (evita duplo clique duplicar linha)
+
+        self.lotes_gravados = 0
+        self.linhas_gravadas = 0
+        self.falhas = 0
+
+        self._thread = threading.Thread(target=self._loop, name="fila-presenca", daemon=True)
+        self._thread.start()
+
+    def enfileirar(self, dados):
+        """
+        dados = [QG_RMCF_OUTROS, GRADUAÇÃO, NOME, LOTAÇÃO, EMAIL].
+        Retorna um Future cujo resultado é a linha gravada (com DATA_HORA).
+        """
+        email = str(dados[-1] or "").strip().lower()
+        with self._lock:
+            if email and email in self._por_email:
+                return self._por_email[email]
+            agora = self.relogio().strftime(FORMATO_DATA_HORA)
+            linha = [agora] + list(dados)
+            fut = Future()
+            self._pendentes.append((linha, fut))
+            if email:
+                self._por_email[email] = fut
+            self._evento.set()
+        return fut
+
+    def pendentes(self):
+        with self._lock:
+            return len(self._pendentes)
+
+    def _retirar_lote(self):
+        with self._lock:
+            lote = self._pendentes[:self.max_lote]
+            self._pendentes = self._pendentes[self.max_lote:]
+            if not self._pendentes:
+                self._evento.clear()
+            return lote
+
+    def _liberar_emails(self, lote):
+        with self._lock:
+            for linha, _ in lote:
+                self._por_email.pop(str(linha[-1] or "").strip().lower(), None)
+
+    def _loop(self):
+        while True:
+            self._evento.wait()
+            # janela de coleta: junta os cliques que chegam logo em seguida
+            time_module.sleep(self.intervalo)
+            lote = self._retirar_lote()
+            if not lote:
+                continue
+            try:
+                with prioridade(PRIORIDADE_PRESENCA):
+                    self.banco.adicionar_presencas([linha for linha, _ in lote])
+            except Exception as e:
+                self.falhas += 1
+                self._liberar_emails(lote)
+                for _, fut in lote:
+                    fut.set_exception(e)
+                continue
+
+            self.lotes_gravados += 1
+            self.linhas_gravadas += len(lote)
+            if self.ao_gravar is not None:
+                try:
+                    self.ao_gravar([linha for linha, _ in lote])
+                except Exception:
+                    pass
+            self._liberar_emails(lote)
+            for linha, fut in lote:
+                fut.set_result(linha)
@@ -0,0 +1,182 @@
+"""
+Arquivo histórico local dos ciclos encerrados.
+
+A cada virada (ciclo.py) a lista que sai é ordenada como no app e gravada
+numa partição própria, CSV comprimido (gzip), dentro da pasta do mês:
+
+    historico/
+      manifesto.json
+      2026-10/2026-10-17_0650.csv.gz
+      2026-10/2026-10-17_1850.csv.gz
+
+O manifesto guarda, por ciclo, o arquivo da partição e os totais (inscritos,
+vagas, excedentes). Assim:
+- ocupação e excedentes por período saem só do manifesto, sem abrir dados;
+- consultas por militar leem apenas as partições do intervalo pedido
+  (poda por data) e só as colunas necessárias.
+
+Gravações são atômicas (arquivo temporário + os.replace), e registrar o
+mesmo ciclo de novo substitui a partição anterior. pandas só é importado
+quando uma partição é gravada ou consultada.
+"""
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from ordenacao import VAGAS
+
+
+COLUNAS_HISTORICO = ["CICLO", "POSICAO", "DATA_HORA", "QG_RMCF_OUTROS", "GRADUAÇÃO", "NOME",
+                     "LOTAÇÃO", "EMAIL", "EXCEDENTE"]
+FORMATO_CICLO = "%Y-%m-%d %H:%M"
+MANIFESTO = "manifesto.json"
+
+
+def _data_ciclo(ciclo):
+    return datetime.strptime(ciclo, FORMATO_CICLO)
+
+
+def _limite(valor, fim=False):
+    """
+    Aceita date/datetime, "AAAA-MM" ou "AAAA-MM-DD"; None = sem limite.
+    `fim` devolve o início do período seguinte (limite exclusivo).
+    """
+    if valor is None:
+        return None
+    mes = isinstance(valor, str) and len(valor) == 7
+    if isinstance(valor, str):
+        valor = datetime.strptime(valor, "%Y-%m" if mes else "%Y-%m-%d")
+    inicio = datetime(valor.year, valor.month, 1 if mes else valor.day)
+    if fim:
+        if mes:
+            inicio = inicio.replace(year=inicio.year + inicio.month // 12, month=inicio.month % 12 + 1)
+        else:
+            inicio += timedelta(days=1)
+    return inicio.strftime(FORMATO_CICLO)
+
+
+class ArquivoHistorico:
+    def __init__(self, diretorio="historico", vagas=VAGAS):
+        self.diretorio = diretorio
+        self.vagas = vagas
+        self._lock = threading.Lock()
+        os.makedirs(diretorio, exist_ok=True)
+        self._manifesto = self._ler_manifesto()
+        self.ultima_consulta = {"particoes_lidas": 0, "particoes_total": 0}
+
+    # ----- manifesto -----
+    def _caminho(self, relativo):
+        return os.path.join(self.diretorio, relativo)
+
+    def _ler_manifesto(self):
+        try:
+            with open(self._caminho(MANIFESTO), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"ciclos": {}}
+
+    def _gravar_atomico(self, caminho, escrever):
+        tmp = caminho + ".tmp"
+        escrever(tmp)
+        os.replace(tmp, caminho)
+
+    def _salvar_manifesto(self):
+        def escrever(tmp):
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._manifesto, f, ensure_ascii=False, indent=1, sort_keys=True)
+        self._gravar_atomico(self._caminho(MANIFESTO), escrever)
+
+    # ----- escrita -----
+    def registrar_ciclo(self, ciclo, linhas):
+        """`linhas`: linhas da presença (sem cabeçalho) do ciclo que encerrou."""
+        import pandas as pd
+        from ordenacao import aplicar_ordenacao
+
+        dt = _data_ciclo(ciclo)
+        linhas = [list(l)[:6] + [""] * (6 - len(list(l)[:6])) for l in linhas]
+        df = pd.DataFrame(linhas, columns=COLUNAS_HISTORICO[2:8])
+        if not df.empty:
+            df, _ = aplicar_ordenacao(df)
+        n = len(df)
+        df.insert(0, "CICLO", ciclo)
+        df.insert(1, "POSICAO", range(1, n + 1))
+        df["EXCEDENTE"] = df["POSICAO"] > self.vagas
+        df = df[COLUNAS_HISTORICO]
+
+        relativo = os.path.join(dt.strftime("%Y-%m"), dt.strftime("%Y-%m-%d_%H%M") + ".csv.gz")
+        caminho = self._caminho(relativo)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+
+        with self._lock:
+            self._gravar_atomico(caminho, lambda tmp: df.to_csv(tmp, index=False, compression="gzip"))
+            self._manifesto["ciclos"][ciclo] = {
+                "arquivo": relativo,
+                "inscritos": n,
+                "vagas": self.vagas,
+                "excedentes": max(0, n - self.vagas),
+            }
+            self._salvar_manifesto()
+        return n
+
+    # ----- consulta -----
+    def ciclos(self, de=None, ate=None):
+        """Entradas do manifesto no intervalo (ordem cronológica), sem ler partições."""
+        ini, fim = _limite(de), _limite(ate, fim=True)
+        with self._lock:
+            itens = sorted(self._manifesto["ciclos"].items())
+        return [
+            dict(meta, ciclo=ciclo) for ciclo, meta in itens
+            if (ini is None or ciclo >= ini) and (fim is None or ciclo < fim)
+        ]
+
+    def utilizacao(self, de=None, ate=None):
+        """Ocupação e excedentes por ciclo, só a partir do manifesto."""
+        import pandas as pd
+
+        df = pd.DataFrame(self.ciclos(de, ate), columns=["ciclo", "inscritos", "vagas", "excedentes"])
+        df["ocupacao_pct"] = (df[["inscritos", "vagas"]].min(axis=1) / df["vagas"].where(df["vagas"] > 0) * 100).round(1)
+        return df
+
+    def presencas(self, de=None, ate=None, email=None, colunas=None):
+        """Linhas das partições do intervalo; `email` filtra um militar."""
+        import pandas as pd
+
+        selecionados = self.ciclos(de, ate)
+        with self._lock:
+            total = len(self._manifesto["ciclos"])
+        self.ultima_consulta = {"particoes_lidas": len(selecionados), "particoes_total": total}
+
+        usar = list(colunas or COLUNAS_HISTORICO)
+        if email is not None and "EMAIL" not in usar:
+            usar.append("EMAIL")
+        partes = []
+        for meta in selecionados:
+            df = pd.read_csv(self._caminho(meta["arquivo"]), usecols=usar, dtype=str,
+                             keep_default_na=False, compression="gzip")
+            if email is not None:
+                df = df[df["EMAIL"].str.strip().str.lower() == str(email).strip().lower()]
+            partes.append(df)
+        if not partes:
+            return pd.DataFrame(columns=usar)
+        return pd.concat(partes, ignore_index=True)
+
+    def frequencia_por_militar(self, de=None, ate=None):
+        """Por e-mail: nome/graduação mais recentes, ciclos presentes, vezes excedente, posição média."""
+        import pandas as pd
+
+        df = self.presencas(de, ate, colunas=["CICLO", "POSICAO", "GRADUAÇÃO", "NOME", "EMAIL", "EXCEDENTE"])
+        if df.empty:
+            return pd.DataFrame(columns=["EMAIL", "GRADUAÇÃO", "NOME", "ciclos", "excedente", "posicao_media"])
+        df["EMAIL"] = df["EMAIL"].str.strip().str.lower()
+        df["POSICAO"] = pd.to_numeric(df["POSICAO"], errors="coerce")
+        df["EXCEDENTE"] = df["EXCEDENTE"] == "True"
+        ultimos = df.sort_values("CICLO").groupby("EMAIL")[["GRADUAÇÃO", "NOME"]].last()
+        agregado = df.groupby("EMAIL").agg(
+            ciclos=("CICLO", "nunique"),
+            excedente=("EXCEDENTE", "sum"),
+            posicao_media=("POSICAO", "mean"),
+        )
+        out = ultimos.join(agregado).reset_index()
+        out["posicao_media"] = out["posicao_media"].round(1)
+        return out.sort_values(["ciclos", "NOME"], ascending=[False, True], ignore_index=True)
@@ -0,0 +1,174 @@
+"""
+Instrumentação das chamadas ao Google Sheets (gs_call).
+
+Cada operação gera um evento (operação, worksheet, latência, tentativas,
+espera na cota, resultado) guardado num buffer circular em memória, além
+de histogramas de latência e contadores acumulados por operação.
+Indicadores avulsos (ex.: tempos da partida a frio) ficam como gauges.
+Exporta em texto Prometheus e em JSON lines.
+"""
+import json
+import threading
+import time as time_module
+from collections import deque
+
+
+BUCKETS_LATENCIA = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+RESULTADO_OK = "ok"
+RESULTADO_ERRO = "erro"
+RESULTADO_ESGOTADO = "esgotado"
+
+
+def _percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return 0.0
+    k = min(len(valores_ordenados) - 1, max(0, int(round(p / 100.0 * (len(valores_ordenados) - 1)))))
+    return valores_ordenados[k]
+
+
+class _Serie:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS_LATENCIA) + 1)   # último = +Inf
+        self.soma = 0.0
+        self.total = 0
+        self.por_resultado = {}
+        self.tentativas_extras = 0
+        self.http_429 = 0
+        self.http_5xx = 0
+
+    def observar(self, latencia):
+        for i, limite in enumerate(BUCKETS_LATENCIA):
+            if latencia <= limite:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.soma += latencia
+        self.total += 1
+
+
+class RegistroMetricas:
+    def __init__(self, capacidade=2000):
+        self._lock = threading.Lock()
+        self._eventos = deque(maxlen=capacidade)
+        self._series = {}       # (operacao, worksheet) -> _Serie
+        self._indicadores = {}  # nome -> último valor
+        self.iniciado_em = time_module.time()
+
+    def registrar(self, operacao, worksheet, latencia, tentativas, resultado,
+                  http_429=0, http_5xx=0, espera_cota=0.0):
+        evento = {
+            "ts": round(time_module.time(), 3),
+            "operacao": operacao,
+            "worksheet": worksheet,
+            "latencia_s": round(latencia, 4),
+            "tentativas": tentativas,
+            "resultado": resultado,
+            "http_429": http_429,
+            "http_5xx": http_5xx,
+            "espera_cota_s": round(espera_cota, 4),
+        }
+        with self._lock:
+            self._eventos.append(evento)
+            serie = self._series.get((operacao, worksheet))
+            if serie is None:
+                serie = self._series[(operacao, worksheet)] = _Serie()
+            serie.observar(latencia)
+            serie.por_resultado[resultado] = serie.por_resultado.get(resultado, 0) + 1
+            serie.tentativas_extras += max(0, tentativas - 1)
+            serie.http_429 += http_429
+            serie.http_5xx += http_5xx
+
+    def definir_indicador(self, nome, valor):
+        with self._lock:
+            self._indicadores[nome] = float(valor)
+
+    def indicadores(self):
+        with self._lock:
+            return dict(self._indicadores)
+
+    def eventos(self):
+        with self._lock:
+            return list(self._eventos)
+
+    def resumo(self):
+        """Uma linha por operação/worksheet, com percentis calculados sobre o buffer."""
+        with self._lock:
+            eventos = list(self._eventos)
+            series = dict(self._series)
+
+        lat_recentes = {}
+        for ev in eventos:
+            lat_recentes.setdefault((ev["operacao"], ev["worksheet"]), []).append(ev["latencia_s"])
+
+        linhas = []
+        for (op, ws), serie in sorted(series.items()):
+            lat = sorted(lat_recentes.get((op, ws), []))
+            linhas.append({
+                "operacao": op,
+                "worksheet": ws,
+                "chamadas": serie.total,
+                "erros": serie.total - serie.por_resultado.get(RESULTADO_OK, 0),
+                "retries": serie.tentativas_extras,
+                "http_429": serie.http_429,
+                "http_5xx": serie.http_5xx,
+                "media_ms": round(serie.soma / serie.total * 1000, 1) if serie.total else 0.0,
+                "p50_ms": round(_percentil(lat, 50) * 1000, 1),
+                "p95_ms": round(_percentil(lat, 95) * 1000, 1),
+                "p99_ms": round(_percentil(lat, 99) * 1000, 1),
+            })
+        return linhas
+
+    def exportar_jsonl(self):
+        return "\n".join(json.dumps(ev, ensure_ascii=False) for ev in self.eventos()) + "\n"
+
+    def exportar_prometheus(self):
+        with self._lock:
+            series = {k: v for k, v in self._series.items()}
+
+        def rotulos(op, ws, extra=""):
+            base = f'operacao="{op}",worksheet="{ws}"'
+            return "{" + base + (("," + extra) if extra else "") + "}"
+
+        out = [
+            "# HELP rota_sheets_latencia_segundos Latência das chamadas ao Google Sheets.",
+            "# TYPE rota_sheets_latencia_segundos histogram",
+        ]
+        for (op, ws), s in sorted(series.items()):
+            acumulado = 0
+            for limite, n in zip(BUCKETS_LATENCIA, s.buckets):
+                acumulado += n
+                le = 'le="%s"' % limite
+                out.append(f"rota_sheets_latencia_segundos_bucket{rotulos(op, ws, le)} {acumulado}")
+            le = 'le="+Inf"'
+            out.append(f"rota_sheets_latencia_segundos_bucket{rotulos(op, ws, le)} {s.total}")
+            out.append(f"rota_sheets_latencia_segundos_sum{rotulos(op, ws)} {s.soma:.6f}")
+            out.append(f"rota_sheets_latencia_segundos_count{rotulos(op, ws)} {s.total}")
+
+        out += ["# HELP rota_sheets_chamadas_total Chamadas por resultado.", "# TYPE rota_sheets_chamadas_total counter"]
+        for (op, ws), s in sorted(series.items()):
+            for res, n in sorted(s.por_resultado.items()):
+                r = 'resultado="%s"' % res
+                out.append(f"rota_sheets_chamadas_total{rotulos(op, ws, r)} {n}")
+
+        for nome, attr, ajuda in (
+            ("rota_sheets_retries_total", "tentativas_extras", "Tentativas além da primeira."),
+            ("rota_sheets_http_429_total", "http_429", "Respostas 429 (cota)."),
+            ("rota_sheets_http_5xx_total", "http_5xx", "Respostas 5xx."),
+        ):
+            out += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} counter"]
+            for (op, ws), s in sorted(series.items()):
+                out.append(f"{nome}{rotulos(op, ws)} {getattr(s, attr)}")
+
+        for nome, valor in sorted(self.indicadores().items()):
+            out += [f"# TYPE rota_{nome} gauge", f"rota_{nome} {valor:.6f}"]
+
+        return "\n".join(out) + "\n"
+
+
+_registro = RegistroMetricas()
+
+
+def registro():
+    return _registro
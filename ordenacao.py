@@ -0,0 +1,166 @@
+"""
+Ordenação da lista de presença (prioridade FC > origem > graduação > horário).
+
+As prioridades viram arrays de chaves calculados coluna a coluna, a lista é
+ordenada uma única vez (np.lexsort, estável: empates mantêm a ordem de
+chegada na planilha) e o destaque dos excedentes é aplicado por máscara,
+sem iterrows / df.at célula a célula.
+
+numpy/pandas são importados dentro das funções: quem só precisa das
+constantes (VAGAS, FORMATO_DATA_HORA) não paga o import na partida do app.
+
+Para listas do tamanho de um ônibus há também um caminho sem pandas
+(`ordenar_linhas`): registros com __slots__, chave de ordenação calculada
+uma vez por linha e list.sort (também estável). Mesma ordem e mesma
+numeração do caminho pandas, que continua como alternativa.
+"""
+from datetime import datetime
+
+
+VAGAS = 38
+FORMATO_DATA_HORA = "%d/%m/%Y %H:%M:%S"
+ABRE_EXCEDENTE = "<span style='color:#d32f2f; font-weight:bold;'>"
+FECHA_EXCEDENTE = "</span>"
+
+P_ORIGEM = {"QG": 1, "RMCF": 2, "OUTROS": 3}
+P_GRUPO_FC = {"FC COM": 1, "FC TER": 2}
+P_GRAD_NORMAL = {
+    "TCEL": 1, "MAJ": 2, "CAP": 3, "1º TEN": 4, "2º TEN": 5, "SUBTEN": 6,
+    "1º SGT": 7, "2º SGT": 8, "3º SGT": 9, "CB": 10, "SD": 11
+}
+
+
+def rotulos_numeracao(n: int, vagas: int = VAGAS):
+    """'1'..'38' para as vagas e 'Exc-01', 'Exc-02'... para os excedentes."""
+    return [str(i + 1) if i < vagas else f"Exc-{i - vagas + 1:02d}" for i in range(n)]
+
+
+def chaves_ordenacao(df):
+    """(grupo_fc, p_o, p_g, dt) como arrays numpy, na ordem das linhas de df."""
+    import numpy as np
+    import pandas as pd
+
+    grad = df["GRADUAÇÃO"].fillna("").astype(str).str.strip().str.upper()
+
+    grupo_fc = grad.map(P_GRUPO_FC).fillna(0).to_numpy(dtype=np.int64)
+    p_o = df["QG_RMCF_OUTROS"].map(P_ORIGEM).fillna(99).to_numpy(dtype=np.int64)
+    p_g = np.where(grupo_fc == 0, grad.map(P_GRAD_NORMAL).fillna(999).to_numpy(dtype=np.int64), 0)
+
+    dt = pd.to_datetime(df["DATA_HORA"], format=FORMATO_DATA_HORA, errors="coerce")
+    # NaT vai para o fim, como no sort_values
+    dt_ns = np.where(dt.isna().to_numpy(), np.iinfo(np.int64).max, dt.to_numpy(dtype="datetime64[ns]").view(np.int64))
+
+    return grupo_fc, p_o, p_g, dt_ns
+
+
+def destacar_excedentes(df, vagas: int = VAGAS):
+    """Cópia de df com as linhas além das vagas envolvidas no span vermelho (HTML)."""
+    import pandas as pd
+
+    if len(df) <= vagas:
+        return df.copy()
+    exc = ABRE_EXCEDENTE + df.iloc[vagas:].astype(str) + FECHA_EXCEDENTE
+    return pd.concat([df.iloc[:vagas], exc])
+
+
+def aplicar_ordenacao(df):
+    import numpy as np
+
+    if "EMAIL" not in df.columns:
+        df["EMAIL"] = "N/A"
+
+    if "QG_RMCF_OUTROS" not in df.columns and "ORIGEM" in df.columns:
+        df["QG_RMCF_OUTROS"] = df["ORIGEM"]
+    if "QG_RMCF_OUTROS" not in df.columns:
+        df["QG_RMCF_OUTROS"] = ""
+
+    grupo_fc, p_o, p_g, dt_ns = chaves_ordenacao(df)
+    # lexsort: a última chave é a principal
+    ordem = np.lexsort((dt_ns, p_g, p_o, grupo_fc))
+
+    df = df.take(ordem).reset_index(drop=True)
+    df.insert(0, "Nº", rotulos_numeracao(len(df)))
+
+    return df, destacar_excedentes(df)
+
+
+# ==========================================================
+# CAMINHO RÁPIDO (SEM PANDAS)
+# ==========================================================
+class RegistroPresenca:
+    """Uma linha já ordenada: rótulo (Nº), valores na ordem de `colunas[1:]`."""
+
+    __slots__ = ("numero", "valores", "_indice")
+
+    def __init__(self, numero, valores, indice):
+        self.numero = numero
+        self.valores = valores
+        self._indice = indice
+
+    def get(self, coluna, padrao=""):
+        """Mesmo acesso de uma linha do DataFrame (row.get), incluindo "Nº"."""
+        if coluna == "Nº":
+            return self.numero
+        i = self._indice.get(coluna)
+        return self.valores[i] if i is not None else padrao
+
+    def como_lista(self):
+        return [self.numero] + list(self.valores)
+
+
+def _chave(grad, origem, data_hora):
+    """Mesmos critérios de chaves_ordenacao, para uma linha."""
+    g = "" if grad is None else str(grad).strip().upper()
+    grupo_fc = P_GRUPO_FC.get(g, 0)
+    p_o = P_ORIGEM.get(origem, 99)
+    p_g = P_GRAD_NORMAL.get(g, 999) if grupo_fc == 0 else 0
+    try:
+        dt = datetime.strptime(data_hora, FORMATO_DATA_HORA)
+    except (TypeError, ValueError):
+        dt = datetime.max        # sem data válida vai para o fim
+    return grupo_fc, p_o, p_g, dt
+
+
+def ordenar_linhas(cabecalho, linhas, vagas: int = VAGAS):
+    """
+    Equivalente a aplicar_ordenacao sobre DataFrame(linhas, columns=cabecalho),
+    sem pandas. Retorna (colunas, registros): colunas começa com "Nº".
+    """
+    colunas = list(cabecalho)
+    extras = []
+    if "EMAIL" not in colunas:
+        extras.append(lambda l: "N/A")
+        colunas.append("EMAIL")
+    if "QG_RMCF_OUTROS" not in colunas:
+        if "ORIGEM" in colunas:
+            i_origem = colunas.index("ORIGEM")
+            extras.append(lambda l: l[i_origem])
+        else:
+            extras.append(lambda l: "")
+        colunas.append("QG_RMCF_OUTROS")
+
+    largura = len(cabecalho)
+    brutas = []
+    for l in linhas:
+        l = tuple(l[:largura]) + (None,) * (largura - len(l))
+        brutas.append(l + tuple(f(l) for f in extras) if extras else l)
+
+    i_grad = colunas.index("GRADUAÇÃO")
+    i_orig = colunas.index("QG_RMCF_OUTROS")
+    i_dt = colunas.index("DATA_HORA")
+    chaves = [_chave(l[i_grad], l[i_orig], l[i_dt]) for l in brutas]
+    ordem = sorted(range(len(brutas)), key=chaves.__getitem__)
+
+    indice = {c: i for i, c in enumerate(colunas)}
+    rotulos = rotulos_numeracao(len(ordem), vagas)
+    registros = [RegistroPresenca(rotulos[n], brutas[i], indice) for n, i in enumerate(ordem)]
+    return ["Nº"] + colunas, registros
+
+
+def registros_de_dataframe(df_o):
+    """Converte a saída de aplicar_ordenacao (df_o) para (colunas, registros)."""
+    colunas = list(df_o.columns)
+    indice = {c: i for i, c in enumerate(colunas[1:])}
+    registros = [RegistroPresenca(l[0], tuple(l[1:]), indice) for l in df_o.values.tolist()]
+    return colunas, registros
+
@@ -0,0 +1,83 @@
+"""
+Partida a frio (cold start) do app.
+
+- `INICIO`: instante em que o processo começou a rodar o app (este módulo é
+  o primeiro import do app.py e só é importado uma vez por processo).
+- `preaquecer`: em segundo plano, importa os módulos pesados e abre o
+  cliente, o documento e as worksheets do Sheets, com as worksheets em
+  paralelo. As funções recebidas são as versões com st.cache_resource, então
+  quem chegar depois (a thread do atualizador, a sessão) já encontra o handle.
+- `primeiro_render`: chamado no fim do script; mede, uma vez por processo, o
+  tempo até o primeiro render completo.
+
+Os tempos ficam em `etapas()` e viram indicadores em metricas.py.
+"""
+import importlib
+import threading
+import time as time_module
+from concurrent.futures import ThreadPoolExecutor
+
+import metricas
+
+
+INICIO = time_module.perf_counter()
+
+_lock = threading.Lock()
+_etapas = {}
+_primeiro_render = None
+
+
+def _marcar(nome, segundos):
+    with _lock:
+        _etapas[nome] = round(segundos, 3)
+    metricas.registro().definir_indicador(f"partida_{nome}_segundos", segundos)
+
+
+def _medir(nome, func):
+    inicio = time_module.perf_counter()
+    try:
+        return func()
+    finally:
+        _marcar(nome, time_module.perf_counter() - inicio)
+
+
+def etapas():
+    with _lock:
+        return dict(_etapas)
+
+
+def preaquecer(cliente, documento, worksheets, modulos=()):
+    """
+    cliente / documento: callables (o 2º depende do 1º).
+    worksheets: {nome: callable}, abertos em paralelo depois do documento.
+    modulos: nomes de módulos importados em paralelo com a autenticação.
+    Retorna a thread (daemon) que faz o trabalho. Erros são ignorados: o
+    cache_resource não guarda exceção, e o caminho normal tenta de novo.
+    """
+    def rodar():
+        with ThreadPoolExecutor(max_workers=max(1, len(worksheets) + len(modulos)), thread_name_prefix="preaquecer") as ex:
+            imports = [ex.submit(_medir, f"import_{m}", lambda m=m: importlib.import_module(m)) for m in modulos]
+            try:
+                _medir("cliente", cliente)
+                _medir("documento", documento)
+                abertos = [ex.submit(_medir, f"ws_{n}", f) for n, f in worksheets.items()]
+                for fut in abertos + imports:
+                    fut.result()
+            except Exception:
+                pass
+            _marcar("preaquecimento", time_module.perf_counter() - INICIO)
+
+    t = threading.Thread(target=rodar, name="preaquecer", daemon=True)
+    t.start()
+    return t
+
+
+def primeiro_render():
+    """Registra (uma vez por processo) o tempo desde a partida até o fim do 1º render."""
+    global _primeiro_render
+    with _lock:
+        if _primeiro_render is not None:
+            return _primeiro_render
+        _primeiro_render = time_module.perf_counter() - INICIO
+    _marcar("primeiro_render", _primeiro_render)
+    return _primeiro_render
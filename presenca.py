@@ -0,0 +1,163 @@
+"""
+Snapshot da lista de presença e sincronização incremental.
+
+Em vez de baixar a planilha inteira (get_all_values) a cada expiração do
+cache, o sincronizador guarda quantas linhas já tem e lê somente a partir da
+última linha conhecida. Essa última linha funciona como marcador de versão:
+
+- se ela continua igual na mesma posição, só as linhas seguintes são novas;
+- se mudou ou sumiu, houve exclusão ou o ciclo foi zerado: recarga completa.
+
+Escritas do próprio app (append em lote, exclusão de uma linha) podem ser
+aplicadas direto no snapshot (`acrescentar_local` / `remover_local`): a
+próxima sincronização confere a partir da nova última linha, então, se a
+planilha não tiver ficado como o cache, cai na recarga completa.
+
+A leitura pode vir de fora: `linha_inicial()` diz de onde ler e
+`sincronizar(lidas, desde)` aplica o que a leitura consolidada do
+armazenamento (ler_tudo) já trouxe, sem outra ida à planilha.
+"""
+import threading
+import time as time_module
+
+
+class SnapshotPresenca:
+    """Linhas (com cabeçalho) + versão local, que muda a cada alteração percebida."""
+
+    def __init__(self, linhas, versao=0, sincronizado_em=None):
+        self.linhas = linhas
+        self.versao = versao
+        self.sincronizado_em = sincronizado_em if sincronizado_em is not None else time_module.time()
+
+    @property
+    def total_linhas(self):
+        return len(self.linhas)
+
+    def idade(self):
+        return time_module.time() - self.sincronizado_em
+
+
+def _ajustar(linha, largura):
+    r = ["" if v is None else str(v) for v in list(linha)[:largura]]
+    return r + [""] * (largura - len(r))
+
+
+def _chave_linha(linha, largura):
+    return [v.strip() for v in _ajustar(linha, largura)]
+
+
+def acrescentar_linhas(linhas, novas):
+    """
+    linhas + novas (ajustadas à largura do cabeçalho). Idempotente: se o fim
+    de `linhas` já são essas linhas (uma leitura chegou primeiro), não repete.
+    Retorna None se não há cabeçalho para aplicar em cima.
+    """
+    if not linhas or not novas:
+        return None
+    largura = max(len(linhas[0]), 1)
+    novas = [_ajustar(l, largura) for l in novas]
+    cauda = linhas[-len(novas):] if len(linhas) > len(novas) else []
+    if [_chave_linha(l, largura) for l in cauda] == [_chave_linha(l, largura) for l in novas]:
+        return linhas
+    return linhas + novas
+
+
+def remover_linha(linhas, linha_planilha, email):
+    """
+    linhas sem a `linha_planilha` (1 = cabeçalho), desde que ela ainda seja a
+    do `email`; senão None (o cache não confere: melhor reler).
+    """
+    i = int(linha_planilha) - 1
+    if not linhas or i < 1 or i >= len(linhas):
+        return None
+    r = linhas[i]
+    if len(r) < 6 or str(r[5]).strip().lower() != str(email).strip().lower():
+        return None
+    return linhas[:i] + linhas[i + 1:]
+
+
+class SincronizadorPresenca:
+    def __init__(self, banco):
+        self.banco = banco
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self.recargas_completas = 0
+        self.leituras_incrementais = 0
+
+    def invalidar(self):
+        """Força a próxima sincronização a ser completa."""
+        with self._lock:
+            self._snapshot = None
+
+    def snapshot(self):
+        return self._snapshot
+
+    def acrescentar_local(self, linhas):
+        """Aplica linhas recém-gravadas por este processo (append) sem ler a planilha."""
+        with self._lock:
+            atual = self._snapshot
+            resultado = acrescentar_linhas(atual.linhas if atual else None, linhas)
+            if resultado is None or resultado is atual.linhas:
+                return
+            self._snapshot = SnapshotPresenca(resultado, atual.versao + 1, atual.sincronizado_em)
+
+    def remover_local(self, linha_planilha, email):
+        """Aplica uma exclusão feita por este processo; se o cache não confere, invalida."""
+        with self._lock:
+            atual = self._snapshot
+            resultado = remover_linha(atual.linhas if atual else None, linha_planilha, email)
+            if resultado is None:
+                self._snapshot = None
+                return
+            self._snapshot = SnapshotPresenca(resultado, atual.versao + 1, atual.sincronizado_em)
+
+    def linha_inicial(self):
+        """Linha da planilha a partir da qual a próxima sincronização lê (1 = tudo)."""
+        atual = self._snapshot
+        return 1 if atual is None or not atual.linhas else atual.total_linhas
+
+    def _recarregar(self, versao_anterior, linhas=None):
+        if linhas is None:
+            linhas = self.banco.ler_presenca() or []
+        self.recargas_completas += 1
+        return SnapshotPresenca(linhas, versao_anterior + 1)
+
+    def sincronizar(self, lidas=None, desde=None):
+        """
+        Sem argumentos, lê do banco. Com `lidas` (linhas a partir de `desde`,
+        vindas de outra leitura), só aplica; se elas não servem mais (o cache
+        mudou no meio), lê do banco como antes.
+        """
+        pedido_em = time_module.time()
+        with self._lock:
+            atual = self._snapshot
+            # outra thread sincronizou enquanto esperávamos o lock: serve
+            if lidas is None and atual is not None and atual.sincronizado_em >= pedido_em:
+                return atual
+            inicio = 1 if atual is None or not atual.linhas else atual.total_linhas
+            if lidas is not None and desde == 1:
+                self._snapshot = self._recarregar(atual.versao if atual else 0, lidas)
+                return self._snapshot
+            if lidas is not None and desde is not None and 1 < desde <= inicio:
+                # acréscimo local depois de pedida a leitura: confere a partir da nova última linha
+                lidas = lidas[inicio - desde:]
+            elif inicio == 1:
+                self._snapshot = self._recarregar(atual.versao if atual else 0)
+                return self._snapshot
+            else:
+                lidas = self.banco.ler_presenca_desde(inicio) or []
+
+            largura = max(len(atual.linhas[0]), 1)
+            self.leituras_incrementais += 1
+
+            if not lidas or _chave_linha(lidas[0], largura) != _chave_linha(atual.linhas[-1], largura):
+                self._snapshot = self._recarregar(atual.versao)
+                return self._snapshot
+
+            # linhas em branco no meio são mantidas: o índice vira o nº da linha na planilha
+            novas = [_ajustar(l, largura) for l in lidas[1:]]
+            if novas:
+                self._snapshot = SnapshotPresenca(atual.linhas + novas, atual.versao + 1)
+            else:
+                atual.sincronizado_em = time_module.time()
+            return self._snapshot
@@ -0,0 +1,191 @@
+"""
+Relatórios da lista de presença (PDF).
+
+O PDF é gerado sob demanda e guardado num cache LRU do processo, endereçado
+pelo conteúdo (hash da lista ordenada + resumo): todas as sessões que veem a
+mesma versão da lista compartilham um único render, inclusive as que pedem
+ao mesmo tempo, antes de ele ficar pronto (single-flight, concorrencia.py).
+
+A tabela HTML, o texto do WhatsApp (e o link já codificado) e a própria
+ordenação dependem só da presença exibida: são gerados uma vez por
+conteúdo (hash das linhas) e reaproveitados por todas as sessões.
+
+A ordenação usa o caminho sem pandas (ordenacao.ordenar_linhas); pandas
+só é importado como alternativa, e o fpdf (relatorio_pdf.py) só quando
+alguém pede o PDF.
+"""
+import hashlib
+import json
+import threading
+import urllib.parse
+from collections import OrderedDict
+
+from concorrencia import SingleFlight
+from ordenacao import ABRE_EXCEDENTE, FECHA_EXCEDENTE, VAGAS, ordenar_linhas
+
+
+# ==========================================================
+# CACHE (LRU, ENDEREÇADO PELO CONTEÚDO)
+# ==========================================================
+COLUNAS_PDF = ["Nº", "GRADUAÇÃO", "NOME", "LOTAÇÃO", "QG_RMCF_OUTROS", "ORIGEM"]
+
+
+class CacheLRU:
+    """
+    Falhas simultâneas na mesma chave passam pelo SingleFlight: um único
+    `gerar` (ex.: o render do PDF) atende todas as sessões que esperavam.
+    `faltas` conta os renders de fato; quem pegou carona conta como acerto.
+    """
+
+    def __init__(self, capacidade=16):
+        self.capacidade = capacidade
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self._voo = SingleFlight()
+        self.acertos = 0
+        self.faltas = 0
+
+    def obter(self, chave, gerar):
+        with self._lock:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return self._itens[chave]
+        gerou = []
+
+        def gerar_e_guardar():
+            with self._lock:
+                # gerado por outro voo entre a busca acima e aqui
+                if chave in self._itens:
+                    return self._itens[chave]
+                self.faltas += 1
+            gerou.append(True)
+            valor = gerar()
+            with self._lock:
+                self._itens[chave] = valor
+                self._itens.move_to_end(chave)
+                while len(self._itens) > self.capacidade:
+                    self._itens.popitem(last=False)
+            return valor
+
+        valor = self._voo.executar(chave, gerar_e_guardar)
+        if not gerou:
+            with self._lock:
+                self.acertos += 1
+        return valor
+
+    def __len__(self):
+        return len(self._itens)
+
+
+def chave_relatorio(colunas, registros, resumo: dict) -> str:
+    cols = [c for c in COLUNAS_PDF if c in colunas]
+    conteudo = {
+        "colunas": cols,
+        "linhas": [[str(r.get(c)) for c in cols] for r in registros],
+        "resumo": resumo,
+    }
+    bruto = json.dumps(conteudo, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(bruto).hexdigest()
+
+
+_cache_pdf = CacheLRU(capacidade=16)
+
+
+def cache_pdf():
+    return _cache_pdf
+
+
+def pdf_relatorio(colunas, registros, resumo: dict) -> bytes:
+    """
+    PDF da lista (registros ordenados, ver ListaRenderizada), gerado uma vez
+    por versão da lista. O "Emitido em" é o horário do primeiro render dessa versão.
+    """
+    def gerar():
+        from relatorio_pdf import gerar_pdf_apresentado
+        return gerar_pdf_apresentado(registros, resumo)
+
+    return _cache_pdf.obter(chave_relatorio(colunas, registros, resumo), gerar)
+
+
+# ==========================================================
+# TABELA HTML / WHATSAPP (UMA VEZ POR VERSÃO DA LISTA)
+# ==========================================================
+def tabela_html(colunas, registros, vagas=VAGAS, ocultar=("EMAIL",)):
+    """Mesma tabela do df_v.to_html(index=False, justify="center", escape=False)."""
+    visiveis = [i for i, c in enumerate(colunas) if c not in ocultar]
+    partes = ['<table class="dataframe">', "  <thead>", '    <tr style="text-align: center;">']
+    partes += [f"      <th>{colunas[i]}</th>" for i in visiveis]
+    partes += ["    </tr>", "  </thead>", "  <tbody>"]
+    for n, r in enumerate(registros):
+        linha = r.como_lista()
+        if n < vagas:
+            celulas = [str(linha[i]) for i in visiveis]
+        else:
+            celulas = [ABRE_EXCEDENTE + str(linha[i]) + FECHA_EXCEDENTE for i in visiveis]
+        partes.append("    <tr>")
+        partes += [f"      <td>{c.strip()}</td>" for c in celulas]
+        partes.append("    </tr>")
+    partes += ["  </tbody>", "</table>"]
+    return "\n".join(partes)
+
+
+class ListaRenderizada:
+    """
+    Artefatos prontos de uma versão da lista. Compartilhado: não modifique.
+    `registros`: ordenacao.RegistroPresenca na ordem final (r.get("NOME"), r.numero...).
+    """
+
+    def __init__(self, colunas, registros, vagas=VAGAS):
+        self.colunas = colunas
+        self.registros = registros
+        self.inscritos = len(registros)
+
+        self.html_tabela = f"<div class='tabela-responsiva'>{tabela_html(colunas, registros, vagas)}</div>"
+
+        itens = "".join(f"{r.numero}. {r.get('GRADUAÇÃO')} {r.get('NOME')}\n" for r in registros)
+        self.texto_whatsapp = "*🚌 LISTA DE PRESENÇA*\n\n" + itens
+        self.link_whatsapp = "https://wa.me/?text=" + urllib.parse.quote(self.texto_whatsapp)
+
+        self.posicao_por_email = {}
+        for i, r in enumerate(registros):
+            self.posicao_por_email.setdefault(str(r.get("EMAIL")).strip().lower(), i + 1)
+
+    def pdf(self, resumo):
+        return pdf_relatorio(self.colunas, self.registros, resumo)
+
+
+_cache_listas = CacheLRU(capacidade=4)
+
+
+def cache_listas():
+    return _cache_listas
+
+
+def ordenar_pandas(cabecalho, linhas):
+    """Caminho antigo (DataFrame + lexsort), mesmo formato de saída de ordenar_linhas."""
+    import pandas as pd
+    from ordenacao import aplicar_ordenacao, registros_de_dataframe
+
+    df_o, _ = aplicar_ordenacao(pd.DataFrame(linhas, columns=cabecalho))
+    return registros_de_dataframe(df_o)
+
+
+def chave_lista(dados_p_show) -> str:
+    """Hash do conteúdo da presença exibida (o contador de versão do snapshot recomeça com o processo)."""
+    bruto = json.dumps(dados_p_show, ensure_ascii=False, default=str).encode("utf-8")
+    return hashlib.sha256(bruto).hexdigest()
+
+
+def lista_renderizada(dados_p_show) -> ListaRenderizada:
+    """
+    Artefatos da lista, endereçados pelo conteúdo de `dados_p_show`. Ordena
+    pelo caminho sem pandas; se ele falhar com algum dado inesperado, usa o pandas.
+    """
+    def gerar():
+        cabecalho, linhas = dados_p_show[0], dados_p_show[1:]
+        try:
+            return ListaRenderizada(*ordenar_linhas(cabecalho, linhas))
+        except Exception:
+            return ListaRenderizada(*ordenar_pandas(cabecalho, linhas))
+    return _cache_listas.obter(chave_lista(dados_p_show), gerar)
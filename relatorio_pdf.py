@@ -0,0 +1,105 @@
+"""
+PDF da lista de presença (fpdf). Importado só quando alguém pede o PDF;
+o cache dos PDFs gerados fica em relatorio.py.
+"""
+from datetime import datetime
+
+import pytz
+from fpdf import FPDF
+
+
+FUSO_BR = pytz.timezone("America/Sao_Paulo")
+
+
+# ==========================================================
+# PDF “mais apresentado” (AGORA COM ORIGEM À DIREITA)
+# ==========================================================
+class PDFRelatorio(FPDF):
+    def __init__(self, titulo="LISTA DE PRESENÇA", sub=None):
+        super().__init__(orientation="P", unit="mm", format="A4")
+        self.titulo = titulo
+        self.sub = sub or ""
+        self.set_auto_page_break(auto=True, margin=12)
+        self.alias_nb_pages()
+
+    def header(self):
+        self.set_font("Arial", "B", 14)
+        self.cell(0, 8, self.titulo, ln=True, align="C")
+
+        self.set_font("Arial", "", 9)
+        if self.sub:
+            self.cell(0, 5, self.sub, ln=True, align="C")
+        self.ln(2)
+
+        self.set_draw_color(180, 180, 180)
+        self.line(10, self.get_y(), 200, self.get_y())
+        self.ln(4)
+
+    def footer(self):
+        self.set_y(-12)
+        self.set_font("Arial", "", 8)
+        self.set_text_color(90, 90, 90)
+        self.cell(0, 6, f"Página {self.page_no()}/{{nb}} - Rota Nova Iguaçu", align="C")
+
+
+def gerar_pdf_apresentado(linhas, resumo: dict) -> bytes:
+    """`linhas`: linhas já ordenadas com acesso r.get(coluna) (RegistroPresenca ou linha de DataFrame)."""
+    agora = datetime.now(FUSO_BR).strftime("%d/%m/%Y %H:%M:%S")
+    sub = f"Emitido em: {agora}"
+
+    pdf = PDFRelatorio(titulo="ROTA NOVA IGUAÇU - LISTA DE PRESENÇA", sub=sub)
+    pdf.add_page()
+
+    pdf.set_font("Arial", "B", 10)
+    pdf.set_fill_color(240, 240, 240)
+    pdf.cell(0, 8, "RESUMO", ln=True, fill=True)
+
+    pdf.set_font("Arial", "", 9)
+    insc = resumo.get("inscritos", 0)
+    vagas = resumo.get("vagas", 38)
+    exc = max(0, insc - vagas)
+    sobra = max(0, vagas - insc)
+
+    pdf.cell(0, 6, f"Inscritos: {insc} | Vagas: {vagas} | Sobra: {sobra} | Excedentes: {exc}", ln=True)
+    pdf.ln(2)
+
+    headers = ["Nº", "GRADUAÇÃO", "NOME", "LOTAÇÃO", "ORIGEM"]
+    col_w = [12, 26, 78, 55, 19]
+
+    pdf.set_font("Arial", "B", 9)
+    pdf.set_fill_color(30, 30, 30)
+    pdf.set_text_color(255, 255, 255)
+
+    for i, h in enumerate(headers):
+        pdf.cell(col_w[i], 7, h, border=0, align="C", fill=True)
+    pdf.ln()
+
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_font("Arial", "", 8)
+
+    for idx, r in enumerate(linhas):
+        is_exc = "Exc-" in str(r.get("Nº", ""))
+        if is_exc:
+            pdf.set_fill_color(255, 235, 238)
+        else:
+            if idx % 2 == 0:
+                pdf.set_fill_color(245, 245, 245)
+            else:
+                pdf.set_fill_color(255, 255, 255)
+
+        origem = str(r.get("QG_RMCF_OUTROS", "") or r.get("ORIGEM", "") or "").strip()
+
+        pdf.cell(col_w[0], 6, str(r.get("Nº", "")), border=0, fill=True)
+        pdf.cell(col_w[1], 6, str(r.get("GRADUAÇÃO", "")), border=0, fill=True)
+        pdf.cell(col_w[2], 6, str(r.get("NOME", ""))[:42], border=0, fill=True)
+        pdf.cell(col_w[3], 6, str(r.get("LOTAÇÃO", ""))[:34], border=0, fill=True)
+        pdf.cell(col_w[4], 6, origem[:10], border=0, align="C", fill=True)
+        pdf.ln()
+
+    pdf.ln(4)
+    pdf.set_font("Arial", "I", 8)
+    pdf.set_text_color(80, 80, 80)
+    pdf.multi_cell(0, 5, "Observação: os itens marcados como 'Exc-xx' representam excedentes além do limite de 38 vagas.")
+    pdf.set_text_color(0, 0, 0)
+
+    return pdf.output(dest="S").encode("latin-1")
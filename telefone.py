@@ -0,0 +1,34 @@
+import re
+
+
+# ==========================================================
+# TELEFONE:
+# ==========================================================
+def tel_only_digits(s: str) -> str:
+    return re.sub(r"\D+", "", str(s or ""))
+
+def tel_format_br(digits: str) -> str:
+    """
+    Formata 11 dígitos como: (xx) xxxxx.xxxx
+    Se tiver menos, retorna o que der sem quebrar.
+    """
+    d = tel_only_digits(digits)
+    if len(d) >= 2:
+        ddd = d[:2]
+        rest = d[2:]
+    else:
+        return d
+
+    if len(rest) >= 9:
+        p1 = rest[:5]
+        p2 = rest[5:9]
+        return f"({ddd}) {p1}.{p2}"
+    elif len(rest) > 5:
+        p1 = rest[:5]
+        p2 = rest[5:]
+        return f"({ddd}) {p1}.{p2}"
+    else:
+        return f"({ddd}) {rest}"
+
+def tel_is_valid_11(s: str) -> bool:
+    return len(tel_only_digits(s)) == 11
@@ -0,0 +1,127 @@
+"""
+Paridade da ordenação: ordenar_linhas (sem pandas) x aplicar_ordenacao
+(pandas + lexsort). Mesma ordem, mesma numeração (Nº / Exc-xx), mesma
+tabela HTML (também contra o df_v.to_html) e o mesmo texto do WhatsApp.
+"""
+import os
+import random
+import re
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pd = pytest.importorskip("pandas")
+
+from ordenacao import VAGAS, aplicar_ordenacao, ordenar_linhas  # noqa: E402
+from relatorio import ListaRenderizada, ordenar_pandas  # noqa: E402
+
+
+GRADS = ["TCEL", "MAJ", "CAP", "1º TEN", "2º TEN", "SUBTEN", "1º SGT",
+         "2º SGT", "3º SGT", "CB", "SD", "FC COM", "FC TER"]
+ORIGENS = ["QG", "RMCF", "OUTROS"]
+COLUNAS = ["DATA_HORA", "QG_RMCF_OUTROS", "GRADUAÇÃO", "NOME", "LOTAÇÃO", "EMAIL"]
+
+
+def gerar_linhas(n, semente=42):
+    """Linhas no formato da planilha, com horários distintos, fora de ordem."""
+    rnd = random.Random(semente)
+    inicio = datetime(2026, 1, 4, 19, 0, 0)
+    linhas = [[
+        (inicio + timedelta(seconds=i)).strftime("%d/%m/%Y %H:%M:%S"),
+        rnd.choice(ORIGENS),
+        rnd.choice(GRADS),
+        f"MILITAR {i:04d}",
+        f"UNIDADE {rnd.randint(1, 40)}",
+        f"militar{i:04d}@rota.br",
+    ] for i in range(n)]
+    rnd.shuffle(linhas)
+    return linhas
+
+
+def gerar_linhas_sujas(n, semente=7):
+    """Com empates de horário, datas inválidas/vazias, graduação com espaços e origem desconhecida."""
+    rnd = random.Random(semente)
+    linhas = gerar_linhas(n, semente)
+    for l in linhas:
+        sorteio = rnd.random()
+        if sorteio < 0.1:
+            l[0] = "data inválida" if rnd.random() < 0.5 else ""
+        elif sorteio < 0.3:
+            l[0] = "04/01/2026 19:00:00"
+        if rnd.random() < 0.1:
+            l[2] = f"  {l[2].lower()} "
+        if rnd.random() < 0.05:
+            l[1] = "BATALHÃO"
+    return linhas
+
+
+def _espacos(html):
+    return re.sub(r"(?:&nbsp;|\s)+", " ", html)
+
+
+def conferir_paridade(cabecalho, linhas):
+    rapido = ListaRenderizada(*ordenar_linhas(cabecalho, linhas))
+    lento = ListaRenderizada(*ordenar_pandas(cabecalho, linhas))
+    assert rapido.colunas == lento.colunas
+    assert [r.como_lista() for r in rapido.registros] == [r.como_lista() for r in lento.registros]
+    assert rapido.html_tabela == lento.html_tabela
+    assert rapido.texto_whatsapp == lento.texto_whatsapp
+
+    # a tabela gerada à mão é a do df_v.to_html, a menos do atributo border (muda entre
+    # versões do pandas) e de espaços em branco (o pandas troca alguns por &nbsp;)
+    _, df_v = aplicar_ordenacao(pd.DataFrame(linhas, columns=cabecalho))
+    html_pandas = df_v.drop(columns=["EMAIL"]).to_html(index=False, justify="center", border=0, escape=False)
+    html_pandas = "<div class='tabela-responsiva'>" + html_pandas.replace(' border="0"', "") + "</div>"
+    assert _espacos(rapido.html_tabela) == _espacos(html_pandas)
+    return rapido
+
+
+@pytest.mark.parametrize("n", [1, VAGAS - 1, VAGAS, VAGAS + 1, 200])
+def test_paridade_lista_limpa(n):
+    conferir_paridade(COLUNAS, gerar_linhas(n))
+
+
+@pytest.mark.parametrize("n", [1, VAGAS - 1, VAGAS, VAGAS + 1, 200])
+def test_paridade_com_empates_e_datas_invalidas(n):
+    conferir_paridade(COLUNAS, gerar_linhas_sujas(n, semente=n))
+
+
+def test_lista_vazia():
+    rapido = ListaRenderizada(*ordenar_linhas(COLUNAS, []))
+    lento = ListaRenderizada(*ordenar_pandas(COLUNAS, []))
+    assert rapido.inscritos == lento.inscritos == 0
+    assert rapido.html_tabela == lento.html_tabela
+    assert rapido.texto_whatsapp == lento.texto_whatsapp
+
+
+def test_empates_mantem_ordem_de_chegada():
+    mesma_hora = "04/01/2026 19:00:00"
+    linhas = [[mesma_hora, "QG", "SD", f"MILITAR {i}", "U", f"m{i}@rota.br"] for i in range(5)]
+    lista = conferir_paridade(COLUNAS, linhas)
+    assert [r.get("NOME") for r in lista.registros] == [f"MILITAR {i}" for i in range(5)]
+
+
+def test_grupos_fc_origem_e_graduacao():
+    hora = "04/01/2026 19:00:0{}".format
+    linhas = [
+        [hora(0), "OUTROS", "TCEL", "A", "U", "a@rota.br"],
+        [hora(1), "RMCF", "SD", "B", "U", "b@rota.br"],
+        [hora(2), "QG", "CB", "C", "U", "c@rota.br"],
+        [hora(3), "QG", "FC TER", "D", "U", "d@rota.br"],
+        [hora(4), "OUTROS", "FC COM", "E", "U", "e@rota.br"],
+        [hora(5), "QG", "MAJ", "F", "U", "f@rota.br"],
+        [hora(6), "RMCF", "CAP", "G", "U", "g@rota.br"],
+        [hora(7), "BATALHÃO", "SD", "H", "U", "h@rota.br"],
+    ]
+    lista = conferir_paridade(COLUNAS, linhas)
+    # sem FC antes dos FC COM, que vêm antes dos FC TER; dentro: QG > RMCF > OUTROS, depois graduação
+    assert [r.get("NOME") for r in lista.registros] == ["F", "C", "G", "B", "A", "H", "E", "D"]
+
+
+def test_colunas_faltando():
+    conferir_paridade(COLUNAS[:5], [l[:5] for l in gerar_linhas_sujas(60)])
+    com_origem = ["DATA_HORA", "ORIGEM", "GRADUAÇÃO", "NOME", "LOTAÇÃO", "EMAIL"]
+    conferir_paridade(com_origem, gerar_linhas_sujas(60))
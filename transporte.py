@@ -0,0 +1,232 @@
+"""
+Transporte HTTP do cliente gspread.
+
+Em vez do `gspread.authorize` padrão, o cliente usa uma sessão nossa
+(`TransporteSheets`):
+
+- um pool de conexões keep-alive dimensionado para as threads do processo
+  (atualizador, fila, versão, conferência, sessões); falha ao conectar (o
+  pedido nem saiu) é repetida pelo urllib3, o resto segue para o gs_call;
+- respostas comprimidas: o Google só manda gzip quando o User-Agent também
+  diz "gzip";
+- prazo por chamada: gs_call abre `prazo(tipo)` e o cliente passa o
+  (conectar, resposta) daquele tipo de operação; sem prazo, nenhuma
+  chamada fica pendurada para sempre;
+- o token é renovado por uma thread antes de vencer (`margem_renovacao`),
+  então nenhuma requisição paga a renovação;
+- depois de falha de autenticação ou de conexão (`notificar_falha`, chamado
+  pelo gs_call; resposta lenta não conta), o pool é descartado, o token é renovado e `ao_recriar` é
+  chamado, no máximo uma vez a cada `intervalo_recriacao` s: é onde o app
+  limpa os handles em cache (documento, worksheets) para serem reabertos.
+
+Este módulo só é importado quando o Sheets é usado (gs_call / conexão).
+"""
+import contextvars
+import threading
+import time as time_module
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import requests
+from google.auth.exceptions import RefreshError, TransportError
+from google.auth.transport.requests import AuthorizedSession, Request
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
+
+from cota import ESCRITA, LEITURA
+
+
+USER_AGENT = "rota-nova-iguacu (gzip)"
+PRAZOS = {LEITURA: (5.0, 20.0), ESCRITA: (5.0, 30.0)}   # (conectar, resposta) em s
+
+_prazo = contextvars.ContextVar("prazo_sheets", default=None)
+
+
+@contextmanager
+def prazo(tipo):
+    """Prazo das requisições feitas dentro do bloco (nesta thread): LEITURA, ESCRITA ou (conectar, resposta)."""
+    token = _prazo.set(PRAZOS.get(tipo, tipo))
+    try:
+        yield
+    finally:
+        _prazo.reset(token)
+
+
+def prazo_atual():
+    return _prazo.get() or PRAZOS[LEITURA]
+
+
+def resposta_lenta(erro):
+    """True para estouro do prazo de resposta (com o Retry do adaptador, chega como ConnectionError)."""
+    if isinstance(erro, requests.ReadTimeout):
+        return True
+    causa = erro.args[0] if isinstance(erro, requests.ConnectionError) and erro.args else None
+    return isinstance(getattr(causa, "reason", None), ReadTimeoutError)
+
+
+def falha_de_conexao(erro):
+    """
+    True para erro de autenticação ou de conexão (vale recriar sessão e handles).
+    Estouro do prazo de resposta não conta: a conexão estava de pé e a chamada
+    só foi lenta; recriar custaria open/worksheet de novo na cota.
+    """
+    if resposta_lenta(erro):
+        return False
+    if isinstance(erro, (RefreshError, TransportError, requests.ConnectionError)):
+        return True
+    if isinstance(erro, APIError):
+        return getattr(erro, "code", None) == 401
+    return False
+
+
+class ClienteHTTP(HTTPClient):
+    """HTTPClient do gspread que usa o prazo da chamada atual (`prazo`)."""
+
+    def __init__(self, auth, session=None):
+        super().__init__(auth, session)
+        self.auth = auth
+
+    def request(self, method, endpoint, params=None, data=None, json=None, files=None, headers=None):
+        response = self.session.request(
+            method=method, url=endpoint, json=json, params=params, data=data, files=files,
+            headers=headers, timeout=self.timeout or prazo_atual(),
+        )
+        if response.ok:
+            return response
+        raise APIError(response)
+
+
+class TransporteSheets:
+    """
+    credenciais: google.auth (ex.: service account com os escopos do app).
+    ao_recriar(): chamado depois de uma falha de autenticação/conexão.
+    """
+
+    def __init__(self, credenciais, ao_recriar=None, conexoes=16, margem_renovacao=600.0,
+                 intervalo_recriacao=30.0, intervalo_retentativa=30.0):
+        self.credenciais = credenciais
+        self.ao_recriar = ao_recriar
+        self.conexoes = conexoes
+        self.margem_renovacao = margem_renovacao
+        self.intervalo_recriacao = intervalo_recriacao
+        self.intervalo_retentativa = intervalo_retentativa
+
+        self._lock = threading.Lock()
+        self._renovar = threading.Event()
+        self._fechado = False
+        self._ultima_recriacao = 0.0
+        self._sessao_token = requests.Session()
+        self.sessao = self._nova_sessao()
+
+        self.renovacoes = 0
+        self.falhas_renovacao = 0
+        self.falhas_conexao = 0
+        self.recriacoes = 0
+
+        self._thread = threading.Thread(target=self._loop, name="transporte-sheets", daemon=True)
+        self._thread.start()
+
+    # ----- API -----
+    def cliente(self):
+        """Cliente gspread sobre a sessão deste transporte."""
+        import gspread
+        return gspread.Client(auth=self.credenciais, session=self.sessao, http_client=ClienteHTTP)
+
+    def falhou(self, erro):
+        """Trata uma falha vinda do gs_call; True se era de autenticação/conexão."""
+        if not falha_de_conexao(erro):
+            return False
+        self.falhas_conexao += 1
+        agora = time_module.monotonic()
+        with self._lock:
+            if agora - self._ultima_recriacao < self.intervalo_recriacao:
+                return True
+            self._ultima_recriacao = agora
+        # pool novo na próxima requisição (as conexões em uso fecham ao voltar)
+        self.sessao.close()
+        self._renovar.set()
+        if self.ao_recriar is not None:
+            try:
+                self.ao_recriar()
+            except Exception:
+                pass
+        self.recriacoes += 1
+        return True
+
+    def fechar(self):
+        self._fechado = True
+        self._renovar.set()
+        self.sessao.close()
+        self._sessao_token.close()
+
+    def estatisticas(self):
+        return {"renovacoes": self.renovacoes, "falhas_renovacao": self.falhas_renovacao,
+                "falhas_conexao": self.falhas_conexao, "recriacoes": self.recriacoes,
+                "token_vence_em_s": round(self._segundos_para_vencer(), 1)}
+
+    # ----- sessão -----
+    def _nova_sessao(self):
+        sessao = AuthorizedSession(self.credenciais)
+        # só repete o que com certeza não chegou ao Google (conectar); estouro do
+        # prazo de resposta não é repetido aqui, e 429/5xx ficam com o gs_call
+        repeticao = Retry(total=2, connect=2, read=0, status=0, redirect=0, other=0,
+                          backoff_factor=0.2, raise_on_status=False)
+        adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=self.conexoes, max_retries=repeticao)
+        sessao.mount("https://", adaptador)
+        sessao.headers.update({"Accept-Encoding": "gzip", "User-Agent": USER_AGENT})
+        return sessao
+
+    # ----- token -----
+    def _segundos_para_vencer(self):
+        expiry = getattr(self.credenciais, "expiry", None)
+        if expiry is None or not getattr(self.credenciais, "token", None):
+            return 0.0
+        agora = datetime.now(timezone.utc)
+        if expiry.tzinfo is None:
+            agora = agora.replace(tzinfo=None)   # google-auth guarda o vencimento em UTC sem fuso
+        return (expiry - agora).total_seconds()
+
+    def _renovar_token(self):
+        try:
+            self.credenciais.refresh(Request(self._sessao_token))
+            self.renovacoes += 1
+            return True
+        except Exception:
+            self.falhas_renovacao += 1
+            return False
+
+    def _loop(self):
+        while not self._fechado:
+            espera = self._segundos_para_vencer() - self.margem_renovacao
+            forcar = self._renovar.wait(min(max(espera, 0.0), 600.0))
+            self._renovar.clear()
+            if self._fechado:
+                return
+            if forcar or self._segundos_para_vencer() <= self.margem_renovacao:
+                if not self._renovar_token():
+                    self._renovar.wait(self.intervalo_retentativa)
+
+
+_transporte = None
+
+
+def transporte():
+    return _transporte
+
+
+def configurar(credenciais, **opcoes):
+    """Cria o transporte do processo (substitui e fecha o anterior)."""
+    global _transporte
+    anterior, _transporte = _transporte, TransporteSheets(credenciais, **opcoes)
+    if anterior is not None:
+        anterior.fechar()
+    return _transporte
+
+
+def notificar_falha(erro):
+    """Chamado pelo gs_call em erros; sem transporte configurado não faz nada."""
+    t = _transporte
+    return t.falhou(erro) if t is not None else False
@@ -0,0 +1,71 @@
+"""
+Versão dos dados: uma célula na Config (B2) que muda a cada escrita.
+
+`VersaoDados` envolve o backend: depois de cada escrita em usuários, config
+ou presença, uma versão nova é gravada (`marcar_versao`). Para saber se
+algo mudou basta ler essa célula (`ler_versao`), em vez de baixar as abas.
+
+A marcação sai do caminho de quem escreveu: uma thread grava a versão logo
+depois, e escritas que chegam juntas (um lote da fila, o ADM salvando)
+viram uma única marcação.
+
+A última versão gravada por este processo fica em `versao_propria`: ao
+vê-la de volta numa leitura, o processo sabe que a mudança foi dele (e já
+está no cache). Falha ao marcar não desfaz a escrita; a marcação é tentada
+de novo e, enquanto isso, a atualização periódica dos snapshots cobre.
+"""
+import threading
+
+from cota import PRIORIDADE_PRESENCA, prioridade
+
+
+ESCRITAS = (
+    "adicionar_usuario", "definir_status_usuario", "definir_status_todos", "remover_usuario",
+    "aplicar_alteracoes_usuarios", "salvar_limite", "salvar_regras",
+    "adicionar_presenca", "adicionar_presencas", "remover_presenca", "remover_presenca_de", "limpar_presenca",
+    "marcar_embarque",
+)
+
+
+class VersaoDados:
+    def __init__(self, banco, intervalo_retentativa=5.0):
+        self.banco = banco
+        self.nome = banco.nome
+        self.intervalo_retentativa = intervalo_retentativa
+        self.versao_propria = None
+        self.escritas = 0
+        self.marcadas = 0
+        self.falhas = 0
+        self._pendente = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="versao-dados", daemon=True)
+        self._thread.start()
+
+    def __getattr__(self, nome):
+        attr = getattr(self.banco, nome)
+        if nome not in ESCRITAS:
+            return attr
+
+        def escrever(*args, **kwargs):
+            resultado = attr(*args, **kwargs)
+            self.escritas += 1
+            self._pendente.set()
+            return resultado
+        return escrever
+
+    def _loop(self):
+        while True:
+            self._pendente.wait()
+            self._pendente.clear()
+            try:
+                # mesma prioridade da presença: quem espera a lista mudar depende dela
+                with prioridade(PRIORIDADE_PRESENCA):
+                    self.versao_propria = self.banco.marcar_versao()
+                self.marcadas += 1
+            except Exception:
+                self.falhas += 1
+                self._pendente.wait(self.intervalo_retentativa)
+                self._pendente.set()
+
+    def estatisticas(self):
+        return {"escritas": self.escritas, "marcadas": self.marcadas, "falhas": self.falhas,
+                "versao_propria": self.versao_propria}